@@ -0,0 +1,164 @@
+"""
+Throughput benchmarks for the thread and process backends of batch runs.
+
+A tree of synthetic source files is checked with `restring.batch.run` using
+each backend and number of jobs, and the wall time is compared to a serial run.
+To compare interpreters (eg. a regular build with the GIL and a free-threaded
+3.13t build), pass each of them with `--python`; the benchmark then runs once
+under each interpreter and the results are combined.
+
+Usage
+-----
+python benchmarks/bench_backends.py --jobs 1 2 4 8
+python benchmarks/bench_backends.py --python python3.13 --python python3.13t
+"""
+
+# std
+import os
+import sys
+import json
+import argparse
+import tempfile
+import platform
+import subprocess as sub
+from time import perf_counter
+from pathlib import Path
+
+
+# ---------------------------------------------------------------------------- #
+BACKENDS = ('thread', 'process')
+
+# Synthetic source code, with long strings to wrap and trailing whitespace
+TEMPLATE = '''\
+def function_{i}(x, y):
+    """
+    Docstring for function {i}.
+    """
+    if x > y:
+        raise ValueError('The value of x is larger than the value of y, which is not allowed. Received {{}} and {{}}.'.format(x, y))
+    logger.info(f'Processing item {{x}} of {{y}} with a rather long message that needs wrapping.')
+    return ('short', 'strings')
+
+
+'''
+
+# ---------------------------------------------------------------------------- #
+
+
+def gil_enabled():
+    """Whether the GIL is enabled in this interpreter."""
+    check = getattr(sys, '_is_gil_enabled', None)
+    return True if check is None else check()
+
+
+def make_tree(folder, nfiles, size):
+    """Write `nfiles` synthetic source files of about `size` bytes each."""
+    n = max(size // len(TEMPLATE.format(i=0)), 1)
+    files = []
+    for k in range(nfiles):
+        files.append(file := Path(folder) / f'module{k}.py')
+        file.write_text(''.join(TEMPLATE.format(i=i) for i in range(n)))
+    return files
+
+
+def timed(files, jobs, backend, repeat):
+    """Best wall time of `repeat` check runs over `files`."""
+    from restring.batch import run
+
+    best = float('inf')
+    for _ in range(repeat):
+        start = perf_counter()
+        run(files, prefetch=0, jobs=jobs, backend=backend)
+        best = min(best, perf_counter() - start)
+    return best
+
+
+def bench(nfiles, size, jobs, backends=BACKENDS, repeat=3):
+    """
+    Run the benchmarks in this interpreter. Returns a list of result dicts.
+    """
+    from loguru import logger
+    logger.remove()
+
+    info = dict(python=platform.python_version(),
+                implementation=sys.implementation.name,
+                gil=gil_enabled(),
+                cpus=os.cpu_count())
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        files = make_tree(tmp, nfiles, size)
+        serial = timed(files, 0, 'thread', repeat)
+        results.append(dict(info, backend='serial', jobs=0, time=serial,
+                            speedup=1.))
+        for backend in backends:
+            for n in jobs:
+                time = timed(files, n, backend, repeat)
+                results.append(dict(info, backend=backend, jobs=n, time=time,
+                                    speedup=serial / time))
+    return results
+
+
+def bench_interpreters(pythons, argv):
+    """Run the benchmark under each interpreter in `pythons`."""
+    results = []
+    for python in pythons:
+        out = sub.run([python, __file__, *argv, '--json'], check=True,
+                      capture_output=True, text=True).stdout
+        results.extend(json.loads(out))
+    return results
+
+
+def report(results, nfiles):
+    print(f'{"python":<10} {"gil":<5} {"backend":<8} {"jobs":>4} '
+          f'{"time":>8} {"files/s":>8} {"speedup":>8}')
+    for result in results:
+        print('{python:<10} {gil!s:<5} {backend:<8} {jobs:>4} {time:>7.3f}s '
+              '{rate:>8.1f} {speedup:>7.2f}x'
+              .format(**result, rate=nfiles / result['time']))
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--files', type=int, default=64,
+                        help='Number of source files.')
+    parser.add_argument('--size', type=float, default=32,
+                        help='Size of each source file in kB.')
+    parser.add_argument('--jobs', nargs='+', type=int, default=(1, 2, 4),
+                        help='Numbers of concurrent jobs.')
+    parser.add_argument('--backend', nargs='+', choices=BACKENDS,
+                        default=list(BACKENDS), dest='backends',
+                        help='Backends to benchmark.')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='Number of runs per configuration (the best is '
+                             'reported).')
+    parser.add_argument('--python', action='append', default=[],
+                        help='Run the benchmark under this interpreter. Can be '
+                             'repeated to compare interpreters.')
+    parser.add_argument('--output', type=Path,
+                        help='Write the results as JSON to this file.')
+    parser.add_argument('--json', action='store_true',
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.python:
+        # forward everything but the interpreters and output
+        forward = [arg for arg in argv if arg not in args.python and
+                   arg not in ('--python', '--output', str(args.output))]
+        results = bench_interpreters(args.python, forward)
+    else:
+        results = bench(args.files, int(args.size * 1024), args.jobs,
+                        args.backends, args.repeat)
+
+    if args.json:
+        print(json.dumps(results))
+        return 0
+
+    report(results, args.files)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=1))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,217 @@
+"""
+Memory footprint benchmarks for the restring entry points.
+
+Each entry point is run on synthetic source files of increasing size, in a
+fresh subprocess, while recording the peak memory traced by `tracemalloc` and
+the growth in peak resident set size (RSS) of the process. A benchmark fails
+when its peak memory exceeds the configured multiple of the input file size.
+
+Usage
+-----
+python benchmarks/bench_memory.py --sizes 1 10 100 500
+python benchmarks/bench_memory.py --budget rewrap=2 --budget parse=6
+"""
+
+# std
+import sys
+import json
+import argparse
+import resource
+import tempfile
+import tracemalloc
+import multiprocessing as mp
+from queue import Empty
+from pathlib import Path
+
+
+# ---------------------------------------------------------------------------- #
+MB = 2 ** 20
+
+# Default budgets: peak memory as a multiple of the input file size
+BUDGETS = {
+    'rewrap': 4.,
+    'parse': 8.,
+    'strip': 6.,
+    'convert': 40.,  # ast.parse is memory hungry
+}
+
+# Synthetic source code. Contains long strings to wrap, trailing whitespace and
+# printf-style formatting to convert.
+TEMPLATE = '''\
+def function_{i}(x, y):   
+    """
+    Docstring for function {i}.   
+    """
+    if x > y:
+        raise ValueError('The value of x is larger than the value of y, which is not allowed. Received %s and %s.' % (x, y))
+    logger.info(f'Processing item {{x}} of {{y}} with a rather long message that needs wrapping.')
+    return ('short', 'strings')
+
+
+'''
+
+# ---------------------------------------------------------------------------- #
+
+
+def make_source(filename, size):
+    """
+    Write a synthetic source file of (approximately) `size` bytes. Returns the
+    line number of a formatting expression near the middle of the file.
+    """
+    block_lines = TEMPLATE.count('\n')
+    n = max(size // len(TEMPLATE.format(i=0)), 1)
+    with open(filename, 'w') as fp:
+        for i in range(n):
+            fp.write(TEMPLATE.format(i=i))
+    return (n // 2) * block_lines + 6
+
+
+# ---------------------------------------------------------------------------- #
+# Entry points
+
+def _rewrap(filename, line_nr):
+    from restring.core import rewrap
+    rewrap(filename, line_nr)
+
+
+def _parse(filename, line_nr):
+    from restring.core import StringWrapper
+    for _ in StringWrapper.parse(Path(filename).read_text()):
+        pass
+
+
+def _strip(filename, line_nr):
+    from restring import strip_trailing_space
+    strip_trailing_space(filename)
+
+
+def _convert(filename, line_nr):
+    from restring.fstrings import convert_fstring
+    convert_fstring(filename, line_nr)
+
+
+ENTRY_POINTS = {
+    'rewrap': _rewrap,
+    'parse': _parse,
+    'strip': _strip,
+    'convert': _convert,
+}
+
+# ---------------------------------------------------------------------------- #
+
+
+def _max_rss():
+    # ru_maxrss is in kilobytes on linux, bytes on macos
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def _measure(name, filename, line_nr, queue):
+    from loguru import logger
+    logger.remove()
+
+    # import everything before measuring the baseline
+    import restring.fstrings  # noqa: F401
+
+    baseline = _max_rss()
+    tracemalloc.start()
+    ENTRY_POINTS[name](filename, line_nr)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    queue.put((peak, max(_max_rss() - baseline, 0)))
+
+
+def measure(name, filename, line_nr):
+    """
+    Run entry point `name` in a fresh process. Returns the peak traced memory
+    and the peak RSS growth, in bytes, or None if the process failed.
+    """
+    context = mp.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_measure,
+                              args=(name, filename, line_nr, queue))
+    process.start()
+    result = None
+    while result is None:
+        try:
+            result = queue.get(timeout=1)
+        except Empty:
+            # a crashed process never puts a result
+            if process.exitcode is not None:
+                break
+
+    process.join()
+    if process.exitcode:
+        print(f'{name} failed with exit code {process.exitcode}.',
+              file=sys.stderr)
+        return None
+    return result
+
+
+def run(sizes, budgets, names=ENTRY_POINTS):
+    """
+    Run the benchmarks. Returns a list of result dicts, and whether all
+    benchmarks stayed within budget.
+    """
+    results, ok = [], True
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            for name in names:
+                # fresh input for each run, since the entry points modify it
+                filename = Path(tmp) / 'source.py'
+                line_nr = make_source(filename, int(size * MB))
+                nbytes = filename.stat().st_size
+
+                limit = budgets[name] * nbytes
+                if (result := measure(name, filename, line_nr)) is None:
+                    ok = False
+                    results.append(dict(entry=name, size=nbytes, budget=limit,
+                                        passed=False, error=True))
+                    print(f'{name:<8} {nbytes / MB:8.1f} MB: [ERROR]')
+                    continue
+
+                traced, rss = result
+                passed = max(traced, rss) <= limit
+                ok &= passed
+                results.append(dict(entry=name, size=nbytes, traced=traced,
+                                    rss=rss, budget=limit, passed=passed))
+                print(f'{name:<8} {nbytes / MB:8.1f} MB: '
+                      f'traced {traced / MB:8.1f} MB ({traced / nbytes:5.2f}x), '
+                      f'rss {rss / MB:8.1f} MB ({rss / nbytes:5.2f}x) '
+                      f'[{"ok" if passed else "FAIL"}]')
+
+    return results, ok
+
+
+def _parse_budget(text):
+    name, multiple = text.split('=')
+    if name not in ENTRY_POINTS:
+        raise argparse.ArgumentTypeError(f'Unknown entry point {name!r}.')
+    return name, float(multiple)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', nargs='+', type=float, default=(1, 10),
+                        help='Input file sizes in MB.')
+    parser.add_argument('--entry', nargs='+', choices=ENTRY_POINTS,
+                        default=list(ENTRY_POINTS),
+                        help='Entry points to benchmark.')
+    parser.add_argument('--budget', action='append', type=_parse_budget,
+                        default=[], metavar='ENTRY=MULTIPLE',
+                        help='Peak memory budget as a multiple of the input '
+                             'size.')
+    parser.add_argument('--output', type=Path,
+                        help='Write the results as JSON to this file.')
+    args = parser.parse_args(argv)
+
+    budgets = {**BUDGETS, **dict(args.budget)}
+    results, ok = run(args.sizes, budgets, args.entry)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=1))
+
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
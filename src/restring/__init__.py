@@ -1,24 +1,53 @@
-from .core import *
+# std
+import itertools as itt
 
+# relative
+from .core import *
+from .engine import Engine
+from .profiling import profiler
+from .text import (apply_edits, convert_text, fix_text, rewrap_text,
+                   strip_text)
 
 
-def strip_trailing_space(filename, _ignored=()):
+def strip_trailing_space(filename, _ignored=(), ranges=None):
     """
     Strip trailing whitespace from file.
 
     This implementation only rewrites the file if necessary and only rewrites
     the portion of the file that is necessary, so is somewhat optimized
-    compared to blind replace and rewrite.
+    compared to blind replace and rewrite. If `ranges` is given (sorted
+    (first, last) line number pairs, 1-indexed and inclusive), only lines
+    within those ranges are stripped. Returns the number of bytes written.
     """
-    with open(filename, 'r+') as file:
-        while True:
-            pos = file.tell()
-            line = file.readline()
-            if RGX_TRAILSPACE.search(line):
-                # remaining content to be rewriten
-                content = line + file.read()
-
-                file.seek(pos)
-                file.write(RGX_TRAILSPACE.sub('\n', content))
-                file.truncate()
-                break
\ No newline at end of file
+    with profiler.file(filename), profiler.span('strip'):
+        # Files without trailing whitespace are never opened for writing
+        with open(filename) as file:
+            for line_nr in itt.count(1):
+                pos = file.tell()
+                line = file.readline()
+                if not line:
+                    # end of file
+                    return 0
+
+                if RGX_TRAILSPACE.search(line) and in_ranges(ranges, line_nr):
+                    # remaining content to be rewriten
+                    content = line + file.read()
+                    break
+
+        with open(filename, 'r+') as file:
+            file.seek(pos)
+            file.write(new := _strip_trailing_space(content, ranges, line_nr))
+            file.truncate()
+
+        return len(new.encode())
+
+
+def _strip_trailing_space(text, ranges=None, line_nr=1):
+    if ranges is None:
+        return RGX_TRAILSPACE.sub('\n', text)
+
+    lines = text.splitlines(keepends=True)
+    for i, line in enumerate(lines, line_nr):
+        if in_ranges(ranges, i):
+            lines[i - line_nr] = RGX_TRAILSPACE.sub('\n', line)
+    return ''.join(lines)
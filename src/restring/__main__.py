@@ -0,0 +1,8 @@
+# std
+import sys
+
+# local
+from .cli import main
+
+
+sys.exit(main())
@@ -0,0 +1,237 @@
+"""
+Check and fix the source files inside zip (including wheel) and tar (including
+sdist) archives, without extracting them to disk. Members are read one after
+the other and scanned in memory. When fixing, the new archive is written in the
+same sequential pass, with unchanged zip members streamed across in chunks
+(keeping their metadata and compression method), and the hashes in a wheel's
+RECORD file updated for the changed members.
+"""
+
+# std
+import os
+import csv
+import io
+import base64
+import shutil
+import hashlib
+import tarfile
+import zipfile
+import tempfile
+from pathlib import Path
+from time import perf_counter
+
+# third-party
+from loguru import logger
+
+# relative
+from .core import DEFAULT_WIDTH, file_lock
+from .pipeline import Document
+from .profiling import profiler
+
+
+# ---------------------------------------------------------------------------- #
+ZIP_SUFFIXES = ('.zip', '.whl')
+TAR_SUFFIXES = {'.tar': '', '.tgz': 'gz', '.gz': 'gz', '.bz2': 'bz2',
+                '.xz': 'xz'}
+
+COPY_BUFSIZE = 2 ** 20
+
+# ---------------------------------------------------------------------------- #
+
+
+def archive_type(filename):
+    """
+    Type of archive ('zip' or 'tar'), judging by the file name, or None for
+    other files.
+    """
+    name = Path(filename).name.lower()
+    if name.endswith(ZIP_SUFFIXES):
+        return 'zip'
+    if name.endswith('.tar') or (name.endswith(tuple(TAR_SUFFIXES)) and
+                                 ('.tar.' in name or name.endswith('.tgz'))):
+        return 'tar'
+    return None
+
+
+def is_archive(filename):
+    return archive_type(filename) is not None
+
+
+def _compression(filename):
+    return TAR_SUFFIXES[Path(filename).suffix.lower()]
+
+
+def record_hash(data):
+    """Hash of `data` in the format of a wheel's RECORD file."""
+    digest = hashlib.sha256(data).digest()
+    return 'sha256=' + base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+
+
+def _is_record(name):
+    parent, _, base = name.rpartition('/')
+    return base == 'RECORD' and parent.endswith('.dist-info') and \
+        '/' not in parent
+
+
+def _update_record(data, changed):
+    # Replace the hash and size of the changed members in the RECORD
+    rows = list(csv.reader(io.StringIO(data.decode())))
+    for row in rows:
+        if row and (new := changed.get(row[0])) is not None:
+            row[1:3] = [record_hash(new), str(len(new))]
+
+    out = io.StringIO()
+    csv.writer(out, lineterminator='\n').writerows(rows)
+    return out.getvalue().encode()
+
+
+# ---------------------------------------------------------------------------- #
+
+def _process_member(key, data, process, options):
+    # Returns the result for the member, and its new content if it changed
+    start = perf_counter()
+    try:
+        text = data.decode()
+    except UnicodeDecodeError as err:
+        logger.error('Could not process {!r}: {}', key, err)
+        return dict(error=str(err)), None
+
+    with profiler.file(key):
+        document = Document(text, key)
+        result = process(document, *options)
+
+    new = document.text.encode() if document.changed else None
+    result['written'] = 0 if new is None else len(new)
+    result['time'] = perf_counter() - start
+    return result, new
+
+
+def _iter_zip(filename, output, process, options, suffixes):
+    # Members are visited in the order they are stored
+    with zipfile.ZipFile(filename) as zin:
+        infos = sorted(zin.infolist(), key=lambda info: info.header_offset)
+        zout = output and zipfile.ZipFile(output, 'w')
+
+        changed, record = {}, None
+        for info in infos:
+            result = new = None
+            if info.filename.endswith(suffixes) and not info.is_dir():
+                key = f'{Path(filename).as_posix()}/{info.filename}'
+                result, new = _process_member(key, zin.read(info), process,
+                                              options)
+                yield key, result
+
+            if zout is None:
+                continue
+
+            if new is not None:
+                changed[info.filename] = new
+                zout.writestr(_copy_info(info), new, info.compress_type)
+            elif _is_record(info.filename):
+                # written last, once the new hashes are known
+                record = info
+            else:
+                _copy_member(zin, zout, info)
+
+        if zout is None:
+            return
+
+        if record:
+            data = _update_record(zin.read(record), changed)
+            zout.writestr(_copy_info(record), data, record.compress_type)
+        zout.close()
+
+
+def _copy_info(info):
+    new = zipfile.ZipInfo(info.filename, info.date_time)
+    new.external_attr = info.external_attr
+    new.create_system = info.create_system
+    new.comment = info.comment
+    return new
+
+
+def _copy_member(zin, zout, info):
+    # Stream an unchanged member across in chunks, with its original metadata
+    # and compression method
+    new = _copy_info(info)
+    new.compress_type = info.compress_type
+    if info.is_dir():
+        zout.writestr(new, b'')
+        return
+
+    with zin.open(info) as src, \
+            zout.open(new, 'w',
+                      force_zip64=info.file_size >= zipfile.ZIP64_LIMIT) as dst:
+        shutil.copyfileobj(src, dst, COPY_BUFSIZE)
+
+
+def _iter_tar(filename, output, process, options, suffixes):
+    # Stream mode: the archive is read (and written) strictly sequentially
+    compression = _compression(filename)
+    with tarfile.open(filename, f'r|{compression}') as tin:
+        tout = output and tarfile.open(output, f'w|{compression}',
+                                       format=tin.format or tarfile.PAX_FORMAT)
+        for member in tin:
+            fp = tin.extractfile(member) if member.isfile() else None
+            if fp and member.name.endswith(suffixes):
+                key = f'{Path(filename).as_posix()}/{member.name}'
+                data = fp.read()
+                result, new = _process_member(key, data, process, options)
+                yield key, result
+
+                if tout is not None:
+                    # streams cannot seek back, so write from memory
+                    data = data if new is None else new
+                    member.size = len(data)
+                    tout.addfile(member, io.BytesIO(data))
+            elif tout is not None:
+                tout.addfile(member, fp)
+
+        if tout is not None:
+            tout.close()
+
+
+def process_archive(filename, width=DEFAULT_WIDTH, expand_tabs=True,
+                    fix=False, strip=True, convert=False, wrap=True,
+                    paragraphs=False, comments=False, suffixes=('.py', )):
+    """
+    Check the source files in a zip or tar archive, and optionally fix them.
+    In fix mode, the archive is rewritten (to a temporary file that replaces
+    it) if any of the members changed.
+
+    Returns
+    -------
+    dict
+        Per-member results (see `restring.batch.process_file`), keyed by the
+        path of the archive joined with the member name.
+    """
+    from .batch import process_document
+
+    filename = Path(filename)
+    kind = archive_type(filename)
+    if kind is None:
+        raise ValueError(f'Not a supported archive: {str(filename)!r}.')
+
+    iterate = _iter_zip if kind == 'zip' else _iter_tar
+    options = (width, expand_tabs, strip, convert, wrap, None, paragraphs,
+               comments)
+    if not fix:
+        return dict(iterate(filename, None, process_document, options,
+                            suffixes))
+
+    fd, tmp = tempfile.mkstemp(dir=filename.parent,
+                               prefix=f'.{filename.name}.')
+    os.close(fd)
+    try:
+        results = dict(iterate(filename, tmp, process_document, options,
+                               suffixes))
+        if any(result.get('changed') for result in results.values()):
+            logger.info('Rewriting archive {!r}.', str(filename))
+            with file_lock(filename):
+                shutil.copymode(filename, tmp)
+                os.replace(tmp, filename)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+    return results
@@ -0,0 +1,535 @@
+"""
+Batch processing of many files, with deterministic sharding for fanning out
+over several (local) processes, and machine readable JSON reports that can be
+merged into a single summary. Optionally, each file is processed under a time
+and memory budget, with files exceeding it quarantined (see
+`restring.budget`). Zip and tar archives are processed member by member
+without extracting them (see `restring.archive`).
+
+Files can also be processed concurrently by a pool of threads or processes
+(see `run`). Threads avoid the start-up and pickling costs of processes, and
+scale on free-threaded builds of python. The parse and wrap paths are thread
+safe: all per-file state lives in the `Document` of the file, the shared wrap
+and conversion memos and the file index cache are guarded by locks, logging
+goes through loguru (whose handlers are thread safe), and writes to the same
+file are serialized by a per-file lock (`restring.core.file_lock`). Profiling
+with cProfile is not supported with the thread backend.
+"""
+
+# std
+import json
+import queue
+import hashlib
+import tarfile
+import zipfile
+import statistics
+from time import perf_counter
+from pathlib import Path
+from contextlib import ExitStack
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+# third-party
+from loguru import logger
+
+# relative
+from .core import DEFAULT_WIDTH
+from .profiling import profiler
+from .budget import Quarantine, Worker
+from .archive import is_archive, process_archive
+from .scheduler import DEFAULT_DEPTH, ReadAhead, WriteBehind
+from .pipeline import (Document, comment_pass, convert_pass, rewrap_pass,
+                       strip_pass, write_source)
+
+
+# ---------------------------------------------------------------------------- #
+REPORT_VERSION = 1
+
+# executors for processing files concurrently
+BACKENDS = {'thread': ThreadPoolExecutor,
+            'process': ProcessPoolExecutor}
+
+# ---------------------------------------------------------------------------- #
+
+
+def find_files(paths, suffixes=('.py', )):
+    """
+    Expand directories in `paths` into the (sorted) source files they contain.
+    """
+    for path in map(Path, paths):
+        if path.is_dir():
+            yield from sorted(file for file in path.rglob('*')
+                              if file.suffix in suffixes and file.is_file())
+        else:
+            yield path
+
+
+def parse_shard(text):
+    """Parse shard specification 'i/N' into (i, N), with 1 <= i <= N."""
+    index, count = map(int, text.split('/'))
+    if not 1 <= index <= count:
+        raise ValueError(f'Invalid shard {text!r}. Shard index should be in '
+                         f'the range 1 to {count}.')
+    return index, count
+
+
+def stable_hash(path):
+    """Hash of the path that is stable across processes and machines."""
+    key = Path(path).as_posix().encode()
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), 'big')
+
+
+def shard(files, index, count, timings=None):
+    """
+    Deterministically select the files belonging to shard `index` (1-indexed)
+    of `count`.
+
+    Without `timings`, files are assigned by a stable hash of their path. If
+    `timings` (a mapping of paths to seconds, from a previous run's report) is
+    given, files are balanced by expected cost instead: the cost of files
+    without timings is estimated from their size, and files are assigned
+    greedily, most expensive first, to the shard with the least total cost.
+
+    Every shard of the same file list with the same timings computes the same
+    assignment, so shards can be run independently.
+    """
+    files = list(map(Path, files))
+    if not timings:
+        return [file for file in files if stable_hash(file) % count == index - 1]
+
+    costs = _estimate_costs(files, timings)
+    loads = [0.] * count
+    selected = set()
+    for file in sorted(files, key=lambda file: (-costs[file], file.as_posix())):
+        i = loads.index(min(loads))
+        loads[i] += costs[file]
+        if i == index - 1:
+            selected.add(file)
+
+    # keep the original order
+    return [file for file in files if file in selected]
+
+
+def _estimate_costs(files, timings):
+    timings = {Path(path).as_posix(): time for path, time in timings.items()}
+    sizes = {file: _size(file) for file in files}
+
+    # seconds per byte for files with known timings
+    rates = [timings[key] / sizes[file]
+             for file in files
+             if (key := file.as_posix()) in timings and sizes[file]]
+    rate = statistics.median(rates) if rates else 1.
+
+    return {file: timings.get(file.as_posix(), sizes[file] * rate)
+            for file in files}
+
+
+def _size(file):
+    try:
+        return file.stat().st_size
+    except OSError:
+        return 0
+
+
+# ---------------------------------------------------------------------------- #
+
+def process_file(filename, width=DEFAULT_WIDTH, expand_tabs=True, fix=False,
+                 strip=True, convert=False, wrap=True, ranges=None,
+                 paragraphs=False, comments=False):
+    """
+    Check a single file, and optionally fix it. If `ranges` are given, only
+    those lines are considered (see `restring.core.in_ranges`). If
+    `paragraphs` is True, triple-quoted strings are reflowed paragraph by
+    paragraph. If `comments` is True, overlong comments are reflowed too.
+
+    Returns
+    -------
+    dict
+        Per-file results for the report: number of strings scanned and
+        wrapped, violations as (line, kind) pairs, whether the file changed,
+        the number of bytes written and the processing time in seconds.
+    """
+    start = perf_counter()
+    with profiler.file(filename):
+        document = Document(Path(filename).read_text(), filename)
+        result = process_document(document, width, expand_tabs, strip,
+                                  convert, wrap, ranges, paragraphs, comments)
+        result['written'] = document.write() if fix else 0
+
+    result['time'] = perf_counter() - start
+    return result
+
+
+def process_document(document, width=DEFAULT_WIDTH, expand_tabs=True,
+                     strip=True, convert=False, wrap=True, ranges=None,
+                     paragraphs=False, comments=False):
+    """
+    Run the checks on an in-memory `Document`, applying the fixes to its text.
+    Nothing is read from or written to disk. See `process_file`.
+    """
+    violations = []
+    if strip:
+        edits = strip_pass(document, ranges)
+        violations.extend((document.line_nr(edit.start), 'trailing-space')
+                          for edit in edits)
+        document.apply(edits)
+
+    if convert:
+        edits = convert_pass(document, ranges=ranges)
+        violations.extend((document.line_nr(edit.start), 'printf-format')
+                          for edit in edits)
+        document.apply(edits)
+
+    wrapped = 0
+    if wrap:
+        edits = rewrap_pass(document, width, expand_tabs, ranges,
+                            paragraphs=paragraphs)
+        violations.extend((document.line_nr(edit.start), 'string-too-long')
+                          for edit in edits)
+        document.apply(edits)
+        wrapped = len(edits)
+
+    if comments:
+        edits = comment_pass(document, width, expand_tabs, ranges)
+        violations.extend((document.line_nr(edit.start), 'comment-too-long')
+                          for edit in edits)
+        document.apply(edits)
+
+    return dict(strings=len(document.strings),
+                wrapped=wrapped,
+                violations=sorted(violations),
+                changed=document.changed)
+
+
+def run(files, width=DEFAULT_WIDTH, expand_tabs=True, fix=False, strip=True,
+        convert=False, wrap=True, shard_spec=None, timings=None,
+        prefetch=DEFAULT_DEPTH, paragraphs=False, timeout=None,
+        max_memory=None, quarantine=None, comments=False, jobs=0,
+        backend='thread'):
+    """
+    Check (and optionally fix) files, returning a report dict.
+
+    Parameters
+    ----------
+    files : sequence of str or Path, or dict
+        Files to process. This can also be a mapping of files to the line
+        ranges that should be processed in each file, with None indicating the
+        entire file. Zip and tar archives (eg. wheels and sdists) are processed
+        in memory, and the results for their members are reported under the
+        archive path joined with the member name.
+    shard_spec : tuple of int, optional
+        Only process shard `i` of `N`, given as (i, N). See `shard`.
+    timings : dict, optional
+        File timings from a previous report, used to balance the shards.
+    prefetch : int
+        Number of files to read ahead in background threads while the current
+        file is processed. Fixed files are then also written by a background
+        thread. If 0, files are read and written one after the other.
+    paragraphs : bool
+        Whether to reflow triple-quoted strings paragraph by paragraph, only
+        changing paragraphs with overlong lines.
+    timeout : float, optional
+        Wall-time budget per file in seconds.
+    max_memory : int, optional
+        Memory (address space) budget for the worker process in bytes.
+    quarantine : str or Path or Quarantine, optional
+        Files that exceeded their budget are added to this quarantine list,
+        and files in the list are skipped until they change.
+    comments : bool
+        Whether to also reflow overlong comments.
+    jobs : int
+        Number of files processed concurrently by a pool of workers. If 0,
+        files are processed one at a time (with `prefetch`). With a `timeout`
+        or `max_memory` budget, this is the number of budgeted worker
+        processes, irrespective of `backend`.
+    backend : {'thread', 'process'}
+        Whether the pool uses threads or processes. See the module docstring
+        on thread safety.
+
+    Returns
+    -------
+    dict
+        The report.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(f'Invalid backend {backend!r}. Valid options are: '
+                         f'{tuple(BACKENDS)}.')
+
+    ranges = {Path(file): lines for file, lines in
+              (files.items() if isinstance(files, dict) else
+               dict.fromkeys(files).items())}
+    files = list(ranges)
+    if shard_spec:
+        files = shard(files, *shard_spec, timings)
+
+    if not isinstance(quarantine, Quarantine):
+        quarantine = Quarantine(quarantine)
+
+    results, todo, archives = {}, [], {}
+    for file in files:
+        if file in quarantine:
+            logger.info('Skipping quarantined file {!r}.', str(file))
+            results[file.as_posix()] = dict(quarantined=quarantine.reason(file))
+        elif is_archive(file):
+            archives[file.as_posix()] = _run_archive(
+                file, width, expand_tabs, fix, strip, convert, wrap, paragraphs,
+                comments
+            )
+        else:
+            todo.append(file)
+
+    options = (width, expand_tabs, fix, strip, convert, wrap, paragraphs,
+               comments)
+    if timeout or max_memory:
+        results.update(_run_budget(todo, ranges, quarantine, timeout,
+                                   max_memory, jobs, *options))
+        quarantine.save()
+    elif jobs:
+        results.update(_run_pool(todo, ranges, jobs, backend, *options))
+    elif prefetch:
+        results.update(_run_prefetch(todo, ranges, prefetch, *options))
+    else:
+        results.update(_run_serial(todo, ranges, *options))
+
+    # archives expand into their members
+    results = {name: result for key in map(Path.as_posix, files)
+               for name, result in (archives[key].items() if key in archives
+                                    else [(key, results[key])])}
+
+    return dict(version=REPORT_VERSION,
+                shard=list(shard_spec or (1, 1)),
+                width=width,
+                fix=fix,
+                files=results,
+                summary=summarize(results))
+
+
+def _run_serial(files, ranges, width, expand_tabs, fix, strip, convert, wrap,
+                paragraphs, comments):
+    return {file.as_posix(): _process_file(file, width, expand_tabs, fix,
+                                           strip, convert, wrap, ranges[file],
+                                           paragraphs, comments)
+            for file in files}
+
+
+def _run_pool(files, ranges, jobs, backend, width, expand_tabs, fix, strip,
+              convert, wrap, paragraphs, comments):
+    func = profiler.remote(_process_file)
+    with BACKENDS[backend](jobs) as pool:
+        futures = [pool.submit(func, file, width, expand_tabs, fix, strip,
+                               convert, wrap, ranges[file], paragraphs,
+                               comments)
+                   for file in files]
+        return {file.as_posix(): profiler.collect(future.result())
+                for file, future in zip(files, futures)}
+
+
+def _process_file(file, *args):
+    logger.debug('Processing {!r}.', str(file))
+    try:
+        return process_file(file, *args)
+    except (OSError, UnicodeDecodeError) as err:
+        logger.error('Could not process {!r}: {}', str(file), err)
+        return dict(error=str(err))
+    except Exception as err:
+        # a single bad file should not abort the batch
+        logger.exception('Unexpected error processing {!r}.', str(file))
+        return dict(error=repr(err))
+
+
+def _run_prefetch(files, ranges, depth, width, expand_tabs, fix, strip,
+                  convert, wrap, paragraphs, comments):
+    results = {}
+    with WriteBehind(write_source) as writer:
+        for file, text, err in ReadAhead(files, depth):
+            key = file.as_posix()
+            if err:
+                logger.error('Could not process {!r}: {}', str(file), err)
+                results[key] = dict(error=str(err))
+                continue
+
+            logger.debug('Processing {!r}.', str(file))
+            start = perf_counter()
+            try:
+                with profiler.file(file):
+                    document = Document(text, file)
+                    result = process_document(document, width, expand_tabs,
+                                              strip, convert, wrap,
+                                              ranges[file], paragraphs,
+                                              comments)
+            except Exception as err:
+                logger.exception('Unexpected error processing {!r}.', str(file))
+                results[key] = dict(error=repr(err))
+                continue
+
+            result['written'] = 0
+            if fix and document.changed:
+                writer.submit(file, document.text)
+                result['written'] = len(document.text.encode())
+
+            result['time'] = perf_counter() - start
+            results[key] = result
+
+    # Failed writes are reported in the order they were submitted
+    for file, err in writer.errors:
+        results[file.as_posix()] = dict(error=str(err))
+
+    return results
+
+
+def _run_archive(file, width, expand_tabs, fix, strip, convert, wrap,
+                 paragraphs, comments):
+    logger.debug('Processing archive {!r}.', str(file))
+    try:
+        return process_archive(file, width, expand_tabs, fix, strip, convert,
+                               wrap, paragraphs, comments)
+    except (OSError, EOFError, tarfile.TarError, zipfile.BadZipFile) as err:
+        logger.error('Could not process {!r}: {}', str(file), err)
+        return {file.as_posix(): dict(error=str(err))}
+    except Exception as err:
+        logger.exception('Unexpected error processing {!r}.', str(file))
+        return {file.as_posix(): dict(error=repr(err))}
+
+
+def _run_budget(files, ranges, quarantine, timeout, max_memory, jobs, width,
+                expand_tabs, fix, strip, convert, wrap, paragraphs,
+                comments):
+    # Files are processed in worker processes (one per job), but written by
+    # this one, so that a worker that is killed never leaves a partially
+    # written file. Each worker is driven by one thread of the pool.
+    idle = queue.SimpleQueue()
+
+    def process(file):
+        logger.debug('Processing {!r}.', str(file))
+        worker = idle.get()
+        try:
+            status, value = worker.call(timeout, file, width, expand_tabs,
+                                        strip, convert, wrap, ranges[file],
+                                        paragraphs, comments)
+        finally:
+            idle.put(worker)
+
+        if status in ('timeout', 'memory'):
+            quarantine.add(file, value)
+            return dict(quarantined=value)
+
+        if status == 'error':
+            logger.error('Could not process {!r}: {}', str(file), value)
+            return dict(error=value)
+
+        result, text = profiler.collect(value)
+        result['written'] = 0
+        if fix and text is not None:
+            result['written'] = write_source(file, text)
+        return result
+
+    jobs = max(1, min(jobs, len(files)))
+    with ExitStack() as stack:
+        for _ in range(jobs):
+            idle.put(stack.enter_context(
+                Worker(profiler.remote(_check_file), max_memory)
+            ))
+
+        with ThreadPoolExecutor(jobs) as pool:
+            return {file.as_posix(): result
+                    for file, result in zip(files, pool.map(process, files))}
+
+
+def _check_file(filename, width, expand_tabs, strip, convert, wrap, ranges,
+                paragraphs, comments):
+    # Runs in the worker process. Returns the result, and the new text if the
+    # file changed
+    start = perf_counter()
+    with profiler.file(filename):
+        document = Document(Path(filename).read_text(), filename)
+        result = process_document(document, width, expand_tabs, strip,
+                                  convert, wrap, ranges, paragraphs, comments)
+    result['time'] = perf_counter() - start
+    return result, (document.text if document.changed else None)
+
+
+def summarize(results):
+    summary = dict(files=len(results), strings=0, wrapped=0, violations=0,
+                   changed=0, written=0, errors=0, quarantined=0, time=0.)
+    for result in results.values():
+        if 'error' in result:
+            summary['errors'] += 1
+            continue
+
+        if 'quarantined' in result:
+            summary['quarantined'] += 1
+            continue
+
+        summary['strings'] += result['strings']
+        summary['wrapped'] += result['wrapped']
+        summary['violations'] += len(result['violations'])
+        summary['changed'] += result['changed']
+        summary['written'] += result.get('written', 0)
+        summary['time'] += result['time']
+
+    return summary
+
+
+# ---------------------------------------------------------------------------- #
+
+def write_report(report, filename):
+    Path(filename).write_text(json.dumps(report, indent=1))
+
+
+def load_report(filename):
+    report = json.loads(Path(filename).read_text())
+    if report.get('version') != REPORT_VERSION:
+        raise ValueError(f'Unsupported report version in {str(filename)!r}: '
+                         f'{report.get("version")}.')
+    return report
+
+
+def load_timings(filename):
+    """File timings from a (merged or shard) report, for shard balancing."""
+    return {path: result['time']
+            for path, result in load_report(filename)['files'].items()
+            if 'time' in result}
+
+
+def merge_reports(reports):
+    """
+    Merge shard reports into a single report. Missing or duplicate shards are
+    flagged in the 'shards' entry of the merged report.
+    """
+    reports = list(reports)
+    files, seen = {}, set()
+    count = None
+    for report in reports:
+        index, n = report['shard']
+        if count not in (None, n):
+            raise ValueError(f'Cannot merge reports for {count} and {n} '
+                             f'shards.')
+        count = n
+        if index in seen:
+            logger.warning('Duplicate report for shard {}/{}.', index, n)
+        seen.add(index)
+        files.update(report['files'])
+
+    missing = sorted(set(range(1, (count or 0) + 1)) - seen)
+    if missing:
+        logger.warning('Missing reports for shards: {}.', missing)
+
+    return dict(version=REPORT_VERSION,
+                shard=[1, 1],
+                width=reports[0]['width'] if reports else DEFAULT_WIDTH,
+                fix=any(report['fix'] for report in reports),
+                shards=dict(count=count, missing=missing),
+                files=dict(sorted(files.items())),
+                summary=summarize(files))
+
+
+def exit_code(report):
+    """
+    Exit code for a (merged) report: 0 if all good, 1 if there were
+    violations (in check mode) and 2 if there were errors or missing shards.
+    """
+    summary = report['summary']
+    if summary['errors'] or report.get('shards', {}).get('missing'):
+        return 2
+    if summary['violations'] and not report['fix']:
+        return 1
+    return 0
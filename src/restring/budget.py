@@ -0,0 +1,183 @@
+"""
+Per-file time and memory budgets for batch runs. Files are processed in a
+worker process with a limited address space, and the worker is recycled when a
+file exceeds its time or memory budget. Offending files are recorded in a
+quarantine list, which later runs skip until the file changes.
+"""
+
+# std
+import json
+import multiprocessing as mp
+from pathlib import Path
+
+# third-party
+from loguru import logger
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+# ---------------------------------------------------------------------------- #
+
+def _serve(conn, func, max_memory):
+    # worker process main loop
+    if max_memory:
+        _, hard = resource.getrlimit(resource.RLIMIT_AS)
+        resource.setrlimit(resource.RLIMIT_AS, (int(max_memory), hard))
+
+    while (args := conn.recv()) is not None:
+        try:
+            conn.send(('ok', func(*args)))
+        except MemoryError:
+            conn.send(('memory', 'Memory budget exceeded.'))
+            # The heap may be fragmented beyond use. Exit and let the parent
+            # start a fresh worker.
+            return
+        except (OSError, UnicodeDecodeError) as err:
+            conn.send(('error', str(err)))
+        except Exception as err:
+            # Any other failure is specific to the file, not a budget
+            # violation, so keep serving
+            conn.send(('error', repr(err)))
+
+
+class Worker:
+    """
+    A process running `func` under a memory limit of `max_memory` bytes
+    (address space). The process is replaced when a call exceeds its budget.
+
+    Examples
+    --------
+    >>> worker = Worker(process, max_memory=2 ** 30)
+    ... status, value = worker.call(10, 'foo.py')
+    ... worker.close()
+    """
+
+    def __init__(self, func, max_memory=None):
+        if max_memory and resource is None:
+            logger.warning('Memory budgets are not supported on this platform.')
+            max_memory = None
+
+        self.func = func
+        self.max_memory = max_memory
+        self.process = self.conn = None
+        self._start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _start(self):
+        self.conn, child = mp.Pipe()
+        self.process = mp.Process(target=_serve, name='restring-worker',
+                                  args=(child, self.func, self.max_memory),
+                                  daemon=True)
+        self.process.start()
+        child.close()
+
+    def recycle(self):
+        """Kill the worker process and start a new one."""
+        logger.debug('Recycling worker process {}.', self.process.pid)
+        self.process.kill()
+        self.process.join()
+        self.conn.close()
+        self._start()
+
+    def call(self, timeout, *args):
+        """
+        Run `func(*args)` in the worker, waiting at most `timeout` seconds.
+
+        Returns
+        -------
+        status : str
+            One of 'ok', 'error', 'timeout' or 'memory'.
+        value : object
+            The return value of `func` if the call succeeded, otherwise the
+            error message.
+        """
+        self.conn.send(args)
+        if not self.conn.poll(timeout):
+            self.recycle()
+            return 'timeout', f'Time budget of {timeout}s exceeded.'
+
+        try:
+            status, value = self.conn.recv()
+        except EOFError:
+            # Died without a reply, so it was killed, most likely by the OS for
+            # using too much memory (errors in `func` are sent as replies)
+            self.recycle()
+            return 'memory', 'Worker process died.'
+
+        if status == 'memory':
+            self.recycle()
+        return status, value
+
+    def close(self):
+        if self.process.is_alive():
+            self.conn.send(None)
+            self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.conn.close()
+
+
+# ---------------------------------------------------------------------------- #
+
+class Quarantine:
+    """
+    Persistent list of files that exceeded their budget. A file is released
+    from quarantine as soon as it changes (its mtime or size differs from the
+    time it was quarantined) or is removed, and its entry is then dropped from
+    the list on the next load or save.
+    """
+
+    def __init__(self, filename=None):
+        self.filename = Path(filename) if filename else None
+        self.files = {}
+        if self.filename and self.filename.exists():
+            self.files = json.loads(self.filename.read_text())
+            self.prune()
+
+    def __contains__(self, file):
+        entry = self.files.get(Path(file).as_posix())
+        return bool(entry) and entry['stat'] == _signature(file)
+
+    def __len__(self):
+        return len(self.files)
+
+    def reason(self, file):
+        return self.files[Path(file).as_posix()]['reason']
+
+    def add(self, file, reason):
+        logger.warning('Quarantining {!r}: {}', str(file), reason)
+        self.files[Path(file).as_posix()] = dict(stat=_signature(file),
+                                                 reason=reason)
+
+    def discard(self, file):
+        self.files.pop(Path(file).as_posix(), None)
+
+    def prune(self):
+        """Drop the entries of files that changed or no longer exist."""
+        stale = [file for file in self.files if file not in self]
+        for file in stale:
+            logger.info('Releasing {!r} from quarantine.', file)
+            del self.files[file]
+        return stale
+
+    def save(self):
+        self.prune()
+        if self.filename:
+            self.filename.write_text(json.dumps(self.files, indent=1))
+
+
+def _signature(file):
+    try:
+        stat = Path(file).stat()
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
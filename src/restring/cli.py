@@ -0,0 +1,460 @@
+"""
+Command line interface for restring.
+"""
+
+# std
+import sys
+import argparse
+from pathlib import Path
+
+# third-party
+from loguru import logger
+
+# relative
+from . import strip_trailing_space
+from .profiling import profiler
+from .scheduler import DEFAULT_DEPTH
+from .core import DEFAULT_WIDTH, rewrap_file, wrap_memo
+from .batch import (exit_code, find_files, load_report, load_timings,
+                    merge_reports, parse_shard, run, write_report)
+
+
+# ---------------------------------------------------------------------------- #
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+        'restring', description='Hard wrap python strings and strip trailing '
+                                'whitespace in source code.')
+    parser.add_argument('-v', '--verbose', action='count', default=0,
+                        help='Increase logging verbosity.')
+    parser.add_argument('--profile', metavar='TRACE', type=Path,
+                        help='Time each phase of the pipeline and write the '
+                             'spans to TRACE as Chrome trace-event JSON.')
+    parser.add_argument('--cprofile', metavar='DIR', type=Path,
+                        help='Run cProfile for each file and dump the stats '
+                             'in DIR.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    # wrap
+    wrap = commands.add_parser('wrap', help='Hard wrap strings that are too '
+                                            'long, and strip trailing space.')
+    _add_wrap_args(wrap)
+    wrap.add_argument('--cache', metavar='FILE', type=Path,
+                      help='On-disk store for memoized wrap results. Can be '
+                           'shared between concurrent processes.')
+    wrap.add_argument('-j', '--jobs', type=int,
+                      help='Split large files into chunks that are scanned '
+                           'and wrapped by this many processes.')
+    _add_git_args(wrap)
+    wrap.set_defaults(func=_wrap)
+
+    # fix / check
+    fix = commands.add_parser('fix', help='Strip trailing whitespace, convert '
+                                          'to f-strings and hard wrap strings '
+                                          'in a single pass.')
+    check = commands.add_parser('check', help='Report the changes that `fix` '
+                                              'would make, without making '
+                                              'them.')
+    for sub, func in ((fix, _fix), (check, _check)):
+        _add_wrap_args(sub)
+        sub.add_argument('--no-convert', dest='convert', action='store_false',
+                         help='Do not convert printf-style formatting to '
+                              'f-strings.')
+        sub.add_argument('--no-wrap', dest='wrap', action='store_false',
+                         help='Do not wrap strings.')
+        sub.add_argument('--comments', action='store_true',
+                         help='Also reflow comments that are too long.')
+        _add_git_args(sub)
+        _add_batch_args(sub)
+        sub.set_defaults(func=func)
+
+    # plan / apply
+    plan = commands.add_parser('plan', help='Compute the edits that `fix` '
+                                            'would make, and write them to an '
+                                            'edit plan without changing any '
+                                            'files.')
+    _add_wrap_args(plan)
+    plan.add_argument('--no-convert', dest='convert', action='store_false',
+                      help='Do not convert printf-style formatting to '
+                           'f-strings.')
+    plan.add_argument('--no-wrap', dest='wrap', action='store_false',
+                      help='Do not wrap strings.')
+    plan.add_argument('--comments', action='store_true',
+                      help='Also reflow comments that are too long.')
+    plan.add_argument('-j', '--jobs', type=int, default=0,
+                      help='Number of files analysed concurrently.')
+    plan.add_argument('--backend', choices=('thread', 'process'),
+                      default='process',
+                      help='Analyse files in threads or processes.')
+    plan.add_argument('-o', '--output', metavar='PLAN', type=Path,
+                      required=True, help='Write the plan to this file.')
+    _add_git_args(plan)
+    plan.set_defaults(func=_plan)
+
+    apply = commands.add_parser('apply', help='Apply an edit plan. Files that '
+                                              'changed since the plan was '
+                                              'made are skipped.')
+    apply.add_argument('plan', type=Path, help='The edit plan.')
+    apply.add_argument('--dry-run', action='store_true',
+                       help='Check the plan against the files, without '
+                            'writing.')
+    apply.set_defaults(func=_apply)
+
+    # ingest
+    ingest = commands.add_parser('ingest', help='Hard wrap the strings flagged '
+                                                'by line length findings in a '
+                                                'linter report (flake8, ruff '
+                                                'or pylint; text or JSON).')
+    ingest.add_argument('report', nargs='?', default='-',
+                        help='The linter output. Read from stdin if omitted '
+                             "or '-'.")
+    ingest.add_argument('-w', '--width', type=int,
+                        help='Maximal line width. By default, the limit stated '
+                             'in the findings.')
+    ingest.add_argument('--no-expand-tabs', dest='expand_tabs',
+                        action='store_false',
+                        help='Do not expand tabs when measuring line width.')
+    ingest.add_argument('--paragraphs', action='store_true',
+                        help='Reflow triple-quoted strings paragraph by '
+                             'paragraph.')
+    ingest.add_argument('--codes', nargs='+', metavar='CODE',
+                        help='Codes of the findings to act on. By default, '
+                             'the line length codes of flake8, ruff, '
+                             'flake8-bugbear and pylint.')
+    ingest.add_argument('--dry-run', action='store_true',
+                        help='Resolve the findings without writing.')
+    ingest.set_defaults(func=_ingest)
+
+    # merge
+    merge = commands.add_parser('merge', help='Merge JSON reports from '
+                                              'sharded runs.')
+    merge.add_argument('reports', nargs='+', type=Path,
+                       help='Shard reports.')
+    merge.add_argument('-o', '--output', type=Path,
+                       help='Write the merged report to this file.')
+    merge.set_defaults(func=_merge)
+
+    # strip
+    strip = commands.add_parser('strip', help='Strip trailing whitespace.')
+    _add_git_args(strip)
+    strip.set_defaults(func=_strip)
+
+    # watch
+    watch = commands.add_parser('watch', help='Strip trailing whitespace and '
+                                              'hard wrap strings in files as '
+                                              'they are saved.')
+    _add_wrap_args(watch)
+    watch.add_argument('--convert', action='store_true',
+                       help='Also convert printf-style formatting to '
+                            'f-strings.')
+    watch.add_argument('--debounce', metavar='SECONDS', type=float,
+                       default=0.5,
+                       help='Wait until a file has been unchanged for this '
+                            'long before processing it.')
+    watch.add_argument('--max-interval', metavar='SECONDS', type=float,
+                       default=10.,
+                       help='Upper limit for the polling interval, which '
+                            'otherwise adapts to the size of the tree.')
+    watch.add_argument('paths', nargs='*', type=Path, default=[Path()],
+                       help='Files or folders to watch.')
+    watch.set_defaults(func=_watch)
+
+    # estimate
+    estimate = commands.add_parser('estimate', help='Estimate how many '
+                                                    'strings, lines and files '
+                                                    'would change for a set of '
+                                                    'widths, without wrapping.')
+    estimate.add_argument('paths', nargs='*', type=Path, default=[Path()],
+                          help='Files or folders to scan.')
+    estimate.add_argument('-w', '--widths', metavar='WIDTH', type=int,
+                          nargs='+', default=[79, 88, 100, 120],
+                          help='Candidate line widths.')
+    estimate.add_argument('--no-expand-tabs', dest='expand_tabs',
+                          action='store_false',
+                          help='Do not expand tabs when measuring line width.')
+    estimate.add_argument('-j', '--jobs', type=int,
+                          help='Number of processes used for scanning. By '
+                               'default, one per CPU.')
+    estimate.add_argument('--report', metavar='FILE', type=Path,
+                          help='Write the estimate as JSON to FILE.')
+    estimate.set_defaults(func=_estimate)
+
+    # history
+    history = commands.add_parser('history', help='Check the files in a range '
+                                                  'of commits, reading them '
+                                                  'from the object store '
+                                                  'without checking them out.')
+    _add_wrap_args(history)
+    history.add_argument('--convert', action='store_true',
+                         help='Also check for printf-style formatting.')
+    history.add_argument('--path', dest='paths', metavar='PATH',
+                         action='append', default=[],
+                         help='Only check files at or below PATH (relative to '
+                              'the repository root). Can be repeated.')
+    history.add_argument('--report', metavar='FILE', type=Path,
+                         help='Write a JSON report to FILE.')
+    history.add_argument('revisions', nargs='+',
+                         help='Revision range(s), as for `git rev-list`, eg. '
+                              'v1.0..HEAD.')
+    history.set_defaults(func=_history)
+
+    return parser
+
+
+def _add_wrap_args(parser):
+    parser.add_argument('-w', '--width', type=int, default=DEFAULT_WIDTH,
+                        help='Maximal line width.')
+    parser.add_argument('--no-expand-tabs', dest='expand_tabs',
+                        action='store_false',
+                        help='Do not expand tabs when measuring line width.')
+    parser.add_argument('--no-strip', dest='strip', action='store_false',
+                        help='Do not strip trailing whitespace.')
+    parser.add_argument('--paragraphs', action='store_true',
+                        help='Reflow triple-quoted strings paragraph by '
+                             'paragraph, leaving paragraphs that fit '
+                             'untouched.')
+
+
+def _add_batch_args(parser):
+    parser.add_argument('--shard', metavar='i/N', type=parse_shard,
+                        help='Only process shard i of N. Files are assigned to '
+                             'shards deterministically.')
+    parser.add_argument('--timings', metavar='REPORT', type=load_timings,
+                        help='Balance shards using file timings from a '
+                             'previous report.')
+    parser.add_argument('--report', metavar='FILE', type=Path,
+                        help='Write a JSON report to FILE.')
+    parser.add_argument('--timeout', metavar='SECONDS', type=float,
+                        help='Time budget per file. Files are then processed '
+                             'in a worker process, which is restarted if the '
+                             'budget is exceeded.')
+    parser.add_argument('--max-memory', metavar='MB', type=float,
+                        help='Memory budget of the worker process.')
+    parser.add_argument('--quarantine', metavar='FILE', type=Path,
+                        help='Record files that exceed their budget in FILE, '
+                             'and skip them in later runs until they change.')
+    parser.add_argument('--prefetch', metavar='N', type=int,
+                        default=DEFAULT_DEPTH,
+                        help='Number of files to read ahead (and write behind) '
+                             'in background threads. 0 disables threaded '
+                             'I/O.')
+    parser.add_argument('-j', '--jobs', type=int, default=0,
+                        help='Number of files processed concurrently. With a '
+                             'time or memory budget, the number of worker '
+                             'processes.')
+    parser.add_argument('--backend', choices=('thread', 'process'),
+                        default='thread',
+                        help='Process files concurrently in threads (best on '
+                             'free-threaded python) or processes.')
+
+
+def _add_git_args(parser):
+    parser.add_argument('files', nargs='*', type=Path,
+                        help='Source files. With --staged or --since, the diff '
+                             'is restricted to these paths.')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--staged', action='store_true',
+                       help='Only touch lines in the staged changes.')
+    group.add_argument('--since', metavar='REV',
+                       help='Only touch lines changed relative to revision REV.')
+
+
+def _get_ranges(args):
+    # map of files to line ranges. None means the entire file
+    if not (args.staged or args.since):
+        return dict.fromkeys(find_files(args.files))
+
+    from .git import changed_lines
+
+    changed = changed_lines(args.since, args.staged, args.files)
+    return {path: ranges for path, ranges in changed.items()
+            if path.suffix == '.py'}
+
+
+def _wrap(args):
+    if args.cache:
+        wrap_memo.attach(args.cache)
+
+    for path, ranges in _get_ranges(args).items():
+        if args.strip:
+            strip_trailing_space(path, ranges=ranges)
+        if args.jobs and ranges is None:
+            from .parallel import parallel_rewrap_file
+
+            parallel_rewrap_file(path, args.width, args.expand_tabs,
+                                 paragraphs=args.paragraphs, jobs=args.jobs)
+        else:
+            rewrap_file(path, args.width, args.expand_tabs, ranges,
+                        paragraphs=args.paragraphs)
+
+    wrap_memo.report('Wrap memo')
+
+
+def _fix(args):
+    return _batch(args, fix=True)
+
+
+def _check(args):
+    return _batch(args, fix=False)
+
+
+def _batch(args, fix):
+    report = run(_get_ranges(args), args.width, args.expand_tabs, fix,
+                 args.strip, args.convert, args.wrap, args.shard, args.timings,
+                 args.prefetch, args.paragraphs, args.timeout,
+                 args.max_memory and int(args.max_memory * 2 ** 20),
+                 args.quarantine, args.comments, args.jobs, args.backend)
+    if args.report:
+        write_report(report, args.report)
+
+    _print_summary(report)
+    return exit_code(report)
+
+
+def _plan(args):
+    from .plan import make_plan, write_plan
+
+    plan = make_plan(_get_ranges(args), args.width, args.expand_tabs,
+                     args.strip, args.convert, args.wrap, args.paragraphs,
+                     args.comments, args.jobs, args.backend)
+    write_plan(plan, args.output)
+    edits = sum(len(entry.get('edits', ())) for entry in plan['files'])
+    print(f'{len(plan["files"])} files, {edits} edits planned.')
+    return 2 * any('error' in entry for entry in plan['files'])
+
+
+def _apply(args):
+    from .plan import apply_plan, load_plan
+
+    results = apply_plan(load_plan(args.plan), args.dry_run)
+    counts = {}
+    for path, status in results.items():
+        counts[status] = counts.get(status, 0) + 1
+        if status in ('stale', 'missing', 'error'):
+            print(f'{path}: {status}')
+
+    print(', '.join(f'{n} {status}' for status, n in sorted(counts.items()))
+          or 'Nothing to apply.')
+    return 2 if counts.keys() & {'stale', 'missing', 'error'} else 0
+
+
+def _ingest(args):
+    from .lint import LINE_LENGTH_CODES, ingest
+
+    text = (sys.stdin.read() if args.report == '-' else
+            Path(args.report).read_text())
+    results = ingest(text, args.width, args.expand_tabs,
+                     paragraphs=args.paragraphs,
+                     codes=set(args.codes or LINE_LENGTH_CODES),
+                     dry_run=args.dry_run)
+
+    totals = dict(files=len(results), findings=0, strings=0, wrapped=0,
+                  skipped=0, errors=0)
+    for path, result in results.items():
+        if 'error' in result:
+            totals['errors'] += 1
+            continue
+
+        for line_nr in result['skipped']:
+            print(f'{path}:{line_nr}: skipped (not a string)')
+        for key in ('findings', 'strings', 'wrapped'):
+            totals[key] += result[key]
+        totals['skipped'] += len(result['skipped'])
+
+    print('{files} files, {findings} findings in {strings} strings, {wrapped} '
+          'wrapped, {skipped} skipped, {errors} errors.'.format(**totals))
+    return 2 if totals['errors'] else 0
+
+
+def _merge(args):
+    report = merge_reports(map(load_report, args.reports))
+    if args.output:
+        write_report(report, args.output)
+
+    _print_summary(report)
+    return exit_code(report)
+
+
+def _print_summary(report):
+    if not report['fix']:
+        for path, result in report['files'].items():
+            for line_nr, kind in result.get('violations', ()):
+                print(f'{path}:{line_nr}: {kind}')
+
+    for path, result in report['files'].items():
+        if 'quarantined' in result:
+            print(f'{path}: quarantined ({result["quarantined"]})')
+
+    print('{files} files, {strings} strings, {wrapped} wrapped, {violations} '
+          'violations, {changed} changed ({written} bytes written), {errors} '
+          'errors, {quarantined} quarantined in {time:.2f}s.'
+          .format(**report['summary']))
+
+
+def _strip(args):
+    for path, ranges in _get_ranges(args).items():
+        strip_trailing_space(path, ranges=ranges)
+
+
+def _estimate(args):
+    from .estimate import Estimate
+
+    estimate = Estimate.from_paths(args.paths, args.expand_tabs, args.jobs)
+    report = estimate.report(args.widths)
+    if args.report:
+        write_report(report, args.report)
+
+    print('{files} files, {strings} strings on {lines} lines.'.format(**report))
+    print('Line widths: ' + ', '.join(f'p{p}: {w}' if p != 'max' else
+                                      f'max: {w}' for p, w in
+                                      report['distribution'].items()))
+    print(f'{"width":>6} {"strings":>8} {"lines":>8} {"files":>8}')
+    for width, counts in report['affected'].items():
+        print('{:>6} {strings:>8} {lines:>8} {files:>8}'.format(width, **counts))
+
+
+def _history(args):
+    from .git import check_revisions
+
+    report = check_revisions(args.revisions, args.width, args.expand_tabs,
+                             args.strip, args.convert, args.paragraphs,
+                             args.paths)
+    if args.report:
+        write_report(report, args.report)
+
+    for commit, listing in report['commits'].items():
+        print('{} {files} files, {strings} strings, {violations} violations, '
+              '{errors} errors.'.format(commit[:10], **listing['summary']))
+
+    print(f'{len(report["blobs"])} distinct files checked in '
+          f'{len(report["commits"])} commits.')
+    return int(any(listing['summary']['violations'] or
+                   listing['summary']['errors']
+                   for listing in report['commits'].values()))
+
+
+def _watch(args):
+    from .watch import watch
+
+    watch(args.paths, args.width, args.expand_tabs, args.strip, args.convert,
+          args.debounce, args.max_interval, args.paragraphs)
+
+
+# ---------------------------------------------------------------------------- #
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+
+    logger.remove()
+    logger.add(sys.stderr, level=max(30 - 10 * args.verbose, 10))
+
+    if args.profile or args.cprofile:
+        profiler.enable(args.cprofile)
+
+    try:
+        return args.func(args) or 0
+    finally:
+        if profiler.enabled:
+            if args.profile:
+                profiler.to_chrome_trace(args.profile)
+            profiler.report()
@@ -1,27 +1,48 @@
 
 # std
 import re
+import os
 import textwrap as txw
+import math
+import bisect
+import threading
 import itertools as itt
+from array import array
 from pathlib import Path
 
 # third-party
 from loguru import logger
 
 # local
-from recipes import op
 from recipes.io import backed_up
-from recipes.iter import first_false_index
 from recipes.string.delimited import braces, level
 
-
-# FIXME: wrap brackets when needed at return '...'
+# relative
+from .memo import Memo
+from .edits import Edit, apply_edits
+from .profiling import profiler
+from .verify import verify_wrap
 
 
 # ---------------------------------------------------------------------------- #
 DEFAULT_WIDTH = 80
 
-RGX_LINE_COMMENT = re.compile(r'(?m)^((?![\n])\s*)#(?P<comment>.*)$')
+# Strings are only wrapped if there are at least this many columns left after
+# the column at which they start
+MIN_WRAP_WIDTH = 20
+
+RGX_LINE_COMMENT = re.compile(r'(?m)^([^\S\n]*)#(?P<comment>.*)$')
+
+# comments that are never reflowed (matched against the text after the '#')
+RGX_SPECIAL_COMMENT = re.compile(r'''(?x)
+    [!:%]                               # shebang, attribute doc (#:), cell (#%%)
+  | .*(?:-\*-|\bcoding[:=])              # encoding declaration, editor modes
+  | \s*(?:vim?|ex):                     # modeline
+  | \s*(?:type|fmt|isort|pylint|mypy|pyright|pyre|ruff|flake8)\s*:
+  | \s*(?:pragma|nosec)\b               # tool directives
+  | .*\bnoqa\b
+  | \s*([-=~^*#+])\1{2,}                 # section ruler
+    ''')
 
 # NOTE: this pattern cannot parse multiple strings per line:'hello' ' world'
 # see: `parse_string_blocks`
@@ -38,11 +59,39 @@ RGX_PYSTRING = re.compile(r'''(?xsm)     # verbose, dotall (. matches newline)
     (?P<post>[^\n]*)                    # trailing code
     ''')
 
+# same as above, but matches strings preceded by code on the same line
+RGX_PYSTRING_INLINE = re.compile(RGX_PYSTRING.pattern.replace(r'^\s*', '', 1))
+
 RGX_TRAILSPACE = re.compile(r'[ \t]+\n')
 
+# Tokens that change the bracket depth, and the strings and comments in which
+# brackets do not count
+RGX_BRACKET_TOKENS = re.compile(r'''(?xs)
+    \#[^\n]*                                # comment
+  | \'\'\'(?:[^\\]|\\.)*?\'\'\'             # string
+  | """(?:[^\\]|\\.)*?"""
+  | '(?:[^'\\\n]|\\.)*'
+  | "(?:[^"\\\n]|\\.)*"
+  | (?P<open>[(\[{])
+  | (?P<close>[)\]}])
+''')
+
+# paragraphs in triple-quoted strings
+RGX_LIST_ITEM = re.compile(r'\s*(?:[-*+]|\d+[.)])\s+')
+RGX_VERBATIM = re.compile(r'''(?x)
+    \s*$ |                          # blank line
+    \s*([-=~^*#+])\1{2,}\s*$ |      # section underline
+    \s*(?:>>>|\.\.\.)(?:\s|$) |      # doctest
+    .*\\$                           # escaped newline
+    ''')
+
 # ---------------------------------------------------------------------------- #
-get_contents = op.ItemVector('content', default='')
-get_comments = op.ItemVector('comment', default=None)
+# memoized wrap results
+wrap_memo = Memo()
+
+# per-file locks serializing writes from multiple threads
+_write_locks = {}
+_write_locks_guard = threading.Lock()
 
 # ---------------------------------------------------------------------------- #
 
@@ -55,7 +104,75 @@ def is_code(text):
     return text and not text.isspace() and not is_comment(text)
 
 
-def parse_string_blocks(text):
+def in_ranges(ranges, first, last=None):
+    """
+    Check if the line interval [`first`, `last`] intersects any of the line
+    ranges. `ranges` should be a sorted sequence of (first, last) line number
+    pairs (1-indexed, inclusive) that do not overlap. If `ranges` is None, all
+    lines are considered to be in range.
+    """
+    if ranges is None:
+        return True
+
+    last = first if last is None else last
+    # index of the last range that starts at or before `first`
+    i = bisect.bisect_right(ranges, (first, math.inf)) - 1
+    if i >= 0 and ranges[i][1] >= first:
+        return True
+
+    # otherwise the next range has to start before `last`
+    return (i + 1 < len(ranges)) and (ranges[i + 1][0] <= last)
+
+
+class Brackets:
+    """
+    Spans of the outermost bracket pairs in the source code `text`, for
+    repeated "is this position enclosed in brackets" lookups. The text is only
+    scanned on the first lookup. One instance is shared by the strings parsed
+    from the same text, so the spans live exactly as long as the strings do.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self._spans = None
+
+    def __contains__(self, position):
+        starts, ends = self.spans
+        i = bisect.bisect_left(starts, position) - 1
+        return i >= 0 and position <= ends[i]
+
+    @property
+    def spans(self):
+        if self._spans is None:
+            self._spans = self._scan()
+        return self._spans
+
+    def _scan(self):
+        starts, ends = array('q'), array('q')
+        depth = 0
+        for match in RGX_BRACKET_TOKENS.finditer(self.text):
+            if match['open']:
+                if depth == 0:
+                    starts.append(match.start())
+                depth += 1
+            elif match['close'] and depth:
+                depth -= 1
+                if depth == 0:
+                    ends.append(match.start())
+        if depth:
+            ends.append(len(self.text))
+        return starts, ends
+
+
+def in_brackets(text, position):
+    """
+    Whether `position` in the source code `text` is enclosed in brackets. Use
+    `Brackets` for repeated lookups in the same text.
+    """
+    return position in Brackets(text)
+
+
+def parse_string_blocks(text, ranges=None):
     """
     Parse strings from python source code. Yield list of re.Match objects for
     lines constituting a single (multi-line, implicitly joined) str.
@@ -64,6 +181,10 @@ def parse_string_blocks(text):
     ----------
     text : str
         Source code string
+    ranges : sequence of tuple, optional
+        Sorted (first, last) line number pairs (1-indexed, inclusive). If
+        given, only strings that intersect these line ranges are yielded. By
+        default, None, all strings are yielded.
 
     Examples
     --------
@@ -75,6 +196,22 @@ def parse_string_blocks(text):
         The line buffer. These lines are interpreted as a single (implicitly
         joined) string by python.
     """
+    if ranges is None:
+        yield from _iter_string_blocks(text)
+        return
+
+    # count lines incrementally so we only scan the text once
+    line_nr, pos = 1, 0
+    for block in _iter_string_blocks(text):
+        start, end = block[0].start('marks'), block[-1].end('quote')
+        first = line_nr = line_nr + text.count('\n', pos, start)
+        last = line_nr = line_nr + text.count('\n', start, end)
+        pos = end
+        if in_ranges(ranges, first, last):
+            yield block
+
+
+def _iter_string_blocks(text):
     if not text:
         return
 
@@ -105,8 +242,11 @@ def parse_string_blocks(text):
             logger.debug('Found string with {} lines:\n> {}', len(buffer), buffer)
             yield buffer
 
-            another = _check_prev_post(text, prev)
-            buffer = [another] if another else [match]
+            if (another := _check_prev_post(text, prev)):
+                logger.debug('Found string with 1 lines:\n> {}', another)
+                yield [another]
+
+            buffer = [match]
 
         else:
             # This line continues a joined string
@@ -119,20 +259,18 @@ def parse_string_blocks(text):
         logger.debug('Found string with {} lines:\n> {}', len(buffer), buffer)
         yield buffer
 
+        if (another := _check_prev_post(text, prev)):
+            logger.debug('Found string with 1 lines:\n> {}', another)
+            yield [another]
+
 
 def _check_prev_post(text, prev):
     # multiple strings per line?
-    if RGX_PYSTRING.match(post := prev['post']):
-        faux = text[prev.start():prev.start('post')]
-        faux = faux.replace(prev['quote'], '$') + post
-        if another := RGX_PYSTRING.match(faux):
-            logger.info(
-                'There are multiple independent strings in this line. '
-                'Replacing quotes {!r} of the previous string (here in '
-                "the current match's 'pre' group) with '$'.",
-                prev['quote']
-            )
-        return another
+    # NOTE: Match against the source text (not a copy of the line) so that the
+    # match positions are valid offsets into `text`.
+    if another := RGX_PYSTRING_INLINE.match(text, prev.start('post')):
+        logger.info('There are multiple independent strings in this line.')
+    return another
 
 
 # def _get_info_matches(matches):
@@ -180,6 +318,12 @@ def wrap(lines, width=DEFAULT_WIDTH, marks='', quote="'", indents=('', ''),
     #     logger.info('No wrap required.')expandtabs
     #     return False, ''.join(lines)
 
+    # textwrap never terminates if there is no room after the indent
+    if width <= max(map(len, indents)):
+        raise ValueError(f'No room to wrap string starting at column '
+                         f'{len(indents[0]) - len(opening)} within width '
+                         f'{width + len(opening) * single}.')
+
     # hard wrap
     lines = txw.TextWrapper(width, *indents, expand_tabs,
                             replace_whitespace=False, drop_whitespace=False
@@ -288,6 +432,156 @@ def wrap_fstring(string, width, marks='f', quote="'", indents=('', ''),
     return lines
 
 
+def split_paragraphs(lines, indent=0):
+    """
+    Split the (physical) lines of the content of a triple-quoted string into
+    paragraphs. Paragraphs are separated by blank lines, changes in indentation
+    and list items. Blank lines, section underlines, doctest lines and lines
+    ending in an escaped newline are never reflowed.
+
+    Parameters
+    ----------
+    lines : list of str
+        The content of the string, split at newlines.
+    indent : int
+        Indentation of the first line, which starts after the opening quotes.
+
+    Returns
+    -------
+    list of tuple
+        (first, stop, hang) line index ranges of the paragraphs, with `hang`
+        the indentation of continuation lines, or None if the paragraph should
+        not be reflowed.
+    """
+    paragraphs = []
+    for i, line in enumerate(lines):
+        if RGX_VERBATIM.match(line):
+            paragraphs.append([i, i + 1, None])
+            continue
+
+        space = len(line) - len(line.lstrip())
+        column = space + (indent if i == 0 else 0)
+        item = RGX_LIST_ITEM.match(line)
+        if paragraphs and paragraphs[-1][2] == column and not item:
+            paragraphs[-1][1] = i + 1
+        else:
+            hang = column + (len(item[0]) - space if item else 0)
+            paragraphs.append([i, i + 1, hang])
+
+    return list(map(tuple, paragraphs))
+
+
+def wrap_paragraphs(content, width=DEFAULT_WIDTH, marks='', quote='"""',
+                    column=0, tail=0, expand_tabs=True, fstring=False):
+    """
+    Hard wrap the content of a triple-quoted string paragraph by paragraph.
+    Only paragraphs containing lines wider than `width` are reflowed, all other
+    lines are kept exactly as they are.
+
+    Parameters
+    ----------
+    content : str
+        The content of the string.
+    column : int
+        Column at which the string (including its prefix marks) starts.
+    tail : int
+        Width of the code following the closing quotes on the last line.
+    fstring : bool
+        Whether the string is an f-string. Paragraphs containing replacement
+        fields are not reflowed.
+
+    Returns
+    -------
+    list of str
+        Source code lines of the new string.
+    """
+    opening = marks + quote
+    offset = column + len(opening)
+    lines = content.split('\n')
+    last = len(lines) - 1
+
+    def rendered(i):
+        line = lines[i].expandtabs() if expand_tabs else lines[i]
+        return (len(line) + offset * (i == 0) +
+                (len(quote) + tail) * (i == last))
+
+    new = []
+    for first, stop, hang in split_paragraphs(lines, column):
+        block = lines[first:stop]
+        if (hang is None
+                or max(map(rendered, range(first, stop))) <= width
+                or (fstring and '{' in ''.join(block))):
+            new.extend(block)
+            continue
+
+        indent = (' ' * offset if first == 0 else
+                  block[0][:len(block[0]) - len(block[0].lstrip())])
+        reserve = (len(quote) + tail) * (stop > last)
+        wrapped = txw.TextWrapper(width - reserve, indent, ' ' * hang,
+                                  expand_tabs, break_long_words=False,
+                                  break_on_hyphens=False
+                                  ).wrap(' '.join(map(str.strip, block)))
+        if first == 0:
+            wrapped[0] = wrapped[0][offset:]
+        new.extend(wrapped)
+
+    return (opening + '\n'.join(new) + quote).split('\n')
+
+
+def comment_edits(text, strings=(), width=DEFAULT_WIDTH, expand_tabs=True):
+    """
+    Generate edits that reflow overlong comments. Consecutive full-line
+    comments at the same indentation form a block, which is split into
+    paragraphs like the content of a docstring (see `split_paragraphs`). Only
+    paragraphs containing lines wider than `width` are reflowed. Comment lines
+    inside `strings` (the strings in `text`, as found by the scan) are ignored,
+    as are special comments like encoding declarations, tool directives and
+    section rulers.
+
+    Yields
+    ------
+    Edit
+    """
+    starts = [string.start for string in strings]
+    block = []
+    for match in itt.chain(RGX_LINE_COMMENT.finditer(text), [None]):
+        if match is not None:
+            i = bisect.bisect_right(starts, match.start()) - 1
+            if i >= 0 and match.start() < strings[i].end:
+                # inside a string
+                continue
+
+        if block and (match is None
+                      or match.start() != block[-1].end() + 1
+                      or match[1] != block[-1][1]
+                      or RGX_SPECIAL_COMMENT.match(match['comment'])):
+            yield from _reflow_comments(block, width, expand_tabs)
+            block = []
+
+        if match and not RGX_SPECIAL_COMMENT.match(match['comment']):
+            block.append(match)
+
+
+def _reflow_comments(block, width, expand_tabs):
+    prefix = block[0][1] + '#'
+    lines = [match['comment'] for match in block]
+    for first, stop, hang in split_paragraphs(lines):
+        paragraph = [prefix + line for line in lines[first:stop]]
+        if hang is None or max(len(line.expandtabs() if expand_tabs else line)
+                               for line in paragraph) <= width:
+            continue
+
+        line = lines[first]
+        space = line[:len(line) - len(line.lstrip())]
+        new = txw.TextWrapper(width, prefix + space, prefix + ' ' * hang,
+                              expand_tabs,
+                              break_long_words=False, break_on_hyphens=False
+                              ).wrap(' '.join(map(str.strip, lines[first:stop])))
+        if new != paragraph:
+            yield Edit(block[first].start(), block[stop - 1].end(),
+                       '\n'.join(new))
+
+
 def maybe_joined_str(line):
     return (match := RGX_PYSTRING.match(line)) and not is_code(match['post'])
 
@@ -312,63 +606,54 @@ def maybe_joined_str(line):
 class StringWrapper:  # (metaclass=StringParserMeta)
 
     @classmethod
-    def parse(cls, text, offset=0):
-        for matches in parse_string_blocks(text):
-            yield cls(matches, offset)
+    def parse(cls, text, offset=0, ranges=None, source=None, brackets=None):
+        # the strings share the bracket spans of the (full) source text
+        if brackets is None:
+            brackets = Brackets(text if source is None else source)
+        for matches in parse_string_blocks(text, ranges):
+            yield cls(matches, offset, source, brackets)
 
     @classmethod
-    def from_file(cls, filename, line_nr, chunksize=10, width=DEFAULT_WIDTH):
-        # NOTE line numbers are 1 indexed
-        file = Path(filename)
-        assert file.exists()
+    def from_file(cls, filename, line_nr, chunksize=None, width=DEFAULT_WIDTH):
+        """
+        The string at line `line_nr` (1-indexed) in the file. If there are
+        several strings on the line, the first one that does not fit within
+        `width` is returned. Strings are located with the file's
+        `restring.index.StringIndex`, which is cached, so repeated lookups in
+        the same file are cheap. The `chunksize` parameter is no longer used.
+        """
+        with profiler.span('locate', line=line_nr):
+            return cls._from_file(filename, line_nr, width)
+
+    @classmethod
+    def _from_file(cls, filename, line_nr, width):
+        from .index import StringIndex
 
         logger.debug('Attempting to parse string in {}:{}.', filename, line_nr)
-        with file.open('r') as fp:
-            # move to position a few lines before given line
-            read_lines(fp, max(line_nr - chunksize - 1, 0))
-            # read chunk
-            head = read_lines(fp, min(chunksize, line_nr - 1))
-
-            # cursor position now at start of line containing the beginning the
-            # string
-            offset = fp.tell()
-
-            # read next chunk
-            lines = read_lines(fp, chunksize)
-
-        match = RGX_PYSTRING.match(lines[0])
-        if not match:
-            raise ValueError(f'Could not find a string in {filename!r} at line '
-                             f'{line_nr}.')
-
-        if not is_code(match['pre']):
-            # find the starting line of the current string
-            if start := first_false_index(head[::-1], maybe_joined_str):
-                prepend = head[-start:]
-                lines = prepend + lines
-                offset -= sum(map(len, prepend))
-
-        block = ''.join(lines)
-        for wrapper in cls.parse(block, offset):
-            # disambiguate between multiple strings per line
-            if (len(wrapper._matches) == 1) and wrapper.last.start('post') < width:
-                # RGX_PYSTRING.match(wrapper.last['post']
-                logger.debug("Going to next string since this one doesn't need "
-                             "wrap.")
-                continue
+        if not (strings := StringIndex.from_file(filename).at_line(line_nr)):
+            raise ValueError(f'Could not find a string in {str(filename)!r} at '
+                             f'line {line_nr}.')
 
-            return wrapper
+        # disambiguate between multiple strings per line
+        for wrapper in strings:
+            if len(wrapper._matches) > 1 or wrapper.end_column() > width:
+                return wrapper
 
-        raise ValueError(f'Could not find any string in {filename!r} near line '
-                         f'{line_nr}.')
+        logger.debug('No string at line {} needs wrapping.', line_nr)
+        return strings[0]
 
     # alias
     fromfile = from_file
 
-    def __init__(self, matches, offset=0):
+    def __init__(self, matches, offset=0, source=None, brackets=None):
+        # `source` is the full text if `matches` were parsed from a slice of it
+        # starting at `offset`
         assert matches
         self._matches = list(matches)
         self._offset = int(offset)
+        self._source = None if source is None else (source, self._offset)
+        self._brackets = brackets
+        self._bracketed = None
 
     def __str__(self):
         sep = '\n|'
@@ -382,7 +667,7 @@ class StringWrapper:  # (metaclass=StringParserMeta)
 
     @property
     def lines(self):
-        return get_contents(self._matches)
+        return [match['content'] for match in self._matches]
 
     @property
     def first(self):
@@ -400,19 +685,67 @@ class StringWrapper:  # (metaclass=StringParserMeta)
     def end(self):
         return self.last.start('post') + self._offset
 
+    @property
+    def source(self):
+        """The source code of the string (all its parts) in the parsed text."""
+        return self.first.string[self.first.start('marks'):self.last.start('post')]
+
+    @property
+    def bracketed(self):
+        """
+        Whether the string is enclosed in brackets, so that it can be split
+        into implicitly joined pieces on multiple lines.
+        """
+        if self._bracketed is None:
+            # the offset may change as edits are applied, so the one the string
+            # was parsed at is used
+            source, offset = self._source or (self.first.string, 0)
+            if self._brackets is None:
+                self._brackets = Brackets(source)
+            self._bracketed = (self.first.start('marks') + offset
+                               in self._brackets)
+        return self._bracketed
+
     @property
     def indents(self):
         # Get indent for line from file. We have to make the first line break
         # earlier so we can use the result as a drop-in replacement
-        indent = ' ' * (self.first.start('marks') - self.first.start())
+        start = self.first.start('marks')
+        line_start = self.first.string.rfind('\n', 0, start) + 1
+        indent = ' ' * (start - line_start)
         return [indent, indent]
 
+    def line_widths(self, expand_tabs=True):
+        """
+        Rendered width of each of the (physical) source code lines spanned by
+        the string, including any code before and after it on those lines.
+        """
+        text = self.first.string
+        start = text.rfind('\n', 0, self.first.start('marks')) + 1
+        lines = text[start:self.last.end('post')].splitlines()
+        if expand_tabs:
+            lines = map(str.expandtabs, lines)
+        return list(map(len, lines))
+
+    def fits(self, width=DEFAULT_WIDTH, expand_tabs=True):
+        return max(self.line_widths(expand_tabs)) <= width
+
+    def end_column(self, expand_tabs=True):
+        """Rendered column just after the closing quote of the string."""
+        text = self.last.string
+        end = self.last.start('post')
+        line = text[text.rfind('\n', 0, end) + 1:end]
+        return len(line.expandtabs() if expand_tabs else line)
+
     def is_fstring(self):
         return ('f' in self.first['marks'].lower())
 
     def is_raw(self):
         return ('r' in self.first['marks'].lower())
 
+    def is_triple(self):
+        return len(self._matches) == 1 and len(self.first['quote']) == 3
+
     # def _gen_split_points(self):
     #     for line in self:
 
@@ -452,28 +785,83 @@ class StringWrapper:  # (metaclass=StringParserMeta)
 
     #     yield leftover
 
-    def wrap(self, width=DEFAULT_WIDTH, expand_tabs=True):
+    def wrap(self, width=DEFAULT_WIDTH, expand_tabs=True, paragraphs=False,
+             memo=None):
+        """
+        Hard wrap the string. If `paragraphs` is True, triple-quoted strings
+        are reflowed paragraph by paragraph, and only paragraphs with overlong
+        lines are changed (see `wrap_paragraphs`). Results are memoized in
+        `memo`, by default the shared `wrap_memo`.
+        """
+        # identical strings at the same indentation wrap identically, so the
+        # result is memoized on content
+        first = self.first
+        paragraphs = paragraphs and self.is_triple()
+        key = (''.join(self.lines), first['marks'], first['quote'],
+               tuple(self.indents), width, expand_tabs, self.bracketed)
+        if paragraphs:
+            key += ('paragraphs', self.tail)
+        with profiler.span('wrap', string=self.start, fstring=self.is_fstring()):
+            memo = wrap_memo if memo is None else memo
+            return list(memo.lookup(key, self._wrap, width, expand_tabs,
+                                    paragraphs))
+
+    @property
+    def tail(self):
+        """Width of the code following the closing quote."""
+        return len(self.last['post'].rstrip())
+
+    def _wrap(self, width, expand_tabs, paragraphs=False):
 
+        first = self.first
+        if paragraphs:
+            logger.debug('Hard wrapping paragraphs of triple-quoted string.')
+            return wrap_paragraphs(first['content'], width, first['marks'],
+                                   first['quote'], len(self.indents[0]),
+                                   self.tail, expand_tabs, self.is_fstring())
+
+        # Implicitly joined pieces can only span multiple lines inside brackets,
+        # so add parentheses if the string is not enclosed in any
+        indents = self.indents
+        parens = not (self.is_triple() or self.bracketed)
+        if parens:
+            indents = [indent + ' ' for indent in indents]
+            width -= 1
+
+        lines = self._wrap_lines(width, expand_tabs, indents)
+        if parens and len(lines) > 1:
+            lines = [f'({lines[0]}', *lines[1:-1], f'{lines[-1]})']
+        return lines
+
+    def _wrap_lines(self, width, expand_tabs, indents):
+        first = self.first
         lines = self.lines
         if expand_tabs:
             lines = map(str.expandtabs, lines)
 
-        first = self.first
         if self.is_fstring():
             logger.opt(lazy=True).debug('Hard wrapping fstring:\n  {}',
                                         lambda: '\n  '.join(map(repr, self.lines)))
-            logger.debug('Indents: {}', self.indents)
+            logger.debug('Indents: {}', indents)
             return wrap_fstring(''.join(lines), width,
                                 first['marks'], first['quote'],
-                                self.indents)
+                                indents)
 
         logger.opt(lazy=True).debug('Hard wrapping:\n  {}',
                                     lambda: '\n  '.join(map(repr, self.lines)))
         return wrap(self.lines, width,
                     first['marks'], first['quote'],
-                    self.indents, expand_tabs)
+                    indents, expand_tabs)
 
-    def wrap_in_file(self, filename, width, expand_tabs):
+    def verify(self, lines, reflow=False):
+        """
+        Check that the wrapped `lines` represent the same string value (up to
+        whitespace if `reflow` is True), raising `VerificationError` if not.
+        """
+        with profiler.span('verify', string=self.start):
+            verify_wrap(self, lines, reflow)
+
+    def wrap_in_file(self, filename, width, expand_tabs, verify=True):
         width = int(width)
         assert width > 0
 
@@ -483,23 +871,39 @@ class StringWrapper:  # (metaclass=StringParserMeta)
         new = self.wrap(width, expand_tabs)
         logger.debug('The wrapped string is: \n {}',
                      '\n  '.join(map(repr, new)))
+        if verify:
+            self.verify(new)
 
-        # changed
-        if (new != self.lines):
-            with backed_up(filename, 'r+') as fp:
-                self._write(fp, new)
-        else:
+        # Compare the rendered source, so strings that are already correctly
+        # wrapped do not trigger a write
+        if '\n'.join(new) == self.source:
             logger.info('No wrap required.')
+            return 0
+
+        with file_lock(filename), profiler.span('write', string=self.start), \
+                backed_up(filename, 'r+') as fp:
+            return self._write(fp, new)
 
     def _write(self, fp, lines):
-        fp.seek(self.end)
+        # Returns the number of bytes written. The offsets are character
+        # offsets into the decoded text, which are not valid seek positions in
+        # a text-mode file, so read up to the string (in chunks, to keep memory
+        # use low) to get one.
+        remaining = self.start
+        while remaining > 0 and (chunk := fp.read(min(remaining, 2 ** 16))):
+            remaining -= len(chunk)
+        position = fp.tell()
+        if fp.read(self.end - self.start) != self.source:
+            raise ValueError(f'File {fp.name!r} changed since the string at '
+                             f'offset {self.start} was parsed.')
+
         tail = fp.read()
-        fp.seek(self.start)
-        fp.write('\n'.join(lines))
-        # if len(new) != len(self.lines):
-        #     # only needed if new different number of lines to old
+        fp.seek(position)
+        new = '\n'.join(lines)
+        fp.write(new)
         fp.write(tail)
         fp.truncate()
+        return len(new.encode()) + len(tail.encode())
 
 
 def read_lines(fp, nlines):
@@ -508,16 +912,135 @@ def read_lines(fp, nlines):
     return [fp.readline() for _ in range(nlines)]
 
 
-def rewrap(filename, line_nr, width=DEFAULT_WIDTH, expand_tabs=True):
+def file_lock(filename):
+    """
+    Lock serializing the writes to `filename` by the threads of this process.
+    Files are identified by their absolute path.
+    """
+    key = os.path.abspath(filename)
+    with _write_locks_guard:
+        if (lock := _write_locks.get(key)) is None:
+            lock = _write_locks[key] = threading.Lock()
+    return lock
+
+
+def rewrap(filename, line_nr, width=DEFAULT_WIDTH, expand_tabs=True,
+           verify=True):
     # hard wrap python strings in a file
     width = width or DEFAULT_WIDTH
     assert width > 0
 
     #
-    wrapper = StringWrapper.from_file(filename, line_nr, width=width)
-    wrapper.wrap_in_file(filename, width, expand_tabs)
+    with profiler.file(filename):
+        wrapper = StringWrapper.from_file(filename, line_nr, width=width)
+        wrapper.wrap_in_file(filename, width, expand_tabs, verify)
     return wrapper
 
+
+def rewrap_file(filename, width=DEFAULT_WIDTH, expand_tabs=True, ranges=None,
+                verify=True, paragraphs=False):
+    """
+    Hard wrap all the python strings in a file that do not fit within `width`.
+    The file is only rewritten (once) if any of the strings need wrapping.
+
+    Parameters
+    ----------
+    filename : str or Path
+        The source file.
+    width : int, optional
+        Maximal line width, by default DEFAULT_WIDTH.
+    expand_tabs : bool, optional
+        Whether to expand tabs before measuring line widths, by default True.
+    ranges : sequence of tuple, optional
+        Sorted (first, last) line number pairs (1-indexed, inclusive). If given,
+        only strings intersecting these lines are wrapped.
+    verify : bool, optional
+        Whether to check that wrapping leaves the value of each string
+        unchanged, by default True. Strings that fail the check are skipped.
+    paragraphs : bool, optional
+        Whether to reflow triple-quoted strings paragraph by paragraph, only
+        changing paragraphs with overlong lines, by default False.
+
+    Returns
+    -------
+    int
+        The number of bytes written. Files are only opened for writing if any
+        of their strings actually change.
+    """
+    width = width or DEFAULT_WIDTH
+    assert width > 0
+
+    with profiler.file(filename):
+        return _rewrap_file(filename, width, expand_tabs, ranges, verify,
+                            paragraphs)
+
+
+def _rewrap_file(filename, width, expand_tabs, ranges, verify, paragraphs):
+    text = Path(filename).read_text()
+    with profiler.span('scan'):
+        strings = list(StringWrapper.parse(text, ranges=ranges))
+
+    edits = list(wrap_edits(strings, width, expand_tabs, verify, paragraphs))
+    if not edits:
+        logger.info('No wrap required in {!r}.', str(filename))
+        return 0
+
+    new = apply_edits(text, edits)
+    with file_lock(filename), profiler.span('write'), \
+            backed_up(filename, 'w') as fp:
+        fp.write(new)
+
+    return len(new.encode())
+
+
+def wrap_edits(strings, width=DEFAULT_WIDTH, expand_tabs=True, verify=True,
+               paragraphs=False, memo=None):
+    """
+    Generate edits that hard wrap the strings that do not fit within `width`.
+    Strings that are already correctly wrapped, or that fail verification,
+    yield no edits.
+
+    Parameters
+    ----------
+    strings : iterable of StringWrapper
+        The strings to wrap.
+    width : int, optional
+        Maximal line width, by default DEFAULT_WIDTH.
+    expand_tabs : bool, optional
+        Whether to expand tabs before measuring line widths, by default True.
+    verify : bool, optional
+        Whether to check that wrapping leaves the value of each string
+        unchanged, by default True.
+    paragraphs : bool, optional
+        Whether to reflow triple-quoted strings paragraph by paragraph, only
+        changing paragraphs with overlong lines, by default False.
+    memo : Memo, optional
+        Memo for the wrap results, by default the shared `wrap_memo`.
+
+    Yields
+    ------
+    Edit
+    """
+    for string in strings:
+        if string.fits(width, expand_tabs):
+            continue
+
+        if width - len(string.indents[0]) < MIN_WRAP_WIDTH:
+            logger.debug('Not wrapping string at offset {}: it starts too close '
+                         'to the maximal width.', string.start)
+            continue
+
+        try:
+            new = string.wrap(width, expand_tabs, paragraphs, memo)
+            if verify:
+                string.verify(new, paragraphs and string.is_triple())
+        except ValueError as err:
+            logger.warning('Could not wrap string {!r}: {}', string.lines[0], err)
+            continue
+
+        if (new := '\n'.join(new)) != string.source:
+            yield Edit(string.start, string.end, new)
+
 # ---------------------------------------------------------------------------- #
 
 
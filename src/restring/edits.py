@@ -0,0 +1,112 @@
+"""
+Text edits: replacement of a span of characters in a source string.
+"""
+
+# std
+import bisect
+from collections import namedtuple
+
+
+# ---------------------------------------------------------------------------- #
+Edit = namedtuple('Edit', ('start', 'stop', 'text'))
+Edit.__doc__ = 'Replace characters `start` to `stop` of the source with `text`.'
+
+# ---------------------------------------------------------------------------- #
+
+
+def sort_edits(edits):
+    """
+    Sort edits by position and check that they do not overlap. Insertions
+    (zero-length spans) are allowed to touch their neighbours.
+    """
+    edits = sorted(map(Edit._make, edits))
+    for prev, edit in zip(edits, edits[1:]):
+        if edit.start < prev.stop:
+            raise ValueError(f'Overlapping edits: {prev} and {edit}.')
+    return edits
+
+
+def apply_edits(text, edits):
+    """Apply non-overlapping edits to `text` and return the new string."""
+    parts, pos = [], 0
+    for start, stop, new in sort_edits(edits):
+        parts.extend((text[pos:start], new))
+        pos = stop
+    parts.append(text[pos:])
+    return ''.join(parts)
+
+
+def delta(edit):
+    """Change in text length caused by `edit`."""
+    return len(edit.text) - (edit.stop - edit.start)
+
+
+def compose(text, first, second):
+    """
+    Combine two batches of edits into a single batch. The edits in `first`
+    apply to some original string and produce `text`, to which the edits in
+    `second` apply. The returned edits apply to the original string and produce
+    the same result as applying `first` followed by `second`.
+
+    Examples
+    --------
+    >>> original = 'hello world'
+    >>> first = [Edit(0, 5, 'goodbye')]
+    >>> text = apply_edits(original, first)
+    >>> second = [Edit(8, 13, 'moon')]
+    >>> compose(text, first, second)
+    [Edit(start=0, stop=5, text='goodbye'), Edit(start=6, stop=11, text='moon')]
+    """
+    # Locate the text inserted by the first edits in the intermediate `text`
+    intervals, shift = [], 0
+    for edit in sort_edits(first):
+        start = edit.start + shift
+        intervals.append((start, start + len(edit.text), 0, edit))
+        shift += delta(edit)
+    intervals.extend((*edit[:2], 1, edit) for edit in sort_edits(second))
+
+    # Group overlapping (or touching) edits, in intermediate coordinates
+    clusters = []
+    for start, stop, which, edit in sorted(intervals, key=lambda _: _[:2]):
+        if clusters and start <= clusters[-1][1]:
+            cluster = clusters[-1]
+            cluster[1] = max(cluster[1], stop)
+        else:
+            clusters.append(cluster := [start, stop, [], []])
+        cluster[2 + which].append(edit)
+
+    # Map each cluster back to the original coordinates
+    composed, shift = [], 0
+    for start, stop, firsts, seconds in clusters:
+        total = shift + sum(map(delta, firsts))
+        new = apply_edits(text[start:stop],
+                          [(e.start - start, e.stop - start, e.text)
+                           for e in seconds])
+        composed.append(Edit(start - shift, stop - total, new))
+        shift = total
+
+    return composed
+
+
+def to_positions(text, edits):
+    """
+    Convert the character offsets of `edits` on `text` into (line, column)
+    positions (both 0-indexed), as used by editors and language servers.
+
+    Returns
+    -------
+    list of tuple
+        ((start_line, start_col), (stop_line, stop_col), new_text) for each
+        edit.
+    """
+    line_starts = [0]
+    pos = -1
+    while (pos := text.find('\n', pos + 1)) != -1:
+        line_starts.append(pos + 1)
+
+    def position(offset):
+        line = bisect.bisect_right(line_starts, offset) - 1
+        return line, offset - line_starts[line]
+
+    return [(position(start), position(stop), new)
+            for start, stop, new in sort_edits(edits)]
@@ -0,0 +1,267 @@
+"""
+Embeddable engine for long-lived host processes (editors, servers, build
+daemons). An `Engine` is configured once, and keeps its state between calls:
+parsed documents (keyed by file stat, so unchanged files are not read or
+scanned again), a wrap memo, and a pool of worker processes for processing many
+files.
+"""
+
+# std
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from functools import partial
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+# third-party
+from loguru import logger
+
+# relative
+from .memo import Memo
+from .profiling import profiler
+from .core import DEFAULT_WIDTH, file_lock
+from .pipeline import (Document, comment_pass, convert_pass, rewrap_pass,
+                       strip_pass, write_source)
+
+
+# ---------------------------------------------------------------------------- #
+# How files are written:
+#   backup:  under backup, restored if writing fails
+#   atomic:  to a temporary file that replaces the original
+#   inplace: directly
+#   none:    not at all (dry run)
+WRITE_STRATEGIES = ('backup', 'atomic', 'inplace', 'none')
+
+DEFAULT_MAXSIZE = 2 ** 10
+
+# engine of a worker process
+_engine = None
+
+# ---------------------------------------------------------------------------- #
+
+
+def _stat_key(file):
+    stat = file.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _init_worker(config):
+    global _engine
+    _engine = Engine(**config)
+
+
+def _call(method, filename):
+    return getattr(_engine, method)(filename)
+
+
+class Engine:
+    """
+    Configured restring instance that reuses its state across calls.
+
+    Parameters
+    ----------
+    width : int
+        Maximal line width.
+    expand_tabs : bool
+        Whether to expand tabs before measuring line widths.
+    write : {'backup', 'atomic', 'inplace', 'none'}
+        How changed files are written.
+    workers : int
+        Number of worker processes used by `map`. If 0, files are processed in
+        this process.
+    verify : bool
+        Whether to reject wraps that change the value of a string.
+    paragraphs : bool
+        Whether to reflow triple-quoted strings paragraph by paragraph.
+    comments : bool
+        Whether `fix` also reflows overlong comments.
+    quote : str, optional
+        Quote character for converted f-strings.
+    cache : str or Path, optional
+        On-disk backing store for the wrap memo.
+    maxsize : int
+        Maximal number of parsed documents kept.
+
+    Examples
+    --------
+    >>> with Engine(width=88, write='atomic') as engine:
+    ...     engine.fix('foo.py')
+    ...     engine.rewrap_file('foo.py')  # not read or scanned again
+    """
+
+    def __init__(self, width=DEFAULT_WIDTH, expand_tabs=True, write='backup',
+                 workers=0, verify=True, paragraphs=False, comments=False,
+                 quote=None, cache=None, maxsize=DEFAULT_MAXSIZE):
+
+        if write not in WRITE_STRATEGIES:
+            raise ValueError(f'Invalid write strategy {write!r}. Valid '
+                             f'options are: {WRITE_STRATEGIES}.')
+
+        self.width = int(width)
+        self.expand_tabs = bool(expand_tabs)
+        self.write = write
+        self.workers = int(workers)
+        self.verify = bool(verify)
+        self.paragraphs = bool(paragraphs)
+        self.comments = bool(comments)
+        self.quote = quote
+        self.maxsize = int(maxsize)
+
+        self.memo = Memo(filename=cache)
+        self.documents = OrderedDict()  # file -> (stat, Document)
+        self._cache = cache
+        self._pool = None
+
+    def __repr__(self):
+        return (f'<{type(self).__name__}: width={self.width}, '
+                f'write={self.write!r}, {len(self.documents)} documents>')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def config(self):
+        """Parameters for creating an identical engine (eg. in a worker)."""
+        return dict(width=self.width, expand_tabs=self.expand_tabs,
+                    write=self.write, verify=self.verify,
+                    paragraphs=self.paragraphs, comments=self.comments,
+                    quote=self.quote, cache=self._cache, maxsize=self.maxsize)
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(self.workers,
+                                             initializer=_init_worker,
+                                             initargs=(self.config, ))
+        return self._pool
+
+    def close(self):
+        """Shut down the worker pool and release the caches."""
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+        self.memo.close()
+        self.documents.clear()
+
+    # ------------------------------------------------------------------------ #
+    def _load(self, file):
+        # Cached documents are removed from the cache while they are being
+        # edited, and put back once they are consistent with the file again
+        key = _stat_key(file)
+        cached = self.documents.pop(file, None)
+        if cached and cached[0] == key:
+            return cached[1]
+
+        return Document(file.read_text(), file)
+
+    def _store(self, file, document):
+        self.documents[file] = (_stat_key(file), document)
+        while len(self.documents) > self.maxsize:
+            self.documents.popitem(last=False)
+
+    def _write(self, file, text):
+        if self.write == 'backup':
+            return write_source(file, text)
+
+        with file_lock(file), profiler.span('write'):
+            if self.write == 'inplace':
+                file.write_text(text)
+            else:
+                with tempfile.NamedTemporaryFile('w', dir=file.parent,
+                                                 prefix=f'.{file.name}.',
+                                                 delete=False) as fp:
+                    fp.write(text)
+                shutil.copymode(file, fp.name)
+                os.replace(fp.name, file)
+
+        return len(text.encode())
+
+    def run(self, filename, passes):
+        """
+        Run `passes` on the file, and write it if it changed. Returns the
+        number of bytes written.
+        """
+        file = Path(filename)
+        with profiler.file(file):
+            document = self._load(file)
+            for pass_ in passes:
+                document.apply(pass_(document))
+
+            if not document.changed:
+                self._store(file, document)
+                return 0
+
+            if self.write == 'none':
+                logger.info('Would change {!r}.', str(file))
+                return 0
+
+            written = self._write(file, document.text)
+
+        # The new text becomes the baseline, with its strings already located
+        fresh = Document(document.text, file)
+        fresh._strings = document._strings
+        self._store(file, fresh)
+        return written
+
+    # ------------------------------------------------------------------------ #
+    def _rewrap_pass(self, ranges=None):
+        return partial(rewrap_pass, width=self.width,
+                       expand_tabs=self.expand_tabs, ranges=ranges,
+                       verify=self.verify, paragraphs=self.paragraphs,
+                       memo=self.memo)
+
+    def _comment_pass(self, ranges=None):
+        return partial(comment_pass, width=self.width,
+                       expand_tabs=self.expand_tabs, ranges=ranges)
+
+    def rewrap(self, filename, line_nr):
+        """Hard wrap the string at `line_nr` in the file."""
+        return self.rewrap_file(filename, [(line_nr, line_nr)])
+
+    def rewrap_file(self, filename, ranges=None):
+        """Hard wrap the strings in the file that do not fit."""
+        return self.run(filename, [self._rewrap_pass(ranges)])
+
+    def strip(self, filename, ranges=None):
+        """Strip trailing whitespace."""
+        return self.run(filename, [partial(strip_pass, ranges=ranges)])
+
+    def convert(self, filename, ranges=None):
+        """Convert printf-style formatting to f-strings."""
+        return self.run(filename, [partial(convert_pass, quote=self.quote,
+                                           ranges=ranges)])
+
+    def reflow_comments(self, filename, ranges=None):
+        """Reflow comments that do not fit."""
+        return self.run(filename, [self._comment_pass(ranges)])
+
+    def fix(self, filename, ranges=None):
+        """Strip, convert and hard wrap in a single pass over the file."""
+        passes = [partial(strip_pass, ranges=ranges),
+                  partial(convert_pass, quote=self.quote, ranges=ranges),
+                  self._rewrap_pass(ranges)]
+        if self.comments:
+            passes.append(self._comment_pass(ranges))
+        return self.run(filename, passes)
+
+    def map(self, method, filenames):
+        """
+        Call `method` (eg. 'fix') for each file, in the worker pool if the
+        engine has workers. Returns a dict of the bytes written per file.
+        """
+        filenames = list(filenames)
+        if not self.workers:
+            return {file: getattr(self, method)(file) for file in filenames}
+
+        # files are changed by the workers, so our copies become stale
+        for file in filenames:
+            self.documents.pop(Path(file), None)
+
+        results = self.pool.map(profiler.remote(_call),
+                                [method] * len(filenames), filenames)
+        return dict(zip(filenames, map(profiler.collect, results)))
@@ -0,0 +1,149 @@
+"""
+Estimate the impact of a change in line width across a source tree without
+wrapping anything. Each file is scanned for strings once, and the widths of the
+lines the strings occupy are collected into arrays. Counts for any number of
+candidate widths then follow from sorted-array lookups.
+
+Strings are counted as affected if any of their lines exceed the width (ie.
+`StringWrapper.fits` is False), which is an upper bound on the number of
+strings `rewrap` would change.
+"""
+
+# std
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+# third-party
+import numpy as np
+from loguru import logger
+
+# relative
+from .core import StringWrapper
+from .batch import find_files
+
+
+# ---------------------------------------------------------------------------- #
+DEFAULT_WIDTHS = (79, 88, 100, 120)
+PERCENTILES = (50, 90, 99, 99.9)
+
+# ---------------------------------------------------------------------------- #
+
+
+def measure(text, expand_tabs=True):
+    """
+    Widths of the lines in `text` that contain strings, and the maximal line
+    width spanned by each string.
+
+    Returns
+    -------
+    line_widths : np.ndarray
+        Width of each string-bearing line.
+    string_widths : np.ndarray
+        Width of the widest line spanned by each string.
+    """
+    strings = list(StringWrapper.parse(text))
+    if not strings:
+        return np.zeros(0, int), np.zeros(0, int)
+
+    lines = text.split('\n')
+    lengths = np.fromiter(map(len, lines), int, len(lines))
+    starts = np.concatenate(([0], np.cumsum(lengths + 1)[:-1]))
+    widths = (np.fromiter(map(len, map(str.expandtabs, lines)), int, len(lines))
+              if expand_tabs else lengths)
+
+    # line index of the first and last line of each string
+    spans = np.array([(string.start, string.end) for string in strings])
+    first, last = np.searchsorted(starts, spans.T, 'right') - 1
+
+    # maximum width over the lines of each string
+    padded = np.append(widths, 0)
+    bounds = np.column_stack((first, last + 1)).ravel()
+    string_widths = np.maximum.reduceat(padded, bounds)[::2]
+
+    # lines covered by any string
+    cover = np.zeros(len(widths) + 1, int)
+    np.add.at(cover, first, 1)
+    np.add.at(cover, last + 1, -1)
+    line_widths = widths[np.cumsum(cover[:-1]) > 0]
+    return line_widths, string_widths
+
+
+def _measure_file(filename, expand_tabs):
+    try:
+        return measure(Path(filename).read_text(), expand_tabs)
+    except (OSError, UnicodeDecodeError) as err:
+        logger.warning('Could not read {!r}: {}', str(filename), err)
+        return np.zeros(0, int), np.zeros(0, int)
+
+
+class Estimate:
+    """
+    Line and string widths collected from a set of files.
+
+    Examples
+    --------
+    >>> estimate = Estimate.from_paths(['src'])
+    ... estimate.affected([88, 100])
+    """
+
+    def __init__(self, files, line_widths, string_widths):
+        # per-file arrays
+        self.files = list(files)
+        self.line_widths = np.sort(np.concatenate([[], *line_widths])
+                                   ).astype(int)
+        self.string_widths = np.sort(np.concatenate([[], *string_widths])
+                                     ).astype(int)
+        self.file_widths = np.sort([widths.max(initial=0)
+                                    for widths in string_widths])
+
+    @classmethod
+    def from_paths(cls, paths, expand_tabs=True, jobs=None):
+        """Scan the source files in `paths`, using `jobs` processes."""
+        files = list(find_files(paths))
+        if jobs == 1:
+            results = [_measure_file(file, expand_tabs) for file in files]
+        else:
+            with ProcessPoolExecutor(jobs) as pool:
+                results = list(pool.map(_measure_file, files,
+                                        [expand_tabs] * len(files),
+                                        chunksize=64))
+
+        return cls(files, *zip(*results)) if results else cls([], [], [])
+
+    def distribution(self, percentiles=PERCENTILES):
+        """Percentiles of the widths of the string-bearing lines."""
+        if not self.line_widths.size:
+            return {}
+
+        values = np.percentile(self.line_widths, percentiles,
+                               method='inverted_cdf')
+        return {**dict(zip(percentiles, values.astype(int).tolist())),
+                'max': int(self.line_widths[-1])}
+
+    def histogram(self, step=10):
+        """Number of string-bearing lines per width bin of size `step`."""
+        counts = np.bincount(self.line_widths // step)
+        return {int(i * step): int(n) for i, n in enumerate(counts) if n}
+
+    def affected(self, widths=DEFAULT_WIDTHS):
+        """
+        Number of strings, lines and files that exceed each of the candidate
+        `widths`.
+        """
+        widths = np.asarray(widths)
+        counts = {}
+        for name in ('strings', 'lines', 'files'):
+            values = getattr(self, f'{name[:-1]}_widths')
+            counts[name] = len(values) - np.searchsorted(values, widths,
+                                                         'right')
+        return {int(width): {name: int(count[i])
+                             for name, count in counts.items()}
+                for i, width in enumerate(widths)}
+
+    def report(self, widths=DEFAULT_WIDTHS):
+        return dict(files=len(self.files),
+                    strings=len(self.string_widths),
+                    lines=len(self.line_widths),
+                    distribution=self.distribution(),
+                    histogram=self.histogram(),
+                    affected=self.affected(widths))
@@ -1,66 +1,154 @@
 
 
 # std
+import re
 import ast
-import textwrap as txw
+import threading
+import itertools as itt
+from functools import partial
 
 # third-party
 from loguru import logger
+from flynt.state import State
 from flynt.transform.transform import transform_chunk as fstring_transform
 
-# local
-from recipes.io import write_replace
-
-
-class GetMod(ast.NodeVisitor):
-    def __init__(self):
-        super().__init__()
-        self.mod = None
-
-    def visit_BinOp(self, node):
-        if isinstance(node.op, ast.Mod):
-            self.mod = node
-
-
-def get_mod(tree):
-    v = GetMod()
-    v.visit(tree)
-    return v.mod
-
-
-def _convert_fstring(block, string=None, quote=None, width=DEFAULT_WIDTH, expandtabs=True):
-    if not isinstance(string, StringWrapper):
-        string = StringWrapper.parse(block)
-
-    # get mod part
-    block = txw.dedent(block)
-    tree = ast.parse(block)
-    mod = get_mod(tree)
-    # if v.rhs is None:
-    #     raise ValueError('not found')
-    original = ast.get_source_segment(block, mod)  # python >=3.8
-    modstring = ast.get_source_segment(block, mod.right)
-
-    # return f'{string.unwrapped!r} % {modstring}'
-
-    quote = quote or string.quote
-    # FIXME: this function is frekkin useless!
-    new, changed = fstring_transform(
-        f'{string.unwrapped!r} % {modstring}', quote)
-    new = StringWrapper.parse(new)
-    new.indents = string.indents
-
-    return original, new.wrap(width, expandtabs), changed
+# relative
+from .memo import Memo
+from .profiling import profiler
+from .edits import Edit
+from .core import DEFAULT_WIDTH, in_ranges
+from .pipeline import Document, Pipeline, convert_pass, rewrap_pass
+
+
+# ---------------------------------------------------------------------------- #
+# memoized conversion results
+convert_memo = Memo()
+
+# flynt keeps module level state, so conversions are serialized
+_flynt_lock = threading.Lock()
+
+RGX_QUOTE = re.compile('[\'"]')
+# A string followed by the modulo operator (possibly after closing brackets or
+# line breaks)
+RGX_MOD_OPERATOR = re.compile(r'[\s\\)]*%(?!=)')
+
+# ---------------------------------------------------------------------------- #
+
+
+def _transform(fmt, args, quote):
+    try:
+        tree = ast.parse(f'{fmt!r} % {args}')
+    except SyntaxError:
+        return None, False
+
+    with _flynt_lock:
+        new, changed = fstring_transform(tree, State(), quote)
+    # flynt returns (None, False) for expressions it refuses to convert
+    return (new, True) if changed else (None, False)
+
+
+def iter_mod_formats(text):
+    """
+    Find printf-style formatting expressions `'...' % args` in source code.
+    Only the outermost expression is yielded for nested formatting.
+
+    Yields
+    ------
+    start, stop : int
+        Character span of the expression in `text`.
+    fmt : str
+        The (evaluated) format string.
+    args : str
+        Source code for the format arguments.
+    quote : str
+        The quote character used for the format string.
+    """
+    try:
+        tree = ast.parse(text)
+    except SyntaxError as err:
+        logger.warning('Could not parse source code: {}', err)
+        return
+
+    lines = text.splitlines(keepends=True)
+    starts = [0, *itt.accumulate(map(len, lines))]
+
+    def offset(line_nr, col):
+        # ast column offsets count utf-8 bytes
+        return starts[line_nr - 1] + len(lines[line_nr - 1].encode()[:col].decode())
+
+    found = []
+    for node in ast.walk(tree):
+        if (isinstance(node, ast.BinOp) and isinstance(node.op, ast.Mod) and
+                isinstance(node.left, ast.Constant) and
+                isinstance(node.left.value, str)):
+            start = offset(node.lineno, node.col_offset)
+            stop = offset(node.end_lineno, node.end_col_offset)
+            left = offset(node.left.lineno, node.left.col_offset)
+            quote = RGX_QUOTE.search(text, left)[0]
+            found.append((start, stop, node.left.value,
+                          ast.get_source_segment(text, node.right), quote))
+
+    stop = -1
+    for item in sorted(found):
+        if item[0] >= stop:
+            yield item
+            stop = item[1]
+
+
+def convert_edits(text, quote=None, ranges=None, document=None):
+    """
+    Edits converting printf-style formatting expressions in `text` to
+    f-strings.
+
+    Parameters
+    ----------
+    text : str
+        Source code.
+    quote : str, optional
+        Quote character for the converted strings, by default the one used by
+        the original.
+    ranges : sequence of tuple, optional
+        Sorted (first, last) line number pairs (1-indexed, inclusive). If given,
+        only expressions intersecting these lines are converted.
+    document : Document, optional
+        The pipeline document for `text`. Its string scan is used to skip
+        parsing the module if no string is followed by a `%` operator.
+
+    Returns
+    -------
+    list of Edit
+    """
+    if document is None:
+        document = Document(text)
+
+    if not any(RGX_MOD_OPERATOR.match(text, string.end)
+               for string in document.strings):
+        return []
+
+    edits = []
+    for start, stop, fmt, args, q in iter_mod_formats(text):
+        if not in_ranges(ranges, document.line_nr(start),
+                         document.line_nr(stop)):
+            continue
+
+        q = quote or q
+        with profiler.span('convert', string=start):
+            new, changed = convert_memo.lookup((fmt, args, q),
+                                               _transform, fmt, args, q)
+        if changed:
+            edits.append(Edit(start, stop, new))
+
+    return edits
 
 
 def convert_fstring(filename, line_nr, quote=None, width=DEFAULT_WIDTH, expandtabs=True):
-
-    i, j, block, strings = get_code_block(filename, line_nr)
-    s = StringWrapper.from_matches(zip(block[i:-j or None], strings))
-
-    block = ''.join(block)
-    origin, new, changed = _convert_fstring(block, s, quote, width, expandtabs)
-    if changed:
-        write_replace(filename, {origin: new})
-    else:
+    """
+    Convert the printf-style formatting expression at `line_nr` in the file to
+    an f-string, and hard wrap the result.
+    """
+    ranges = [(line_nr, line_nr)]
+    pipeline = Pipeline(partial(convert_pass, quote=quote, ranges=ranges),
+                        partial(rewrap_pass, width=width,
+                                expand_tabs=expandtabs, ranges=ranges))
+    if not pipeline.run(filename).changed:
         logger.info('String not converted.')
@@ -0,0 +1,327 @@
+"""
+Incremental operation on files tracked by a local git repository. Only the
+lines that were changed (in the working tree, the index, or relative to a given
+revision) are considered for wrapping and whitespace stripping. Historical
+revisions can be checked without checking them out, by reading the files
+straight from the object store (see `check_revisions`).
+"""
+
+# std
+import re
+import subprocess as sub
+from pathlib import Path, PurePosixPath
+from time import perf_counter
+
+# third-party
+from loguru import logger
+
+# relative
+from . import strip_trailing_space
+from .pipeline import Document
+from .core import DEFAULT_WIDTH, rewrap_file
+from .batch import process_document, summarize
+
+
+# ---------------------------------------------------------------------------- #
+RGX_DIFF_FILE = re.compile(r'\+\+\+ (?:b/(?P<path>.+)|/dev/null)$')
+RGX_DIFF_HUNK = re.compile(r'@@ -\d+(?:,\d+)? \+(?P<start>\d+)(?:,(?P<n>\d+))? @@')
+
+# tree entry modes
+MODE_TREE = b'40000'
+MODE_SYMLINK = b'120000'
+MODE_SUBMODULE = b'160000'
+
+# ---------------------------------------------------------------------------- #
+
+
+def git(*args, cwd=None):
+    """Run a git command and return its standard output."""
+    return sub.run(['git', '-c', 'core.quotepath=off', *args],
+                   cwd=cwd, capture_output=True, text=True, check=True).stdout
+
+
+def get_root(cwd=None):
+    """Top level directory of the git repository containing `cwd`."""
+    return Path(git('rev-parse', '--show-toplevel', cwd=cwd).strip())
+
+
+def parse_diff(diff):
+    """
+    Parse the output of `git diff --unified=0` into a dict mapping file names
+    (relative to the repository root) to sorted (first, last) ranges of line
+    numbers (1-indexed, inclusive) in the new version of the file. Files for
+    which the diff only removes lines are omitted.
+    """
+    changed = {}
+    ranges = None
+    for line in diff.splitlines():
+        if (match := RGX_DIFF_FILE.match(line)):
+            # deleted files have no lines in the new version
+            path = match['path']
+            ranges = None if path is None else changed.setdefault(path, [])
+
+        elif ranges is not None and (match := RGX_DIFF_HUNK.match(line)):
+            start, n = int(match['start']), int(match['n'] or 1)
+            if n:
+                ranges.append((start, start + n - 1))
+
+    return {path: ranges for path, ranges in changed.items() if ranges}
+
+
+def changed_lines(revision=None, staged=False, paths=(), cwd=None):
+    """
+    Get the changed line ranges for files in the git repository.
+
+    Parameters
+    ----------
+    revision : str, optional
+        Compare against this revision (commit, branch, tag ...). By default,
+        None, the working tree is compared against the index, or, if `staged`
+        is True, the index is compared against HEAD.
+    staged : bool, optional
+        Use the staged changes (the index), by default False.
+    paths : sequence of str or Path, optional
+        Restrict the diff to these paths.
+    cwd : str or Path, optional
+        Directory inside the repository, by default the current directory.
+
+    Returns
+    -------
+    dict
+        Mapping of absolute file paths to sorted (first, last) line number
+        pairs (1-indexed, inclusive) of changed lines.
+    """
+    # explicit prefixes, since `parse_diff` expects them regardless of the
+    # user's diff.noprefix / diff.mnemonicPrefix settings
+    args = ['diff', '--unified=0', '--no-color', '--no-ext-diff',
+            '--diff-filter=d', '--src-prefix=a/', '--dst-prefix=b/']
+    if staged:
+        args.append('--cached')
+    if revision:
+        args.append(revision)
+
+    root = get_root(cwd)
+    diff = git(*args, '--', *map(str, paths), cwd=cwd)
+    return {root / path: ranges for path, ranges in parse_diff(diff).items()}
+
+
+def rewrap_changed(revision=None, staged=False, paths=(), width=DEFAULT_WIDTH,
+                   expand_tabs=True, strip=True, suffixes=('.py', ), cwd=None):
+    """
+    Wrap strings and strip trailing whitespace only on the lines that were
+    changed. Files without changes are skipped entirely.
+
+    Parameters
+    ----------
+    revision, staged, paths, cwd
+        See `changed_lines`.
+    width : int, optional
+        Maximal line width, by default DEFAULT_WIDTH.
+    expand_tabs : bool, optional
+        Whether to expand tabs before measuring line widths, by default True.
+    strip : bool, optional
+        Whether to also strip trailing whitespace, by default True.
+    suffixes : tuple of str, optional
+        Only files with these extensions are processed, by default ('.py', ).
+
+    Returns
+    -------
+    dict
+        Mapping of file paths to the number of bytes written by wrapping.
+    """
+    results = {}
+    for path, ranges in changed_lines(revision, staged, paths, cwd).items():
+        if path.suffix not in suffixes:
+            continue
+
+        logger.debug('Processing lines {} in {!r}.', ranges, str(path))
+        if strip:
+            # NOTE: stripping does not change line numbers, so the ranges remain
+            # valid for wrapping below
+            strip_trailing_space(path, ranges=ranges)
+
+        results[path] = rewrap_file(path, width, expand_tabs, ranges)
+
+    return results
+
+
+# ---------------------------------------------------------------------------- #
+
+class CatFile:
+    """
+    Read objects from the repository's object store through a single
+    long-lived `git cat-file --batch` process.
+
+    Examples
+    --------
+    >>> with CatFile() as store:
+    ...     kind, data = store.read('HEAD:setup.py')
+    """
+
+    def __init__(self, cwd=None):
+        self.process = sub.Popen(['git', 'cat-file', '--batch'], cwd=cwd,
+                                 stdin=sub.PIPE, stdout=sub.PIPE)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.process.poll() is None:
+            self.process.stdin.close()
+            self.process.wait()
+        self.process.stdout.close()
+
+    def read(self, name):
+        """
+        Read the object `name` (an object id, or any name git understands,
+        like 'HEAD:setup.py'). Returns the object type and content.
+        """
+        self.process.stdin.write(f'{name}\n'.encode())
+        self.process.stdin.flush()
+
+        header = self.process.stdout.readline().split()
+        if len(header) != 3:
+            raise KeyError(f'Object not found: {name!r}.')
+
+        _, kind, size = header
+        data = self.process.stdout.read(int(size))
+        self.process.stdout.read(1)  # trailing newline
+        return kind.decode(), data
+
+
+def parse_tree(data, size=20):
+    """
+    Parse the content of a tree object into (mode, name, oid) entries. Object
+    ids are `size` bytes long (20 for sha1, 32 for sha256 repositories).
+    """
+    pos = 0
+    while pos < len(data):
+        space = data.index(b' ', pos)
+        nul = data.index(b'\0', space)
+        yield (data[pos:space],
+               data[space + 1:nul].decode(errors='surrogateescape'),
+               data[nul + 1:nul + 1 + size].hex())
+        pos = nul + 1 + size
+
+
+def list_revisions(revisions, cwd=None):
+    """Commit ids for the revision range(s), as listed by `git rev-list`."""
+    return git('rev-list', *revisions, '--', cwd=cwd).split()
+
+
+class _TreeWalker:
+    # List the blobs in the tree of a commit. Trees are cached by id, so the
+    # (mostly unchanged) trees of consecutive commits are read only once
+
+    def __init__(self, store, suffixes, paths=()):
+        self.store = store
+        self.suffixes = tuple(suffixes)
+        self.paths = [PurePosixPath(path) for path in paths]
+        self.trees = {}
+
+    def _entries(self, oid):
+        if (entries := self.trees.get(oid)) is None:
+            _, data = self.store.read(oid)
+            entries = self.trees[oid] = list(parse_tree(data, len(oid) // 2))
+        return entries
+
+    def _selected(self, path, tree):
+        # whether the path is (or, for trees, may contain) a selected path
+        return not self.paths or any(
+            path == sel or sel in path.parents or (tree and path in sel.parents)
+            for sel in self.paths
+        )
+
+    def _walk(self, oid, prefix):
+        for mode, name, entry in self._entries(oid):
+            path = prefix / name
+            if mode == MODE_TREE:
+                if self._selected(path, True):
+                    yield from self._walk(entry, path)
+            elif mode in (MODE_SYMLINK, MODE_SUBMODULE):
+                continue
+            elif name.endswith(self.suffixes) and self._selected(path, False):
+                yield path.as_posix(), entry
+
+    def __call__(self, commit):
+        kind, data = self.store.read(commit)
+        if kind != 'commit':
+            raise ValueError(f'Not a commit: {commit!r}.')
+
+        tree = data.split(b'\n', 1)[0].split()[1].decode()
+        return dict(self._walk(tree, PurePosixPath()))
+
+
+def _check_blob(data, name, width, expand_tabs, strip, convert, paragraphs):
+    start = perf_counter()
+    try:
+        text = data.decode()
+    except UnicodeDecodeError as err:
+        logger.error('Could not process {!r}: {}', name, err)
+        return dict(error=str(err))
+
+    try:
+        result = process_document(Document(text, name), width, expand_tabs,
+                                  strip, convert, True, None, paragraphs)
+    except Exception as err:
+        # a single bad blob should not abort checking the history
+        logger.exception('Unexpected error processing {!r}.', name)
+        return dict(error=repr(err))
+
+    result['time'] = perf_counter() - start
+    return result
+
+
+def check_revisions(revisions, width=DEFAULT_WIDTH, expand_tabs=True,
+                    strip=True, convert=False, paragraphs=False, paths=(),
+                    suffixes=('.py', ), cwd=None):
+    """
+    Check the source files in a range of historical commits, without checking
+    them out. Files are read straight from the object store, and each distinct
+    blob is scanned only once: a file that is unchanged across many commits
+    has its result reused.
+
+    Parameters
+    ----------
+    revisions : sequence of str
+        Revision range(s) in any form understood by `git rev-list`, eg.
+        ['v1.0..HEAD'] or ['--max-count=100', 'main'].
+    paths : sequence of str, optional
+        Only check files at or below these paths (relative to the repository
+        root).
+    suffixes : tuple of str, optional
+        Only files with these extensions are checked, by default ('.py', ).
+    cwd : str or Path, optional
+        Directory inside the repository, by default the current directory.
+
+    Other parameters are as for `restring.batch.process_document`.
+
+    Returns
+    -------
+    dict
+        Report with per-commit file listings (path to blob id) and summaries,
+        and the results of each distinct blob.
+    """
+    commits, blobs = {}, {}
+    options = (width, expand_tabs, strip, convert, paragraphs)
+    with CatFile(cwd) as store:
+        walk = _TreeWalker(store, suffixes, paths)
+        for commit in list_revisions(revisions, cwd):
+            files = walk(commit)
+            for path, oid in files.items():
+                if oid not in blobs:
+                    logger.debug('Checking {} ({}).', path, oid)
+                    blobs[oid] = _check_blob(store.read(oid)[1], path,
+                                             *options)
+
+            commits[commit] = dict(
+                files=files,
+                summary=summarize({path: blobs[oid]
+                                   for path, oid in files.items()})
+            )
+
+    logger.info('Checked {} blobs in {} commits.', len(blobs), len(commits))
+    return dict(width=width, commits=commits, blobs=blobs)
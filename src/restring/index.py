@@ -0,0 +1,192 @@
+"""
+Interval index over the string blocks in a source file, for fast "which string
+is at this line / offset" lookups. The index is built from a single scan of
+the file, and kept up to date as edits are applied.
+
+The spans of the strings (and the line offsets) are stored in compact arrays,
+instead of one `StringWrapper` per string. The index does keep a reference to
+the text, since the `StringWrapper` for a span is created on lookup by
+re-parsing the lines it occupies, so `StringIndex.from_file` holds at most
+`CACHE_SIZE` file contents in memory.
+"""
+
+# std
+import bisect
+import threading
+from array import array
+from pathlib import Path
+from collections import OrderedDict
+
+# relative
+from .edits import apply_edits, sort_edits
+from .core import Brackets, StringWrapper
+from .pipeline import shift_spans
+
+
+# ---------------------------------------------------------------------------- #
+# number of file indices kept by `StringIndex.from_file`
+CACHE_SIZE = 16
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+# ---------------------------------------------------------------------------- #
+
+
+class StringIndex:
+    """
+    Sorted index of the (non-overlapping) string block spans in a text.
+    Lookups by offset or line number take O(log n) time.
+
+    Examples
+    --------
+    >>> index = StringIndex.from_file('foo.py')
+    >>> index.at_line(42)
+    [<StringWrapper: ...>]
+    >>> index.overlapping(10, 20)  # eg. an editor selection
+    """
+
+    def __init__(self, text, strings=None):
+        self.text = text
+        self.starts, self.ends = array('q'), array('q')
+        self._line_starts = None
+        self._wrappers = {}
+        self._brackets = Brackets(text)
+        if strings is None:
+            strings = StringWrapper.parse(text)
+        for string in strings:
+            self.starts.append(string.start)
+            self.ends.append(string.end)
+
+    def __repr__(self):
+        return f'<{type(self).__name__}: {len(self)} strings>'
+
+    def __len__(self):
+        return len(self.starts)
+
+    @classmethod
+    def from_file(cls, filename):
+        """
+        Index for the file. Indices are cached by the file's stat, so repeated
+        lookups in an unchanged file do not read or scan it again.
+        """
+        file = Path(filename).resolve()
+        stat = file.stat()
+        key = (stat.st_mtime_ns, stat.st_size)
+        with _cache_lock:
+            if (cached := _cache.get(file)) and cached[0] == key:
+                _cache.move_to_end(file)
+                return cached[1]
+
+        index = cls(file.read_text())
+        with _cache_lock:
+            _cache[file] = (key, index)
+            while len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+        return index
+
+    # ------------------------------------------------------------------------ #
+    @property
+    def line_starts(self):
+        """Offsets of the first character of each line."""
+        if self._line_starts is None:
+            self._line_starts = array('q', [0])
+            pos = -1
+            while (pos := self.text.find('\n', pos + 1)) != -1:
+                self._line_starts.append(pos + 1)
+        return self._line_starts
+
+    def line_nr(self, position):
+        """Line number (1-indexed) of the character at `position`."""
+        return bisect.bisect_right(self.line_starts, position)
+
+    @property
+    def spans(self):
+        return list(zip(self.starts, self.ends))
+
+    def _get(self, i):
+        # Create the StringWrapper for span `i` by parsing the lines it spans
+        start = self.starts[i]
+        if (string := self._wrappers.get(start)) is None:
+            text = self.text
+            first = text.rfind('\n', 0, start) + 1
+            last = text.find('\n', self.ends[i])
+            last = len(text) if last == -1 else last
+            for string in StringWrapper.parse(text[first:last], first,
+                                              source=text,
+                                              brackets=self._brackets):
+                if (string.start, string.end) == (start, self.ends[i]):
+                    break
+            else:
+                # The lines alone can scan differently from the whole text, eg.
+                # when they start inside another (triple-quoted) string. Fall
+                # back to scanning the whole text, and keep the wrappers.
+                string = self._rescan().get(start)
+                if string is None:
+                    raise ValueError(f'Index out of sync with text at offset '
+                                     f'{start}.')
+            self._wrappers[start] = string
+        return string
+
+    def _rescan(self):
+        spans = set(self.starts)
+        self._wrappers.update((string.start, string) for string in
+                              StringWrapper.parse(self.text,
+                                                  brackets=self._brackets)
+                              if string.start in spans)
+        return self._wrappers
+
+    # ------------------------------------------------------------------------ #
+    def at_offset(self, position):
+        """The string block containing character `position`, or None."""
+        i = bisect.bisect_right(self.starts, position) - 1
+        if i >= 0 and position <= self.ends[i]:
+            return self._get(i)
+        return None
+
+    def overlapping(self, first, last=None):
+        """
+        The string blocks intersecting lines `first` to `last` (1-indexed,
+        inclusive).
+        """
+        last = first if last is None else last
+        line_starts = self.line_starts
+        if first > len(line_starts) or last < first:
+            return []
+
+        start = line_starts[max(first, 1) - 1]
+        stop = (line_starts[last] - 1 if last < len(line_starts) else
+                len(self.text))
+        i = bisect.bisect_left(self.ends, start)
+        j = bisect.bisect_right(self.starts, stop)
+        return [self._get(k) for k in range(i, j)]
+
+    def at_line(self, line_nr):
+        """The string blocks on line `line_nr` (1-indexed)."""
+        return self.overlapping(line_nr)
+
+    # ------------------------------------------------------------------------ #
+    def apply(self, edits):
+        """
+        Apply edits to the text and update the index. Untouched spans are
+        shifted, and only the lines touched by the edits are re-scanned.
+        """
+        if not (edits := sort_edits(edits)):
+            return
+
+        old, self.text = self.text, apply_edits(self.text, edits)
+        shifts, dirty = shift_spans(old, self.text, self.spans, edits)
+        spans = [(start + shift, end + shift)
+                 for (start, end), shift in zip(self.spans, shifts)
+                 if shift is not None]
+        for start, stop in dirty:
+            spans = [span for span in spans if not start <= span[0] < stop]
+            spans.extend((string.start, string.end) for string in
+                         StringWrapper.parse(self.text[start:stop], start))
+
+        spans.sort()
+        self.starts = array('q', (start for start, _ in spans))
+        self.ends = array('q', (end for _, end in spans))
+        self._line_starts = None
+        self._wrappers = {}
+        self._brackets = Brackets(self.text)
@@ -0,0 +1,197 @@
+"""
+Drive string wrapping from linter reports. Line length findings (eg. flake8 /
+ruff E501, pylint C0301) are read from the text or JSON output of the linter,
+grouped by file, and resolved against a single scan of each file: findings on
+lines of the same string block are merged, and each file is rewrapped with a
+single write. Findings on lines without strings are reported as skipped.
+"""
+
+# std
+import re
+import json
+import bisect
+from pathlib import Path
+from collections import Counter, defaultdict, namedtuple
+
+# third-party
+from loguru import logger
+
+# relative
+from .core import DEFAULT_WIDTH, wrap_edits
+from .pipeline import Document
+
+
+# ---------------------------------------------------------------------------- #
+# Codes of line length findings
+LINE_LENGTH_CODES = frozenset({'E501', 'W505', 'B950', 'C0301',
+                               'line-too-long'})
+
+# path:line[:col]: CODE message  (flake8, ruff, pylint text formats)
+RGX_FINDING = re.compile(r'''(?x)
+    ^(?P<path>.+?):(?P<line>\d+)(?::(?P<col>\d+))?:\s*
+    (?P<code>[A-Z]+\d+)\b:?\s*(?P<message>.*)$
+    ''')
+
+# the limit in the message: "(88 > 79 characters)" or "(120/100)"
+RGX_LIMIT = re.compile(r'\(\d+\s*(?:>|/)\s*(?P<limit>\d+)')
+
+Finding = namedtuple('Finding', ('path', 'line', 'col', 'code', 'message'),
+                     defaults=(0, '', ''))
+
+# ---------------------------------------------------------------------------- #
+
+
+def parse_findings(text):
+    """
+    Parse linter output into `Finding`s. Supported formats are the default
+    text output of flake8, ruff and pylint, the JSON output of ruff and pylint
+    (including pylint's json2 format), and flake8-json.
+    """
+    if text.lstrip().startswith(('[', '{')):
+        return list(_parse_json(json.loads(text)))
+    return list(_parse_text(text))
+
+
+def _parse_text(text):
+    for line in text.splitlines():
+        if (match := RGX_FINDING.match(line.strip())):
+            yield Finding(match['path'], int(match['line']),
+                          int(match['col'] or 0), match['code'],
+                          match['message'])
+
+
+def _parse_json(data):
+    if isinstance(data, dict):
+        if 'messages' in data:
+            # pylint json2
+            yield from _parse_json(data['messages'])
+            return
+
+        # flake8-json: {filename: [findings]}
+        for path, items in data.items():
+            for item in items:
+                yield Finding(path, item['line_number'],
+                              item.get('column_number', 0), item['code'],
+                              item.get('text', ''))
+        return
+
+    for item in data:
+        if 'location' in item:
+            # ruff
+            yield Finding(item['filename'], item['location']['row'],
+                          item['location'].get('column', 0), item['code'],
+                          item.get('message', ''))
+        else:
+            # pylint (json and json2)
+            yield Finding(item['path'], item['line'], item.get('column', 0),
+                          item.get('message-id') or item.get('messageId', ''),
+                          item.get('message', ''))
+
+
+def infer_width(findings):
+    """
+    The line width limit stated in the messages of the findings (the most
+    common one), or None if the messages do not state it.
+    """
+    limits = Counter(int(match['limit']) for finding in findings
+                     if (match := RGX_LIMIT.search(finding.message)))
+    return limits.most_common(1)[0][0] if limits else None
+
+
+def group_findings(findings, codes=LINE_LENGTH_CODES):
+    """
+    Group the line numbers of the findings with the given `codes` by file.
+    Returns a dict mapping paths to sorted, unique line numbers.
+    """
+    lines = defaultdict(set)
+    for finding in findings:
+        if finding.code in codes:
+            lines[Path(finding.path)].add(finding.line)
+    return {path: sorted(numbers) for path, numbers in lines.items()}
+
+
+# ---------------------------------------------------------------------------- #
+
+def resolve(document, lines):
+    """
+    Resolve line numbers to the strings of the document. Returns the (unique)
+    strings spanning any of the lines, and the lines without strings.
+    """
+    strings = document.strings
+    firsts = [document.line_nr(string.start) for string in strings]
+    lasts = [document.line_nr(string.end) for string in strings]
+
+    selected, skipped = set(), []
+    for line in lines:
+        # strings are sorted and do not overlap, so the last lines are
+        # sorted too, and the strings spanning the line are contiguous
+        i = bisect.bisect_right(firsts, line) - 1
+        found = False
+        while i >= 0 and lasts[i] >= line:
+            selected.add(i)
+            found = True
+            i -= 1
+
+        if not found:
+            skipped.append(line)
+
+    return [strings[i] for i in sorted(selected)], skipped
+
+
+def rewrap_findings(filename, lines, width=DEFAULT_WIDTH, expand_tabs=True,
+                    verify=True, paragraphs=False, dry_run=False):
+    """
+    Hard wrap the strings at the given lines of a file, with a single scan and
+    a single write.
+
+    Returns
+    -------
+    dict
+        Number of findings, of distinct strings they resolve to, and of
+        strings wrapped, the lines without strings (skipped) and the number of
+        bytes written.
+    """
+    document = Document(Path(filename).read_text(), filename)
+    strings, skipped = resolve(document, lines)
+    edits = list(wrap_edits(strings, width, expand_tabs, verify, paragraphs))
+    document.apply(edits)
+    return dict(findings=len(lines),
+                strings=len(strings),
+                wrapped=len(edits),
+                skipped=skipped,
+                written=0 if dry_run else document.write())
+
+
+def ingest(text, width=None, expand_tabs=True, verify=True, paragraphs=False,
+           codes=LINE_LENGTH_CODES, dry_run=False):
+    """
+    Rewrap the strings flagged by the line length findings in linter output
+    `text` (see `parse_findings`). If `width` is None, the limit stated in
+    the findings is used, falling back to DEFAULT_WIDTH.
+
+    Returns
+    -------
+    dict
+        Per-file results (see `rewrap_findings`), keyed by path.
+    """
+    findings = parse_findings(text)
+    width = width or infer_width(findings) or DEFAULT_WIDTH
+    grouped = group_findings(findings, codes)
+    logger.info('Ingested {} findings in {} files, width {}.',
+                sum(map(len, grouped.values())), len(grouped), width)
+
+    results = {}
+    for path, lines in grouped.items():
+        try:
+            results[path.as_posix()] = rewrap_findings(
+                path, lines, width, expand_tabs, verify, paragraphs, dry_run
+            )
+        except (OSError, UnicodeDecodeError) as err:
+            logger.error('Could not process {!r}: {}', str(path), err)
+            results[path.as_posix()] = dict(error=str(err))
+        except Exception as err:
+            # a single bad file should not abort the others
+            logger.exception('Unexpected error processing {!r}.', str(path))
+            results[path.as_posix()] = dict(error=repr(err))
+
+    return results
@@ -0,0 +1,163 @@
+"""
+Content-addressed memoization of string transforms. Results are kept in a
+bounded in-memory LRU cache, optionally backed by an on-disk store (sqlite)
+that can be shared between worker processes. Memos can be shared between
+threads: lookups and updates are serialized by a lock, while the values are
+computed outside of it.
+"""
+
+# std
+import os
+import json
+import hashlib
+import sqlite3
+import threading
+from pathlib import Path
+from collections import OrderedDict
+
+# third-party
+from loguru import logger
+
+
+# ---------------------------------------------------------------------------- #
+DEFAULT_MAXSIZE = 2 ** 12
+
+# ---------------------------------------------------------------------------- #
+
+
+def make_key(*parts):
+    """Content hash for the key parts. Parts should have stable `repr`s."""
+    return hashlib.blake2b(repr(parts).encode(), digest_size=16).hexdigest()
+
+
+class Memo:
+    """
+    Bounded LRU memo with an optional on-disk backing store.
+
+    Values must be JSON serializable if a backing store is used. Note that
+    sequences are returned from the store as lists.
+
+    Examples
+    --------
+    >>> memo = Memo(maxsize=100)
+    >>> memo.lookup(('hello', 10), str.upper, 'hello')
+    'HELLO'
+    >>> memo.lookup(('hello', 10), str.upper, 'hello')
+    'HELLO'
+    >>> memo.hits, memo.misses
+    (1, 1)
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE, filename=None):
+        self.maxsize = int(maxsize)
+        self.cache = OrderedDict()
+        self.hits = self.disk_hits = self.misses = 0
+        self.filename = None
+        self._db = self._pid = None
+        self._lock = threading.RLock()
+        if filename:
+            self.attach(filename)
+
+    def __repr__(self):
+        return (f'<{type(self).__name__}: size={len(self.cache)}/{self.maxsize}'
+                f', hit_rate={self.hit_rate:.1%}>')
+
+    def __len__(self):
+        return len(self.cache)
+
+    # ------------------------------------------------------------------------ #
+    def attach(self, filename):
+        """Use `filename` as the on-disk backing store for the memo."""
+        self.close()
+        self.filename = Path(filename)
+        self.filename.parent.mkdir(parents=True, exist_ok=True)
+
+    @property
+    def db(self):
+        # Connections can't be shared across process boundaries, so connect
+        # lazily in each (forked) process
+        if self.filename is None:
+            return None
+
+        if self._pid != os.getpid():
+            self._db = sqlite3.connect(self.filename, timeout=30,
+                                       isolation_level=None,
+                                       check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute('CREATE TABLE IF NOT EXISTS memo '
+                             '(key TEXT PRIMARY KEY, value TEXT)')
+            self._pid = os.getpid()
+        return self._db
+
+    def close(self):
+        with self._lock:
+            if self._db is not None and self._pid == os.getpid():
+                self._db.close()
+            self._db = self._pid = None
+
+    # ------------------------------------------------------------------------ #
+    def get(self, key, default=None):
+        key = make_key(*key)
+        with self._lock:
+            return self._get(key, default)
+
+    def _get(self, key, default):
+        if key in self.cache:
+            self.hits += 1
+            self.cache.move_to_end(key)
+            return self.cache[key]
+
+        if (db := self.db) is not None:
+            row = db.execute('SELECT value FROM memo WHERE key = ?',
+                             (key, )).fetchone()
+            if row:
+                self.hits += 1
+                self.disk_hits += 1
+                self._put(key, value := json.loads(row[0]))
+                return value
+
+        self.misses += 1
+        return default
+
+    def set(self, key, value):
+        key = make_key(*key)
+        with self._lock:
+            self._put(key, value)
+            if (db := self.db) is not None:
+                db.execute('INSERT OR REPLACE INTO memo VALUES (?, ?)',
+                           (key, json.dumps(value)))
+
+    def _put(self, key, value):
+        self.cache[key] = value
+        self.cache.move_to_end(key)
+        while len(self.cache) > self.maxsize:
+            self.cache.popitem(last=False)
+
+    def lookup(self, key, func, *args, **kws):
+        """
+        Get the memoized value for `key`, computing it with
+        `func(*args, **kws)` if it is not available.
+        """
+        missing = object()
+        if (value := self.get(key, missing)) is missing:
+            self.set(key, value := func(*args, **kws))
+        return value
+
+    def clear(self):
+        with self._lock:
+            self.cache.clear()
+            self.hits = self.disk_hits = self.misses = 0
+
+    # ------------------------------------------------------------------------ #
+    @property
+    def hit_rate(self):
+        return self.hits / total if (total := self.hits + self.misses) else 0.
+
+    def stats(self):
+        return dict(size=len(self.cache), maxsize=self.maxsize, hits=self.hits,
+                    disk_hits=self.disk_hits, misses=self.misses,
+                    hit_rate=self.hit_rate)
+
+    def report(self, name='memo'):
+        logger.info('{}: {hits} hits ({disk_hits} from disk), {misses} misses, '
+                    'hit rate {hit_rate:.1%}.', name, **self.stats())
@@ -0,0 +1,172 @@
+"""
+Parallel scanning and wrapping of very large (eg. generated) source files. The
+file is split into chunks at top-level statement boundaries, where the scanner
+state is known to be empty (not inside a string or brackets). The chunks are
+processed by worker processes that map the file into memory themselves, so
+only chunk offsets and the resulting edits are sent between processes.
+"""
+
+# std
+import re
+import mmap
+import itertools as itt
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+# third-party
+from loguru import logger
+
+# relative
+from .edits import Edit, apply_edits
+from .profiling import profiler
+from .pipeline import write_source
+from .core import DEFAULT_WIDTH, StringWrapper, wrap_edits
+
+
+# ---------------------------------------------------------------------------- #
+DEFAULT_CHUNKSIZE = 2 ** 22  # 4 MB
+
+# Tokens that change the scanner state: comments, strings and brackets
+RGX_TOKENS = re.compile(rb'''(?xs)
+    \#[^\n]*                                        # comment
+  | [rRbBuUfF]{0,2}(?:                              # string
+        \'\'\'(?:[^\\]|\\.)*?\'\'\'
+      | """(?:[^\\]|\\.)*?"""
+      | '(?:[^'\\\n]|\\.)*'
+      | "(?:[^"\\\n]|\\.)*"
+    )
+  | (?P<open>[(\[{])
+  | (?P<close>[)\]}])
+''')
+
+# Lines starting a top-level statement (but not with a string)
+RGX_STATEMENT = re.compile(rb'''(?m)^(?![rRbBuUfF]{0,2}['"])[A-Za-z_@]''')
+
+# buffer of the worker processes
+_buffer = None
+
+# ---------------------------------------------------------------------------- #
+
+
+def split_points(buffer, chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Byte offsets at which `buffer` can be split into chunks of about
+    `chunksize` bytes that can be scanned independently. Split points are at
+    the start of top-level statements: lines starting at column 0 outside any
+    string, comment or brackets, and not continuing the previous line.
+    """
+    if len(buffer) <= chunksize:
+        return []
+
+    points = []
+    target = chunksize
+    depth = end = 0
+    for match in itt.chain(RGX_TOKENS.finditer(buffer), [None]):
+        start = len(buffer) if match is None else match.start()
+        # Search the code between the previous token and this one
+        while depth == 0 and target < start:
+            found = RGX_STATEMENT.search(buffer, max(end, target), start)
+            if found is None:
+                break
+
+            point = found.start()
+            if buffer[point - 2:point] == b'\\\n':
+                # continuation line
+                target = point + 1
+                continue
+
+            points.append(point)
+            target = point + chunksize
+
+        if match is None:
+            break
+
+        end = match.end()
+        if match['open']:
+            depth += 1
+        elif match['close']:
+            depth = max(depth - 1, 0)
+
+    return points
+
+
+def _attach(filename):
+    # worker initializer: map the file into memory
+    global _buffer
+    with open(filename, 'rb') as fp:
+        _buffer = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _wrap_chunk(start, stop, width, expand_tabs, verify, paragraphs,
+                buffer=None):
+    # Returns the number of characters in the chunk, and the edits relative to
+    # the chunk start
+    text = (_buffer if buffer is None else buffer)[start:stop].decode()
+    with profiler.span('scan', chunk=start):
+        strings = list(StringWrapper.parse(text))
+    return len(text), list(wrap_edits(strings, width, expand_tabs, verify,
+                                      paragraphs))
+
+
+def parallel_wrap_edits(filename, width=DEFAULT_WIDTH, expand_tabs=True,
+                        verify=True, paragraphs=False, jobs=None,
+                        chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Edits that hard wrap the strings in a (large) file, computed in parallel
+    over chunks of the file. Files smaller than `chunksize`, or that cannot be
+    split, are processed in this process.
+
+    Returns
+    -------
+    list of Edit
+        Ordered edits, with character offsets relative to the decoded file.
+    """
+    if not Path(filename).stat().st_size:
+        return []
+
+    options = (width, expand_tabs, verify, paragraphs)
+    with open(filename, 'rb') as fp, \
+            mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        points = split_points(buffer, chunksize)
+        bounds = list(zip([0, *points], [*points, len(buffer)]))
+        logger.debug('Wrapping {!r} in {} chunks.', str(filename), len(bounds))
+        if len(bounds) == 1 or jobs == 1:
+            results = [_wrap_chunk(*chunk, *options, buffer)
+                       for chunk in bounds]
+
+    if len(bounds) > 1 and jobs != 1:
+        with ProcessPoolExecutor(jobs, initializer=_attach,
+                                 initargs=(str(filename), )) as pool:
+            n = len(bounds)
+            func = profiler.remote(_wrap_chunk)
+            results = list(map(profiler.collect, pool.map(
+                func, *zip(*bounds), *([option] * n for option in options)
+            )))
+
+    # shift the edits to file offsets
+    edits, offset = [], 0
+    for length, chunk in results:
+        edits.extend(Edit(offset + start, offset + stop, new)
+                     for start, stop, new in chunk)
+        offset += length
+
+    return edits
+
+
+def parallel_rewrap_file(filename, width=DEFAULT_WIDTH, expand_tabs=True,
+                         verify=True, paragraphs=False, jobs=None,
+                         chunksize=DEFAULT_CHUNKSIZE):
+    """
+    Hard wrap the strings in a (large) file, scanning chunks of the file in
+    parallel. Returns the number of bytes written.
+    """
+    with profiler.file(filename):
+        edits = parallel_wrap_edits(filename, width, expand_tabs, verify,
+                                    paragraphs, jobs, chunksize)
+        if not edits:
+            logger.info('No wrap required in {!r}.', str(filename))
+            return 0
+
+        # decode without newline translation, so the offsets match
+        text = Path(filename).read_bytes().decode()
+        return write_source(filename, apply_edits(text, edits))
@@ -0,0 +1,363 @@
+"""
+Single pass pipeline for fixing source files. All passes share one in-memory
+buffer and one string scan, and the combined edits are committed to disk in a
+single write.
+
+A pass is a callable that takes a `Document` and returns a list of `Edit`s
+against the document's current text. The edits of each pass are applied before
+the next pass runs, so later passes always see correct offsets. Strings that
+were touched by an edit are re-scanned locally, the rest are only shifted.
+
+Line `ranges` given to the passes refer to the lines of the original text, and
+are mapped through the edits of the preceding passes by each pass (see
+`Document.map_ranges`).
+"""
+
+# std
+import bisect
+from pathlib import Path
+from functools import partial
+
+# third-party
+from loguru import logger
+
+# local
+from recipes.io import backed_up
+
+# relative
+from .profiling import profiler
+from .edits import Edit, apply_edits, compose, delta, sort_edits
+from .core import (DEFAULT_WIDTH, RGX_TRAILSPACE, Brackets, StringWrapper,
+                   comment_edits, file_lock, in_ranges, wrap_edits)
+
+
+# ---------------------------------------------------------------------------- #
+
+def write_source(filename, text):
+    """
+    Write `text` to `filename` under backup. Returns the bytes written. Writes
+    to the same file from different threads are serialized.
+    """
+    with file_lock(filename), profiler.span('write'), \
+            backed_up(filename, 'w') as fp:
+        fp.write(text)
+
+    return len(text.encode())
+
+
+class Document:
+    """
+    In-memory source code buffer shared by the passes of a `Pipeline`.
+
+    Attributes
+    ----------
+    original : str
+        The source code as it was read.
+    text : str
+        The current source code, with all edits applied.
+    edits : list of Edit
+        The combined edits, relative to `original`.
+    """
+
+    def __init__(self, text, filename=None):
+        self.original = self.text = text
+        self.filename = filename
+        self.edits = []
+        self._strings = None
+        self._line_starts = None
+
+    def __repr__(self):
+        return (f'<{type(self).__name__}: {self.filename or "<text>"}, '
+                f'{len(self.edits)} edits>')
+
+    @property
+    def changed(self):
+        return self.text != self.original
+
+    @property
+    def strings(self):
+        """The strings in the source code (scanned once, on first access)."""
+        if self._strings is None:
+            with profiler.span('scan'):
+                self._strings = list(StringWrapper.parse(self.text))
+        return self._strings
+
+    @property
+    def line_starts(self):
+        """Offsets of the first character of each line."""
+        if self._line_starts is None:
+            self._line_starts = line_starts(self.text)
+        return self._line_starts
+
+    def line_nr(self, position):
+        """Line number (1-indexed) of the character at `position`."""
+        return bisect.bisect_right(self.line_starts, position)
+
+    def map_ranges(self, ranges):
+        """
+        Map line `ranges` of the original text to the lines of the current
+        text. Ranges shift with the change in line count of the edits preceding
+        them, and grow or shrink with the edits they contain.
+        """
+        if not (ranges and self.edits):
+            return ranges
+
+        # First and last line of each edit in the original text, and the
+        # cumulative change in line count up to and including each edit
+        starts = line_starts(self.original)
+        firsts, lasts, cumulative = [], [], [0]
+        for start, stop, text in self.edits:
+            firsts.append(bisect.bisect_right(starts, start))
+            lasts.append(bisect.bisect_right(starts, max(start, stop - 1)))
+            cumulative.append(cumulative[-1] + text.count('\n')
+                              - self.original.count('\n', start, stop))
+
+        mapped = []
+        for first, last in ranges:
+            first += cumulative[bisect.bisect_left(lasts, first)]
+            last += cumulative[bisect.bisect_right(firsts, last)]
+            last = max(first, last)
+            # edits spanning the gap between ranges can make them overlap
+            if mapped and first <= mapped[-1][1]:
+                mapped[-1] = (mapped[-1][0], max(last, mapped[-1][1]))
+            else:
+                mapped.append((first, last))
+        return mapped
+
+    def write(self, filename=None):
+        """
+        Write the document to file (under backup) if it changed. Returns the
+        number of bytes written. The file is not opened for writing if the
+        content is unchanged.
+        """
+        filename = filename or self.filename
+        if not self.changed:
+            logger.info('No changes required in {!r}.', str(filename))
+            return 0
+
+        return write_source(filename, self.text)
+
+    def apply(self, edits):
+        """Apply edits to the current text and update the string locations."""
+        if not (edits := sort_edits(edits)):
+            return
+
+        old = self.text
+        self.text = apply_edits(old, edits)
+        self.edits = compose(old, self.edits, edits)
+        self._line_starts = None
+        if self._strings is not None:
+            self._strings = self._update_strings(old, edits)
+
+    def _update_strings(self, old, edits):
+        spans = [(string.start, string.end) for string in self._strings]
+        shifts, dirty = shift_spans(old, self.text, spans, edits)
+
+        # Shift strings that were not touched
+        clean = []
+        for string, shift in zip(self._strings, shifts):
+            if shift is not None:
+                string._offset += shift
+                clean.append(string)
+
+        if not dirty:
+            return clean
+
+        # Rescan the modified regions
+        strings = []
+        brackets = Brackets(self.text)
+        for start, stop in dirty:
+            clean = [s for s in clean if not start <= s.start < stop]
+            strings.extend(StringWrapper.parse(self.text[start:stop], start,
+                                               source=self.text,
+                                               brackets=brackets))
+
+        return sorted(clean + strings, key=lambda s: s.start)
+
+
+def line_starts(text):
+    """Offsets of the first character of each line in `text`."""
+    starts = [0]
+    pos = -1
+    while (pos := text.find('\n', pos + 1)) != -1:
+        starts.append(pos + 1)
+    return starts
+
+
+def shift_spans(old, new, spans, edits):
+    """
+    Track the (start, end) `spans` of strings in the `old` text through the
+    sorted, non-overlapping `edits` that produced the `new` text. A span is
+    touched if an edit intersects any of the lines it occupies.
+
+    Returns
+    -------
+    shifts : list
+        For each span, the shift in position if it was not touched, otherwise
+        None.
+    dirty : list of list
+        Merged [start, stop] regions of the new text (whole lines) covering
+        the touched spans and the replacement text of the edits, which need to
+        be rescanned.
+    """
+    # Cumulative shift in position for text following each edit
+    starts = [edit.start for edit in edits]
+    stops = [edit.stop for edit in edits]
+    cumulative = [0]
+    for edit in edits:
+        cumulative.append(cumulative[-1] + delta(edit))
+
+    shifts, dirty = [], []
+    for start, stop in spans:
+        start = old.rfind('\n', 0, start) + 1
+        stop = old.find('\n', stop)
+        stop = len(old) if stop == -1 else stop
+        i = bisect.bisect_left(stops, start)
+        if i == len(edits) or edits[i].start > stop:
+            shifts.append(cumulative[i])
+            continue
+
+        shifts.append(None)
+        j = bisect.bisect_right(starts, stop) - 1
+        start = min(start, edits[i].start) + cumulative[i]
+        stop = max(stop, edits[j].stop) + cumulative[j + 1]
+        dirty.append((start, stop))
+
+    # The replacement text of each edit may contain new strings
+    dirty.extend((edit.start + shift, edit.start + shift + len(edit.text))
+                 for edit, shift in zip(edits, cumulative))
+
+    # extend to whole lines, merging regions that then overlap
+    lines = []
+    for start, stop in sorted(dirty):
+        start = new.rfind('\n', 0, start) + 1
+        stop = new.find('\n', stop)
+        stop = len(new) if stop == -1 else stop
+        if lines and start <= lines[-1][1]:
+            lines[-1][1] = max(stop, lines[-1][1])
+        else:
+            lines.append([start, stop])
+
+    return shifts, lines
+
+
+class Pipeline:
+    """
+    Compose passes that run on a shared in-memory buffer.
+
+    Examples
+    --------
+    >>> pipeline = Pipeline(strip_pass, partial(rewrap_pass, width=88))
+    >>> pipeline.run('foo.py')
+    """
+
+    def __init__(self, *passes):
+        self.passes = list(passes)
+
+    @classmethod
+    def fix(cls, width=DEFAULT_WIDTH, expand_tabs=True, strip=True,
+            convert=True, wrap=True, quote=None, ranges=None,
+            paragraphs=False, comments=False):
+        """
+        Pipeline that strips trailing whitespace, converts printf-style
+        formatting to f-strings and hard wraps strings. If `paragraphs` is
+        True, triple-quoted strings are reflowed paragraph by paragraph. If
+        `comments` is True, overlong comments are reflowed as well.
+        """
+        passes = []
+        if strip:
+            passes.append(partial(strip_pass, ranges=ranges))
+        if convert:
+            passes.append(partial(convert_pass, quote=quote, ranges=ranges))
+        if wrap:
+            passes.append(partial(rewrap_pass, width=width,
+                                  expand_tabs=expand_tabs, ranges=ranges,
+                                  paragraphs=paragraphs))
+        if comments:
+            passes.append(partial(comment_pass, width=width,
+                                  expand_tabs=expand_tabs, ranges=ranges))
+        return cls(*passes)
+
+    def process(self, text, filename=None):
+        """Run all passes on the source code in `text`."""
+        document = Document(text, filename)
+        for pass_ in self.passes:
+            document.apply(pass_(document))
+        return document
+
+    def run(self, filename):
+        """
+        Run all passes on the file. The file is read once, and only written
+        (once) if any of the passes changed its content.
+        """
+        with profiler.file(filename):
+            document = self.process(Path(filename).read_text(), filename)
+            document.write()
+
+        return document
+
+
+# ---------------------------------------------------------------------------- #
+# Passes
+
+def strip_pass(document, ranges=None):
+    """Strip trailing whitespace."""
+    ranges = document.map_ranges(ranges)
+    with profiler.span('strip'):
+        return [Edit(match.start(), match.end() - 1, '')
+                for match in RGX_TRAILSPACE.finditer(document.text)
+                if in_ranges(ranges, document.line_nr(match.start()))]
+
+
+def convert_pass(document, quote=None, ranges=None):
+    """Convert printf-style string formatting to f-strings."""
+    from .fstrings import convert_edits
+
+    return convert_edits(document.text, quote, document.map_ranges(ranges),
+                         document)
+
+
+def rewrap_pass(document, width=DEFAULT_WIDTH, expand_tabs=True, ranges=None,
+                verify=True, paragraphs=False, memo=None):
+    """
+    Hard wrap strings that do not fit within `width`. If `verify` is True,
+    wraps that would change the value of a string are rejected. See
+    `restring.core.wrap_edits`.
+    """
+    ranges = document.map_ranges(ranges)
+    strings = [string for string in document.strings
+               if in_ranges(ranges, document.line_nr(string.start),
+                            document.line_nr(string.end))]
+    return list(wrap_edits(strings, width, expand_tabs, verify, paragraphs,
+                           memo))
+
+
+def comment_pass(document, width=DEFAULT_WIDTH, expand_tabs=True,
+                 ranges=None):
+    """
+    Reflow overlong comments, using the string locations of the document's
+    scan to skip comment-like lines inside strings. See
+    `restring.core.comment_edits`.
+    """
+    ranges = document.map_ranges(ranges)
+    with profiler.span('comments'):
+        return [edit for edit in comment_edits(document.text, document.strings,
+                                               width, expand_tabs)
+                if in_ranges(ranges, document.line_nr(edit.start),
+                             document.line_nr(edit.stop))]
+
+
+def fix_file(filename, width=DEFAULT_WIDTH, expand_tabs=True, strip=True,
+             convert=True, wrap=True, quote=None, ranges=None,
+             paragraphs=False, comments=False):
+    """
+    Strip trailing whitespace, convert printf-style formatting to f-strings and
+    hard wrap strings in a file, in a single read / scan / write cycle.
+
+    Returns
+    -------
+    Document
+        The processed document.
+    """
+    return Pipeline.fix(width, expand_tabs, strip, convert, wrap, quote,
+                        ranges, paragraphs, comments).run(filename)
@@ -0,0 +1,219 @@
+"""
+Two-phase plan / apply workflow. The (expensive, read-only) analysis computes
+the edits for each file and serializes them into a compact plan: the hash of
+each file, and the byte spans to replace. Plans can be reviewed, and are
+applied without recomputing anything: files whose content no longer matches
+the planned hash are skipped, and all edits to a file are applied in a single
+write. Files that were already applied are recognized by their new hash, so a
+failed apply can simply be retried.
+"""
+
+# std
+import os
+import json
+import hashlib
+import tempfile
+from pathlib import Path
+
+# third-party
+from loguru import logger
+
+# relative
+from .core import DEFAULT_WIDTH, file_lock
+from .pipeline import Document
+from .edits import sort_edits
+from .profiling import profiler
+from .batch import BACKENDS, process_document
+
+
+# ---------------------------------------------------------------------------- #
+PLAN_VERSION = 1
+
+# ---------------------------------------------------------------------------- #
+
+
+def sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def byte_edits(text, edits):
+    """
+    Convert edits with character offsets into `text` to edits with byte offsets
+    into its utf-8 encoding.
+    """
+    converted, pos, nbytes = [], 0, 0
+    for start, stop, new in sort_edits(edits):
+        nbytes += len(text[pos:start].encode())
+        first = nbytes
+        nbytes += len(text[start:stop].encode())
+        converted.append([first, nbytes, new])
+        pos = stop
+    return converted
+
+
+def apply_byte_edits(data, edits):
+    """Apply edits with byte offsets to `data` and return the new bytes."""
+    parts, pos = [], 0
+    for start, stop, new in sorted(edits):
+        if start < pos:
+            raise ValueError(f'Overlapping edits at byte {start}.')
+        parts.extend((data[pos:start], new.encode()))
+        pos = stop
+    parts.append(data[pos:])
+    return b''.join(parts)
+
+
+# ---------------------------------------------------------------------------- #
+
+def plan_file(filename, ranges=None, width=DEFAULT_WIDTH, expand_tabs=True,
+              strip=True, convert=True, wrap=True, paragraphs=False,
+              comments=False):
+    """
+    Compute the plan entry for a file: its hash before and after the edits,
+    and the edits as [start, stop, text] with byte offsets. Returns None if
+    the file needs no changes.
+    """
+    data = Path(filename).read_bytes()
+    # decode without newline translation, so the offsets match the bytes
+    text = data.decode()
+    document = Document(text, filename)
+    process_document(document, width, expand_tabs, strip, convert, wrap,
+                     ranges, paragraphs, comments)
+    if not document.changed:
+        return None
+
+    return dict(path=Path(filename).as_posix(),
+                sha256=sha256(data),
+                result=sha256(document.text.encode()),
+                edits=byte_edits(text, document.edits))
+
+
+def _plan_file(filename, ranges, options):
+    try:
+        return plan_file(filename, ranges, *options)
+    except (OSError, UnicodeDecodeError) as err:
+        logger.error('Could not plan {!r}: {}', str(filename), err)
+        return dict(path=Path(filename).as_posix(), error=str(err))
+    except Exception as err:
+        # a single bad file should not abort planning the others
+        logger.exception('Unexpected error planning {!r}.', str(filename))
+        return dict(path=Path(filename).as_posix(), error=repr(err))
+
+
+def make_plan(files, width=DEFAULT_WIDTH, expand_tabs=True, strip=True,
+              convert=True, wrap=True, paragraphs=False, comments=False,
+              jobs=0, backend='process'):
+    """
+    Compute the edit plan for `files`, in a pool of `jobs` workers if given.
+
+    Parameters
+    ----------
+    files : sequence of str or Path, or dict
+        Files to plan, or a mapping of files to the line ranges to consider in
+        each (None for the entire file). See `restring.batch.run`.
+    jobs : int
+        Number of workers. If 0, files are analysed in this process.
+    backend : {'thread', 'process'}
+        Type of worker pool.
+
+    Other parameters are as for `restring.batch.process_document`.
+
+    Returns
+    -------
+    dict
+        The plan, with an entry for each file that needs changes, and for each
+        file that could not be read.
+    """
+    ranges = (files if isinstance(files, dict) else dict.fromkeys(files))
+    options = (width, expand_tabs, strip, convert, wrap, paragraphs, comments)
+    if jobs:
+        with BACKENDS[backend](jobs) as pool:
+            n = len(ranges)
+            func = profiler.remote(_plan_file)
+            entries = list(map(profiler.collect, pool.map(
+                func, ranges, ranges.values(), [options] * n
+            )))
+    else:
+        entries = [_plan_file(file, lines, options)
+                   for file, lines in ranges.items()]
+
+    return dict(version=PLAN_VERSION,
+                files=[entry for entry in entries if entry])
+
+
+def write_plan(plan, filename):
+    Path(filename).write_text(json.dumps(plan, separators=(',', ':')))
+
+
+def load_plan(filename):
+    plan = json.loads(Path(filename).read_text())
+    if plan.get('version') != PLAN_VERSION:
+        raise ValueError(f'Unsupported plan version in {str(filename)!r}: '
+                         f'{plan.get("version")}.')
+    return plan
+
+
+# ---------------------------------------------------------------------------- #
+
+def _write(file, data):
+    # atomic replace, so an interrupted apply never leaves a partial file
+    with file_lock(file):
+        with tempfile.NamedTemporaryFile('wb', dir=file.parent,
+                                         prefix=f'.{file.name}.',
+                                         delete=False) as fp:
+            fp.write(data)
+        try:
+            os.chmod(fp.name, file.stat().st_mode)
+            os.replace(fp.name, file)
+        except OSError:
+            os.remove(fp.name)
+            raise
+
+
+def apply_entry(entry, dry_run=False):
+    """
+    Apply the edits of a plan entry to its file. Returns the status:
+    'applied', 'done' (the file already has the planned content), 'stale' (the
+    file changed since it was planned), 'missing' or 'error'.
+    """
+    if 'error' in entry:
+        return 'error'
+
+    file = Path(entry['path'])
+    try:
+        data = file.read_bytes()
+    except FileNotFoundError:
+        return 'missing'
+
+    digest = sha256(data)
+    if digest == entry['result']:
+        return 'done'
+
+    if digest != entry['sha256']:
+        logger.warning('Skipping {!r}: file changed since the plan was made.',
+                       str(file))
+        return 'stale'
+
+    new = apply_byte_edits(data, entry['edits'])
+    if sha256(new) != entry['result']:
+        raise ValueError(f'Applying the plan to {str(file)!r} does not give '
+                         f'the planned result.')
+
+    if not dry_run:
+        _write(file, new)
+    return 'applied'
+
+
+def apply_plan(plan, dry_run=False):
+    """
+    Apply a plan. Each file is written once, with all its edits. Returns a
+    dict of the status of each file (see `apply_entry`).
+    """
+    results = {}
+    for entry in plan['files']:
+        try:
+            results[entry['path']] = apply_entry(entry, dry_run)
+        except (OSError, ValueError) as err:
+            logger.error('Could not apply plan to {!r}: {}', entry['path'], err)
+            results[entry['path']] = 'error'
+    return results
@@ -0,0 +1,231 @@
+"""
+Lightweight profiling of the processing pipeline. Each phase (scanning,
+locating, wrapping, verifying, converting, writing) is timed with
+`perf_counter_ns` spans tagged with the file and string they belong to. Spans
+can be exported as Chrome trace-event JSON (viewable in chrome://tracing or
+Perfetto) or aggregated into per-phase histograms. Optionally, each file can
+be profiled with `cProfile`, with the stats dumped to a directory for use with
+`pstats`.
+
+Profiling is disabled by default, in which case the hooks reduce to a single
+attribute check.
+
+Spans are collected per process. Functions run in worker processes are wrapped
+with `Profiler.remote`, which returns the spans recorded in the worker together
+with the result, and `Profiler.collect` merges them into the parent's spans.
+"""
+
+# std
+import os
+import json
+import math
+import cProfile
+import threading
+import contextlib as ctx
+from time import perf_counter_ns
+from pathlib import Path
+from collections import defaultdict
+
+# third-party
+from loguru import logger
+
+
+# ---------------------------------------------------------------------------- #
+PHASES = ('scan', 'locate', 'wrap', 'verify', 'convert', 'strip', 'write')
+
+_NULL = ctx.nullcontext()
+
+# ---------------------------------------------------------------------------- #
+
+
+class Profiler:
+    """
+    Collect timing spans for the pipeline phases.
+
+    Examples
+    --------
+    >>> profiler.enable()
+    ... rewrap_file('foo.py', 80)
+    ... profiler.to_chrome_trace('trace.json')
+    ... profiler.report()
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.cprofile = None
+        self.spans = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def enable(self, cprofile=None):
+        """
+        Start collecting spans. If `cprofile` is a directory path, each file is
+        additionally profiled with `cProfile` and its stats written there.
+        """
+        self.enabled = True
+        if cprofile:
+            self.cprofile = Path(cprofile)
+            self.cprofile.mkdir(parents=True, exist_ok=True)
+
+    def disable(self):
+        self.enabled = False
+        self.cprofile = None
+
+    def reset(self):
+        with self._lock:
+            self.spans = []
+
+    def merge(self, spans):
+        """Add spans recorded elsewhere (eg. in a worker process)."""
+        with self._lock:
+            self.spans.extend(spans)
+
+    def remote(self, func):
+        """
+        Wrap `func` for running in a worker process. The wrapper returns the
+        result and the spans recorded in the worker, which are passed back to
+        this process with `collect`. See `Remote`.
+        """
+        return Remote(func, self.enabled, self.cprofile)
+
+    def collect(self, output):
+        """
+        Merge the spans from the output of a `remote` call, and return the
+        result.
+        """
+        result, spans = output
+        self.merge(spans)
+        return result
+
+    # ------------------------------------------------------------------------ #
+    def span(self, phase, **tags):
+        """Context manager timing a phase of the pipeline."""
+        if not self.enabled:
+            return _NULL
+        return self._span(phase, tags)
+
+    @ctx.contextmanager
+    def _span(self, phase, tags):
+        if (file := getattr(self._local, 'file', None)) is not None:
+            tags.setdefault('file', file)
+
+        start = perf_counter_ns()
+        try:
+            yield
+        finally:
+            stop = perf_counter_ns()
+            with self._lock:
+                self.spans.append((phase, start, stop - start, os.getpid(),
+                                   threading.get_ident(), tags))
+
+    def file(self, filename):
+        """
+        Context manager within which spans are tagged with `filename`. If
+        enabled, the file is also profiled with `cProfile`.
+        """
+        if not self.enabled:
+            return _NULL
+        return self._file(str(filename))
+
+    @ctx.contextmanager
+    def _file(self, filename):
+        previous, self._local.file = getattr(self._local, 'file', None), filename
+        profile = None
+        if self.cprofile:
+            profile = cProfile.Profile()
+            profile.enable()
+        try:
+            yield
+        finally:
+            self._local.file = previous
+            if profile:
+                profile.disable()
+                name = filename.strip(os.sep).replace(os.sep, '.')
+                profile.dump_stats(self.cprofile / f'{name}.pstats')
+
+    # ------------------------------------------------------------------------ #
+    def to_chrome_trace(self, filename=None):
+        """
+        Convert the spans to Chrome trace-event format. If `filename` is given,
+        the JSON is also written to that file.
+        """
+        events = [
+            {'name': phase, 'cat': 'restring', 'ph': 'X',
+             'ts': start / 1e3, 'dur': duration / 1e3,
+             'pid': pid, 'tid': tid, 'args': tags}
+            for phase, start, duration, pid, tid, tags in self.spans
+        ]
+        trace = {'traceEvents': events, 'displayTimeUnit': 'ms'}
+        if filename:
+            Path(filename).write_text(json.dumps(trace))
+        return trace
+
+    def histograms(self):
+        """
+        Aggregate span durations per phase. Histogram bins are powers of 2 in
+        microseconds, ie. bin `k` counts spans with duration in [2^k, 2^(k+1))
+        μs.
+        """
+        durations = defaultdict(list)
+        for phase, _, duration, *_ in self.spans:
+            durations[phase].append(duration / 1e3)
+
+        return {phase: _summarize(sorted(times))
+                for phase, times in durations.items()}
+
+    def report(self):
+        for phase, stats in self.histograms().items():
+            logger.info('{:<8}: {count:>6} spans, total {total:.1f} ms, '
+                        'median {p50:.1f} μs, p99 {p99:.1f} μs, '
+                        'max {max:.1f} μs.', phase, **stats)
+
+
+class Remote:
+    """
+    Picklable wrapper running `func` with the profiler enabled (if it was in
+    the parent process), and returning the spans recorded in the worker
+    process along with the result. Called in the parent process itself (eg. by
+    a thread pool), spans are recorded directly and none are returned.
+    """
+
+    def __init__(self, func, enabled=False, cprofile=None):
+        self.func = func
+        self.enabled = enabled
+        self.cprofile = cprofile
+        self.pid = os.getpid()
+
+    def __call__(self, *args, **kws):
+        if not self.enabled or os.getpid() == self.pid:
+            return self.func(*args, **kws), []
+
+        # Forked workers inherit the parent's spans, so start afresh
+        profiler.enable(self.cprofile)
+        profiler.reset()
+        try:
+            result = self.func(*args, **kws)
+        finally:
+            with profiler._lock:
+                spans, profiler.spans = profiler.spans, []
+        return result, spans
+
+
+def _summarize(times):
+    # times in μs, sorted
+    n = len(times)
+    histogram = defaultdict(int)
+    for t in times:
+        histogram[max(int(math.log2(t)), 0) if t > 0 else 0] += 1
+
+    return dict(count=n,
+                total=sum(times) / 1e3,  # ms
+                mean=sum(times) / n,
+                p50=times[(n - 1) // 2],
+                p90=times[int(0.9 * (n - 1))],
+                p99=times[int(0.99 * (n - 1))],
+                max=times[-1],
+                histogram=dict(sorted(histogram.items())))
+
+
+# ---------------------------------------------------------------------------- #
+# shared instance used by the pipeline
+profiler = Profiler()
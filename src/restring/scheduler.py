@@ -0,0 +1,141 @@
+"""
+Threaded I/O stages for batch processing. File contents are prefetched by
+background threads while the current file is being processed, and writes are
+drained by a background thread, so that I/O latency (eg. on network file
+systems) overlaps with scanning and wrapping instead of adding to it.
+"""
+
+# std
+import threading
+from pathlib import Path
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# third-party
+from loguru import logger
+
+
+# ---------------------------------------------------------------------------- #
+DEFAULT_DEPTH = 8
+DEFAULT_MAX_BYTES = 64 * 2 ** 20
+
+# ---------------------------------------------------------------------------- #
+
+
+def read_text(filename):
+    return Path(filename).read_text()
+
+
+class ReadAhead:
+    """
+    Iterate over the contents of files, reading up to `depth` files ahead in
+    `workers` background threads. Files are yielded in the given order, as
+    (filename, text, error) tuples, where either `text` or `error` is None.
+
+    Examples
+    --------
+    >>> for filename, text, error in ReadAhead(files):
+    ...     process(text)
+    """
+
+    def __init__(self, files, depth=DEFAULT_DEPTH, workers=4, read=read_text):
+        self.files = files
+        self.depth = max(int(depth), 1)
+        self.workers = max(int(workers), 1)
+        self.read = read
+
+    def __iter__(self):
+        files = iter(self.files)
+        pending = deque()
+        with ThreadPoolExecutor(self.workers, 'restring-read') as pool:
+            while True:
+                # keep the read-ahead window full
+                while len(pending) < self.depth and \
+                        (file := next(files, None)) is not None:
+                    pending.append((file, pool.submit(self.read, file)))
+
+                if not pending:
+                    break
+
+                file, future = pending.popleft()
+                try:
+                    yield file, future.result(), None
+                except (OSError, UnicodeDecodeError) as err:
+                    yield file, None, err
+
+
+class WriteBehind:
+    """
+    Write files in a background thread. Submitting blocks while the total size
+    of the pending writes exceeds `max_bytes`. Writes are performed in the
+    order they were submitted, and errors are collected (in the same order)
+    rather than raised in the background thread.
+
+    Examples
+    --------
+    >>> with WriteBehind(write_source) as writer:
+    ...     writer.submit('foo.py', new_text)
+    ... writer.errors
+    []
+    """
+
+    def __init__(self, write, max_bytes=DEFAULT_MAX_BYTES):
+        self.write = write
+        self.max_bytes = int(max_bytes)
+        self.errors = []
+        self._queue = deque()
+        self._pending = 0
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._drain,
+                                        name='restring-write', daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, filename, text):
+        """Queue `text` to be written to `filename`."""
+        size = len(text)
+        with self._condition:
+            if self._closed:
+                raise ValueError('Cannot submit to a closed writer.')
+
+            # Wait for room in the queue. A single oversized write is allowed
+            # through when the queue is empty.
+            self._condition.wait_for(
+                lambda: not self._queue or self._pending + size <= self.max_bytes
+            )
+            self._queue.append((filename, text))
+            self._pending += size
+            self._condition.notify_all()
+
+    def _drain(self):
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self._queue or self._closed)
+                if not self._queue:
+                    return
+                filename, text = self._queue[0]
+
+            try:
+                self.write(filename, text)
+            except Exception as err:
+                logger.error('Failed to write {!r}: {}', str(filename), err)
+                self.errors.append((filename, err))
+
+            with self._condition:
+                self._queue.popleft()
+                self._pending -= len(text)
+                self._condition.notify_all()
+
+    def close(self):
+        """Wait for all pending writes to complete. Returns the errors."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+        return self.errors
@@ -0,0 +1,93 @@
+"""
+In-memory API operating on source code strings. These functions never touch
+the file system. They return lists of `Edit`s (character span and replacement)
+relative to the given source, which can be applied with `apply_edits`, converted
+to editor positions with `to_positions`, or combined with the edits of other
+transforms using `compose`.
+
+Examples
+--------
+>>> source = editor.buffer
+>>> edits = rewrap_text(source, 88)
+>>> apply_edits(source, edits)
+"""
+
+# relative
+from .core import DEFAULT_WIDTH
+from .edits import Edit, apply_edits, compose, to_positions
+from .pipeline import (Document, Pipeline, convert_pass, rewrap_pass,
+                       strip_pass)
+
+# The edit helpers are re-exported as part of this module's API
+__all__ = ['strip_text', 'convert_text', 'rewrap_text', 'fix_text', 'Edit',
+           'apply_edits', 'compose', 'to_positions']
+
+
+# ---------------------------------------------------------------------------- #
+
+def strip_text(source, ranges=None):
+    """
+    Edits that strip trailing whitespace from `source`. If `ranges` is given
+    (sorted (first, last) line number pairs, 1-indexed and inclusive), only
+    lines within those ranges are stripped.
+    """
+    return strip_pass(Document(source), ranges)
+
+
+def convert_text(source, quote=None, ranges=None):
+    """
+    Edits that convert printf-style formatting expressions in `source` to
+    f-strings.
+    """
+    return convert_pass(Document(source), quote, ranges)
+
+
+def rewrap_text(source, width=DEFAULT_WIDTH, ranges=None, expand_tabs=True,
+                verify=True, paragraphs=False):
+    """
+    Edits that hard wrap the strings in `source` that do not fit within
+    `width`.
+
+    Parameters
+    ----------
+    source : str
+        Python source code.
+    width : int, optional
+        Maximal line width, by default DEFAULT_WIDTH.
+    ranges : sequence of tuple, optional
+        Sorted (first, last) line number pairs (1-indexed, inclusive). If
+        given, only strings intersecting these lines are wrapped.
+    expand_tabs : bool, optional
+        Whether to expand tabs before measuring line widths, by default True.
+    verify : bool, optional
+        Whether to reject wraps that change the value of a string, by default
+        True.
+    paragraphs : bool, optional
+        Whether to reflow triple-quoted strings paragraph by paragraph, only
+        changing paragraphs with overlong lines, by default False.
+
+    Returns
+    -------
+    list of Edit
+    """
+    return rewrap_pass(Document(source), width, expand_tabs, ranges, verify,
+                       paragraphs)
+
+
+def fix_text(source, width=DEFAULT_WIDTH, expand_tabs=True, strip=True,
+             convert=True, wrap=True, quote=None, ranges=None,
+             paragraphs=False, comments=False):
+    """
+    Combined edits that strip trailing whitespace, convert printf-style
+    formatting to f-strings and hard wrap strings (and optionally comments) in
+    `source`. The passes share a single scan. See `restring.pipeline.fix_file`
+    for the file version.
+
+    Returns
+    -------
+    list of Edit
+        The combined, non-overlapping edits relative to `source`.
+    """
+    pipeline = Pipeline.fix(width, expand_tabs, strip, convert, wrap, quote,
+                            ranges, paragraphs, comments)
+    return pipeline.process(source).edits
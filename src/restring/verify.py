@@ -0,0 +1,101 @@
+"""
+Verify that rewrapping a string literal does not change its value.
+
+Only the source spans of the old and new literals are parsed, not the module
+containing them, so verification is cheap enough to run for every edit.
+"""
+
+# std
+import re
+import ast
+
+
+# ---------------------------------------------------------------------------- #
+RGX_SPACE = re.compile(r'\s+')
+
+# ---------------------------------------------------------------------------- #
+
+class VerificationError(ValueError):
+    """The value of a string literal was changed by an edit."""
+
+
+def template(source, bracketed=False):
+    """
+    The value of the (implicitly joined) string literal in `source`. For
+    f-strings, this is the sequence of literal parts and (dumped) replacement
+    fields, which is independent of how the f-string is split into pieces.
+    If `bracketed` is True, `source` is parsed as if enclosed in brackets, so
+    the pieces may span multiple lines, otherwise it has to be valid on its
+    own.
+
+    Examples
+    --------
+    >>> template("('hello '\\n 'world')")
+    ('hello world',)
+    >>> template("(f'x = ' \\n f'{x!r}')") == template("f'x = {x!r}'")
+    True
+    """
+    if bracketed:
+        source = f'(\n{source}\n)'
+    node = ast.parse(source, mode='eval').body
+    if isinstance(node, ast.Constant) and isinstance(node.value, (str, bytes)):
+        return (node.value, )
+
+    if not isinstance(node, ast.JoinedStr):
+        raise VerificationError(f'Not a string literal: {source!r}')
+
+    parts = []
+    for value in node.values:
+        if isinstance(value, ast.Constant):
+            if parts and isinstance(parts[-1], str):
+                parts[-1] += value.value
+                continue
+            parts.append(value.value)
+        else:
+            # FormattedValue. Wrap in a tuple to distinguish from literal parts
+            parts.append((ast.dump(value), ))
+
+    return tuple(parts)
+
+
+def normalize(parts):
+    """
+    Collapse runs of whitespace in the literal parts of a template into a
+    single space, or into a single blank line if they span multiple lines (ie.
+    paragraph breaks are kept).
+    """
+    return tuple(RGX_SPACE.sub(_collapse, part) if isinstance(part, str) else
+                 part for part in parts)
+
+
+def _collapse(match):
+    return '\n\n' if match[0].count('\n') > 1 else ' '
+
+
+def verify(old, new, reflow=False, bracketed=False):
+    """
+    Check that the string literals in the source code snippets `old` and `new`
+    have the same value, raising `VerificationError` if they don't. If `reflow`
+    is True, the values only need to be the same up to whitespace, as is the
+    case for reflowed paragraphs of text. If `bracketed` is True, the snippets
+    are enclosed in brackets in the source code (see `template`).
+    """
+    try:
+        before, after = template(old, bracketed), template(new, bracketed)
+    except SyntaxError as err:
+        raise VerificationError(f'Could not parse string literal: {err}') from err
+
+    if reflow:
+        before, after = normalize(before), normalize(after)
+
+    if before != after:
+        raise VerificationError(f'Edit changes the value of string literal '
+                                f'{old!r} to {new!r}.')
+
+
+def verify_wrap(string, lines, reflow=False):
+    """
+    Check that the wrapped `lines` of the `StringWrapper` `string` have the
+    same value as the original, and are valid code where the string is.
+    """
+    verify(string.source, '\n'.join(lines), reflow, string.bracketed)
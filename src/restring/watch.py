@@ -0,0 +1,236 @@
+"""
+Watch a source tree and fix files as they are saved. Changes are detected by
+polling file modification times, so no OS-specific notification API is
+required. Polling is kept cheap by caching directory listings (which are only
+re-read when the directory's own mtime changes) and by adapting the polling
+interval to the time a scan of the tree takes.
+"""
+
+# std
+import os
+import time
+import hashlib
+import threading
+from pathlib import Path
+
+# third-party
+from loguru import logger
+
+# relative
+from .core import DEFAULT_WIDTH
+from .pipeline import Pipeline
+
+
+# ---------------------------------------------------------------------------- #
+# Fraction of the time that should be spent scanning the tree
+SCAN_LOAD = 0.05
+
+# ---------------------------------------------------------------------------- #
+
+
+def digest(data):
+    return hashlib.blake2b(data, digest_size=16).digest()
+
+
+def _signature(stat):
+    return stat.st_mtime_ns, stat.st_size
+
+
+class Watcher:
+    """
+    Poll the source files in `paths` for changes, and run `pipeline` on files
+    that changed once they have been stable for `debounce` seconds.
+
+    Files are only processed if their content actually changed, and the
+    watcher's own writes do not trigger re-processing.
+
+    Examples
+    --------
+    >>> Watcher(['src'], Pipeline.fix(width=88, convert=False)).run()
+    """
+
+    def __init__(self, paths, pipeline, suffixes=('.py', ), debounce=0.5,
+                 min_interval=0.2, max_interval=10.):
+        self.paths = list(map(Path, paths))
+        self.pipeline = pipeline
+        self.suffixes = tuple(suffixes)
+        self.debounce = float(debounce)
+        self.min_interval = float(min_interval)
+        self.max_interval = float(max_interval)
+        self.interval = self.min_interval
+
+        # caches
+        self.stats = {}     # file -> (mtime_ns, size)
+        self.hashes = {}    # file -> content digest last processed / written
+        self.dirs = {}      # dir -> (mtime_ns, files, subdirs)
+        self.pending = {}   # file -> time of the last change seen
+        self._stop = threading.Event()
+
+    # ------------------------------------------------------------------------ #
+    def files(self):
+        """Iterate over the watched files, re-listing only modified folders."""
+        for path in self.paths:
+            if path.is_dir():
+                yield from self._walk(path)
+            elif path.suffix in self.suffixes:
+                yield path
+
+    def _walk(self, folder):
+        try:
+            mtime = os.stat(folder).st_mtime_ns
+        except OSError:
+            self.dirs.pop(folder, None)
+            return
+
+        cached = self.dirs.get(folder)
+        if cached and cached[0] == mtime:
+            files, subdirs = cached[1:]
+        else:
+            files, subdirs = [], []
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not entry.name.startswith('.'):
+                                subdirs.append(Path(entry.path))
+                        elif os.path.splitext(entry.name)[1] in self.suffixes:
+                            files.append(Path(entry.path))
+            except OSError:
+                return
+            files.sort()
+            subdirs.sort()
+            self.dirs[folder] = (mtime, files, subdirs)
+
+        yield from files
+        for subdir in subdirs:
+            yield from self._walk(subdir)
+
+    def scan(self):
+        """
+        Stat all watched files, and return those that were created or modified
+        since the previous scan. The polling interval is adapted to the time
+        the scan takes.
+        """
+        start = time.perf_counter()
+        changed, seen = [], set()
+        for file in self.files():
+            seen.add(file)
+            try:
+                signature = _signature(os.stat(file))
+            except OSError:
+                continue
+
+            if self.stats.get(file) != signature:
+                self.stats[file] = signature
+                changed.append(file)
+
+        for file in set(self.stats) - seen:
+            logger.debug('{!r} was removed.', str(file))
+            for cache in (self.stats, self.hashes, self.pending):
+                cache.pop(file, None)
+
+        duration = time.perf_counter() - start
+        self.interval = min(max(duration / SCAN_LOAD, self.min_interval),
+                            self.max_interval)
+        return changed
+
+    def poll(self, now=None):
+        """
+        Scan for changes, and return the files whose last change is older than
+        the debounce time.
+        """
+        now = time.monotonic() if now is None else now
+        for file in self.scan():
+            self.pending[file] = now
+
+        ready = [file for file, changed in self.pending.items()
+                 if now - changed >= self.debounce]
+        for file in ready:
+            del self.pending[file]
+        return ready
+
+    def process(self, file):
+        """
+        Run the pipeline on `file` if its content changed. Returns the number
+        of bytes written. Failures are logged and the file is skipped, and the
+        result is not written if the file was saved again in the meantime.
+        """
+        try:
+            signature = _signature(os.stat(file))
+            data = file.read_bytes()
+        except OSError as err:
+            logger.warning('Could not read {!r}: {}', str(file), err)
+            return 0
+
+        key = digest(data)
+        if self.hashes.get(file) == key:
+            logger.debug('Content of {!r} unchanged.', str(file))
+            return 0
+
+        self.hashes[file] = key
+        try:
+            document = self.pipeline.process(data.decode(), file)
+        except UnicodeDecodeError as err:
+            logger.warning('Could not decode {!r}: {}', str(file), err)
+            return 0
+        except Exception:
+            logger.exception('Could not process {!r}.', str(file))
+            return 0
+
+        if not document.changed:
+            return 0
+
+        try:
+            if _signature(os.stat(file)) != signature:
+                # Saved while we were processing. Don't overwrite, the next
+                # scan picks up the new content.
+                logger.info('{!r} changed while processing, skipping.',
+                            str(file))
+                return 0
+
+            written = document.write()
+        except OSError as err:
+            logger.warning('Could not write {!r}: {}', str(file), err)
+            return 0
+
+        logger.info('Fixed {!r}.', str(file))
+
+        # Remember our own write so it is not picked up as a change
+        self.hashes[file] = digest(document.text.encode())
+        self.stats[file] = _signature(os.stat(file))
+        self.pending.pop(file, None)
+        return written
+
+    # ------------------------------------------------------------------------ #
+    def step(self, now=None):
+        """Poll once and process the files that are ready."""
+        return {file: self.process(file) for file in self.poll(now)}
+
+    def run(self):
+        """Watch until `stop` is called (or the process is interrupted)."""
+        self._stop.clear()
+        self.scan()
+        logger.info('Watching {} files.', len(self.stats))
+        while not self._stop.wait(self.interval):
+            try:
+                self.step()
+            except Exception:
+                # keep watching
+                logger.exception('Error while polling for changes.')
+
+    def stop(self):
+        self._stop.set()
+
+
+def watch(paths, width=DEFAULT_WIDTH, expand_tabs=True, strip=True,
+          convert=False, debounce=0.5, max_interval=10., paragraphs=False):
+    """Watch `paths`, stripping trailing space and wrapping strings on save."""
+    pipeline = Pipeline.fix(width, expand_tabs, strip, convert,
+                            paragraphs=paragraphs)
+    watcher = Watcher(paths, pipeline, debounce=debounce,
+                      max_interval=max_interval)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        logger.info('Stopped watching.')
+    return watcher
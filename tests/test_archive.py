@@ -0,0 +1,107 @@
+# std
+import io
+import csv
+import tarfile
+import zipfile
+
+# third-party
+import pytest
+
+# local
+from restring.batch import run
+from restring.archive import archive_type, process_archive, record_hash
+
+
+LONG = ' '.join(['lorem ipsum'] * 8)
+SOURCE = f"x = '{LONG}'\n".encode()
+DATA = b'some data ' * 1000
+
+
+def _make_wheel(filename):
+    members = {'pkg/__init__.py': b'x = 1\n',
+               'pkg/module.py': SOURCE,
+               'pkg/data.txt': DATA}
+    record = io.StringIO()
+    writer = csv.writer(record, lineterminator='\n')
+    with zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED) as zf:
+        for name, data in members.items():
+            zf.writestr(name, data)
+            writer.writerow([name, record_hash(data), len(data)])
+        writer.writerow(['pkg-1.0.dist-info/RECORD', '', ''])
+        zf.writestr('pkg-1.0.dist-info/RECORD', record.getvalue())
+
+
+def _make_sdist(filename):
+    with tarfile.open(filename, 'w:gz') as tf:
+        for name, data in {'pkg-1.0/pkg/module.py': SOURCE,
+                           'pkg-1.0/README': DATA}.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            tf.addfile(info, io.BytesIO(data))
+
+
+@pytest.mark.parametrize('name, kind', [('a.whl', 'zip'), ('a.zip', 'zip'),
+                                        ('a.tar.gz', 'tar'), ('a.tgz', 'tar'),
+                                        ('a.tar', 'tar'), ('a.gz', None),
+                                        ('a.py', None)])
+def test_archive_type(name, kind):
+    assert archive_type(name) == kind
+
+
+def test_check_wheel(tmp_path):
+    _make_wheel(wheel := tmp_path / 'pkg-1.0-py3-none-any.whl')
+    before = wheel.read_bytes()
+    results = process_archive(wheel, 60)
+    key = f'{wheel.as_posix()}/pkg/module.py'
+    assert list(results) == [f'{wheel.as_posix()}/pkg/__init__.py', key]
+    assert results[key]['violations'] == [(1, 'string-too-long')]
+    assert wheel.read_bytes() == before
+
+
+def test_fix_wheel(tmp_path):
+    _make_wheel(wheel := tmp_path / 'pkg-1.0-py3-none-any.whl')
+    with zipfile.ZipFile(wheel) as zf:
+        old = {info.filename: info for info in zf.infolist()}
+
+    results = process_archive(wheel, 60, fix=True)
+    assert results[f'{wheel.as_posix()}/pkg/module.py']['changed']
+
+    with zipfile.ZipFile(wheel) as zf:
+        assert zf.testzip() is None
+        new = zf.read('pkg/module.py')
+        assert new != SOURCE
+        assert max(map(len, new.splitlines())) <= 60
+
+        # unchanged members copied as is
+        info = zf.getinfo('pkg/data.txt')
+        assert zf.read(info) == DATA
+        attrs = ('compress_type', 'CRC', 'file_size', 'date_time')
+        assert [getattr(info, attr) for attr in attrs] == \
+            [getattr(old['pkg/data.txt'], attr) for attr in attrs]
+
+        # RECORD updated
+        record = {row[0]: row[1:] for row in csv.reader(
+            io.StringIO(zf.read('pkg-1.0.dist-info/RECORD').decode()))}
+        assert record['pkg/module.py'] == [record_hash(new), str(len(new))]
+        assert record['pkg/data.txt'] == [record_hash(DATA), str(len(DATA))]
+
+
+def test_fix_sdist(tmp_path):
+    _make_sdist(sdist := tmp_path / 'pkg-1.0.tar.gz')
+    report = run([sdist], 60, fix=True)
+    key = f'{sdist.as_posix()}/pkg-1.0/pkg/module.py'
+    assert list(report['files']) == [key]
+    assert report['summary']['changed'] == 1
+
+    with tarfile.open(sdist) as tf:
+        assert tf.getnames() == ['pkg-1.0/pkg/module.py', 'pkg-1.0/README']
+        new = tf.extractfile('pkg-1.0/pkg/module.py').read()
+        assert max(map(len, new.splitlines())) <= 60
+        assert tf.extractfile('pkg-1.0/README').read() == DATA
+
+
+def test_run_bad_archive(tmp_path):
+    (bad := tmp_path / 'bad.zip').write_bytes(b'not a zip')
+    report = run([bad], 60)
+    assert 'error' in report['files'][bad.as_posix()]
+    assert report['summary']['errors'] == 1
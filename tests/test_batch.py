@@ -0,0 +1,106 @@
+# std
+from pathlib import Path
+
+# third-party
+import pytest
+
+# local
+from restring.batch import (exit_code, merge_reports, parse_shard, run, shard)
+from restring.cli import main
+
+
+FILES = [Path(f'pkg/module{i}.py') for i in range(50)]
+LONG = ' '.join(['lorem ipsum'] * 8)
+
+
+@pytest.mark.parametrize('timings', [None, {f: i for i, f in enumerate(FILES)}])
+def test_shards_partition(timings):
+    shards = [shard(FILES, i, 4, timings) for i in range(1, 5)]
+    assert sorted(sum(shards, []), key=FILES.index) == FILES
+    # deterministic
+    assert shards == [shard(FILES, i, 4, timings) for i in range(1, 5)]
+
+
+def test_shards_balanced():
+    timings = {f: 1. for f in FILES}
+    timings[FILES[0]] = 25.
+    loads = [sum(timings[f] for f in shard(FILES, i, 2, timings))
+             for i in (1, 2)]
+    assert loads == [37., 37.]
+
+
+def test_parse_shard():
+    assert parse_shard('2/3') == (2, 3)
+    with pytest.raises(ValueError):
+        parse_shard('4/3')
+
+
+def test_merge(tmp_path):
+    files = []
+    for i in range(6):
+        files.append(file := tmp_path / f'm{i}.py')
+        file.write_text(f"x = '{LONG}'\n" if i % 2 else 'x = 1\n')
+
+    reports = [run(files, 60, convert=False, shard_spec=(i, 3))
+               for i in (1, 2, 3)]
+    merged = merge_reports(reports)
+    assert merged['summary']['files'] == 6
+    assert merged['summary']['violations'] == 3
+    assert exit_code(merged) == 1
+    assert exit_code(merge_reports(reports[:2])) == 2
+
+
+def test_cli_check(tmp_path, capsys):
+    file = tmp_path / 'example.py'
+    file.write_text(f"x = '{LONG}'   \n")
+    report = tmp_path / 'report.json'
+
+    code = main(['check', '--no-convert', '-w', '60', '--shard', '1/1',
+                 '--report', str(report), str(tmp_path)])
+    assert code == 1
+    assert report.exists()
+    assert f'{file.as_posix()}:1: trailing-space' in capsys.readouterr().out
+    assert main(['merge', str(report)]) == 1
+
+
+@pytest.mark.parametrize('backend', ['thread', 'process'])
+def test_backends(tmp_path, backend):
+    files = []
+    for i in range(8):
+        files.append(file := tmp_path / f'm{i}.py')
+        file.write_text(f"x = '{LONG}'   \n" if i % 2 else 'x = 1\n')
+
+    expected = run(files, 60, prefetch=0)
+    report = run(files, 60, fix=True, jobs=4, backend=backend)
+    for key in ('strings', 'violations', 'changed'):
+        assert report['summary'][key] == expected['summary'][key]
+    assert all(len(line) <= 60 for file in files
+               for line in file.read_text().splitlines())
+
+    with pytest.raises(ValueError):
+        run(files, backend='fork')
+
+
+@pytest.mark.parametrize('options', [dict(prefetch=0), dict(prefetch=4),
+                                     dict(jobs=2, backend='thread')])
+def test_unexpected_error(tmp_path, monkeypatch, options):
+    from restring import batch
+
+    files = []
+    for i in range(3):
+        files.append(file := tmp_path / f'm{i}.py')
+        file.write_text(f"x = '{LONG}'\n")
+
+    process_document = batch.process_document
+
+    def fail(document, *args):
+        if document.filename == files[1]:
+            raise RuntimeError('oops')
+        return process_document(document, *args)
+
+    monkeypatch.setattr(batch, 'process_document', fail)
+    report = run(files, 60, **options)
+    result = report['files'][files[1].as_posix()]
+    assert result == {'error': "RuntimeError('oops')"}
+    assert report['summary']['errors'] == 1
+    assert report['summary']['violations'] == 2
@@ -0,0 +1,104 @@
+# std
+import os
+import time
+
+# third-party
+import pytest
+
+# local
+from restring.batch import run
+from restring.budget import Quarantine, Worker
+
+
+LONG = ' '.join(['lorem ipsum'] * 8)
+
+
+def _sleep(seconds):
+    time.sleep(seconds)
+    return os.getpid()
+
+
+def _allocate(size):
+    return len(bytearray(size))
+
+
+def _fail(message):
+    raise RuntimeError(message)
+
+
+def test_worker_timeout():
+    with Worker(_sleep) as worker:
+        status, pid = worker.call(5, 0)
+        assert status == 'ok'
+        assert worker.call(0.1, 10)[0] == 'timeout'
+        # recycled
+        status, new = worker.call(5, 0)
+        assert status == 'ok' and new != pid
+
+
+def test_worker_error():
+    with Worker(_fail) as worker:
+        pid = worker.process.pid
+        assert worker.call(5, 'oops') == ('error', "RuntimeError('oops')")
+        # errors are not budget violations, the worker keeps serving
+        assert worker.process.pid == pid
+        assert worker.call(5, 'again')[0] == 'error'
+
+
+@pytest.mark.skipif(os.name != 'posix', reason='needs resource module')
+def test_worker_memory():
+    with Worker(_allocate, max_memory=2 ** 30) as worker:
+        assert worker.call(10, 2 ** 20) == ('ok', 2 ** 20)
+        assert worker.call(10, 2 ** 31)[0] == 'memory'
+        assert worker.call(10, 2 ** 20) == ('ok', 2 ** 20)
+
+
+def test_quarantine(tmp_path):
+    files = []
+    for i in range(3):
+        files.append(file := tmp_path / f'module{i}.py')
+        file.write_text(f'x = "{LONG}"\n')
+
+    filename = tmp_path / 'quarantine.json'
+    quarantine = Quarantine(filename)
+    quarantine.add(files[1], 'Time budget of 1s exceeded.')
+    quarantine.save()
+
+    report = run(files, width=50, fix=True, timeout=10, quarantine=filename)
+    assert report['summary']['quarantined'] == 1
+    assert report['summary']['changed'] == 2
+    assert 'quarantined' in report['files'][files[1].as_posix()]
+    assert files[1].read_text() == f'x = "{LONG}"\n'
+
+    # released once the file changes, and dropped from the list
+    files[1].write_text(f'y = "{LONG}"\n')
+    assert files[1] not in (quarantine := Quarantine(filename))
+    assert len(quarantine) == 0
+    report = run(files, width=50, quarantine=filename)
+    assert report['summary']['quarantined'] == 0
+    assert report['summary']['violations'] == 1
+
+
+def test_quarantine_prune(tmp_path):
+    files = [tmp_path / 'a.py', tmp_path / 'b.py']
+    quarantine = Quarantine(filename := tmp_path / 'quarantine.json')
+    for file in files:
+        file.write_text('x = 1\n')
+        quarantine.add(file, 'Worker process died.')
+
+    files[0].unlink()
+    quarantine.save()
+    assert list(Quarantine(filename).files) == [files[1].as_posix()]
+
+
+def test_budget_jobs(tmp_path):
+    files = []
+    for i in range(4):
+        files.append(file := tmp_path / f'module{i}.py')
+        file.write_text(f'x = "{LONG}"\n')
+
+    report = run(files, width=50, fix=True, timeout=10, jobs=2)
+    assert list(report['files']) == [file.as_posix() for file in files]
+    assert report['summary']['changed'] == 4
+    assert all(max(map(len, file.read_text().splitlines())) <= 50
+               for file in files)
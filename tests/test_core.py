@@ -0,0 +1,160 @@
+# third-party
+import pytest
+
+# local
+from restring import strip_trailing_space
+from restring.edits import apply_edits
+from restring.core import (StringWrapper, comment_edits, rewrap, rewrap_file,
+                           split_paragraphs, wrap_edits)
+
+
+LONG = ' '.join(['lorem ipsum'] * 8)
+
+
+def test_strip_trailing_space_noop(tmp_path):
+    file = tmp_path / 'clean.py'
+    file.write_text('x = 1\ny = 2\n')
+    mtime = file.stat().st_mtime_ns
+    assert strip_trailing_space(file) == 0
+    assert file.stat().st_mtime_ns == mtime
+
+
+def test_strip_trailing_space(tmp_path):
+    file = tmp_path / 'dirty.py'
+    file.write_text('x = 1\ny = 2   \nz = 3\t\n')
+    assert strip_trailing_space(file) == len('y = 2\nz = 3\n')
+    assert file.read_text() == 'x = 1\ny = 2\nz = 3\n'
+
+
+def test_rewrap_noop(tmp_path):
+    file = tmp_path / 'example.py'
+    file.write_text(f"x = '{LONG}'\n")
+    assert rewrap_file(file, 40) > 0
+
+    # already wrapped: no write
+    wrapped = file.read_text()
+    mtime = file.stat().st_mtime_ns
+    assert rewrap_file(file, 40) == 0
+    assert rewrap(file, 1, 40)
+    assert file.read_text() == wrapped
+    assert file.stat().st_mtime_ns == mtime
+
+
+def test_end_column():
+    text = "x = 'a'; y = 'b' * 100\nz = 'c'\n"
+    first, second, _ = StringWrapper.parse(text)
+    assert first.end_column() == len("x = 'a'")
+    assert second.end_column() == len("x = 'a'; y = 'b'")
+
+
+DOCSTRING = f'''
+def foo():
+    """
+    Summary.
+
+    {LONG}
+    continued.
+
+    Parameters
+    ----------
+    x : int
+        Fits.
+
+    - item {LONG}
+    - item.
+
+    >>> foo({', '.join(map(str, range(30)))})
+    """
+'''
+
+
+def test_split_paragraphs():
+    lines = DOCSTRING.split('"""')[1].split('\n')
+    paragraphs = split_paragraphs(lines, 4)
+    reflowed = [lines[i:j] for i, j, hang in paragraphs if hang is not None]
+    assert reflowed == [['    Summary.'],
+                        [f'    {LONG}', '    continued.'],
+                        ['    Parameters'],
+                        ['    x : int'],
+                        ['        Fits.'],
+                        [f'    - item {LONG}'],
+                        ['    - item.']]
+    assert [hang for *_, hang in paragraphs if hang][-2:] == [6, 6]
+
+
+def test_wrap_paragraphs():
+    string, = StringWrapper.parse(DOCSTRING)
+    edit, = wrap_edits([string], 50, paragraphs=True)
+    new = edit.text.split('\n')
+    old = string.source.split('\n')
+    assert max(map(len, new[1:-2])) <= 50
+
+    # only the paragraphs with long lines changed
+    changed = [line for line in new if line not in old]
+    assert changed == [
+        '    lorem ipsum lorem ipsum lorem ipsum lorem',
+        '    ipsum lorem ipsum lorem ipsum lorem ipsum',
+        '    lorem ipsum continued.',
+        '    - item lorem ipsum lorem ipsum lorem ipsum',
+        '      lorem ipsum lorem ipsum lorem ipsum lorem',
+        '      ipsum lorem ipsum'
+    ]
+    assert new[-2].startswith('    >>> foo(0, 1')
+
+
+COMMENTS = f'''\
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+def foo():
+    # {LONG} {LONG}
+    # continued.
+    #
+    # - item {LONG}
+    x = """
+    # {LONG} {LONG}
+    """
+    # type: ignore {LONG} {LONG}
+    # ---------------------------------------------------------------------- #
+    return x  # {LONG}
+'''
+
+
+def test_comment_edits():
+    strings = list(StringWrapper.parse(COMMENTS))
+    new = apply_edits(COMMENTS, comment_edits(COMMENTS, strings, 60))
+    old = COMMENTS.splitlines()
+    changed = [line for line in new.splitlines() if line not in old]
+    assert changed == [
+        '    # lorem ipsum lorem ipsum lorem ipsum lorem ipsum lorem',
+        '    # ipsum lorem ipsum lorem ipsum lorem ipsum lorem ipsum',
+        '    # lorem ipsum lorem ipsum lorem ipsum lorem ipsum lorem',
+        '    # ipsum lorem ipsum lorem ipsum continued.',
+        '    # - item lorem ipsum lorem ipsum lorem ipsum lorem ipsum',
+        '    #   lorem ipsum lorem ipsum lorem ipsum lorem ipsum',
+    ]
+    # special comments, comments in strings, directives, rulers and inline
+    # comments untouched
+    new = new.splitlines()
+    assert new[:3] == old[:3]
+    assert new[-6:] == old[-6:]
+
+
+def test_rewrap_no_room(tmp_path):
+    # the string starts past the width: skipped rather than wrapped to death
+    text = ("result = some_function_name(argument_one, argument_two, "
+            "argument_three, argument_4, key='value')\n")
+    file = tmp_path / 'example.py'
+    file.write_text(text)
+    assert rewrap_file(file, 80) == 0
+    assert file.read_text() == text
+
+    string, = StringWrapper.parse(text)
+    with pytest.raises(ValueError):
+        string.wrap(80)
+
+
+def test_brackets_shared():
+    text = f"x = ('{LONG}'\n     'tail')\ny = '{LONG}'\n"
+    first, second = StringWrapper.parse(text)
+    assert first._brackets is second._brackets
+    assert first.bracketed and not second.bracketed
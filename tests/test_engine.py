@@ -0,0 +1,62 @@
+# std
+import os
+
+# third-party
+import pytest
+
+# local
+from restring.engine import Engine
+
+
+LONG = ' '.join(['lorem ipsum'] * 8)
+
+
+def test_engine_caches(tmp_path):
+    file = tmp_path / 'example.py'
+    file.write_text(f'x = "{LONG}"  \ny = 1\n')
+
+    with Engine(width=50, write='atomic') as engine:
+        assert engine.strip(file) > 0
+        document = engine.documents[file][1]
+        assert not document.changed
+
+        # the cached document is reused for unchanged files
+        assert engine.rewrap_file(file) > 0
+        assert engine.rewrap_file(file) == 0
+        assert engine.documents[file][1].text == file.read_text()
+        assert max(map(len, file.read_text().splitlines())) <= 50
+        assert engine.memo.misses == 1
+
+        # external changes are picked up
+        file.write_text(f'z = "{LONG}"\n')
+        assert engine.rewrap(file, 1) > 0
+        assert file.read_text().startswith('z = ("')
+
+    assert not engine.documents
+    assert not list(tmp_path.glob('.example.py.*'))
+
+
+def test_engine_dry_run(tmp_path):
+    file = tmp_path / 'example.py'
+    file.write_text(text := f'x = "{LONG}"  \n')
+    engine = Engine(width=50, write='none')
+    assert engine.fix(file) == 0
+    assert file.read_text() == text
+    assert file not in engine.documents
+
+    with pytest.raises(ValueError):
+        Engine(write='maybe')
+
+
+def test_engine_workers(tmp_path):
+    files = []
+    for i in range(4):
+        files.append(file := tmp_path / f'module{i}.py')
+        file.write_text(f'x = "{LONG}"\n' if i % 2 else 'x = 1\n')
+        os.chmod(file, 0o640)
+
+    with Engine(width=50, write='atomic', workers=2) as engine:
+        written = engine.map('rewrap_file', files)
+
+    assert [bool(n) for n in written.values()] == [False, True, False, True]
+    assert all(f.stat().st_mode & 0o777 == 0o640 for f in files)
@@ -0,0 +1,41 @@
+# std
+from pathlib import Path
+
+# third-party
+import pytest
+
+# local
+from restring.core import StringWrapper
+
+np = pytest.importorskip('numpy')
+from restring.estimate import Estimate, measure  # noqa: E402
+
+
+SOURCES = sorted((Path(__file__).parent.parent / 'src/restring').glob('*.py'))
+
+
+def test_measure():
+    text = ('x = 1\n'
+            'y = ("lorem ipsum"\n'
+            '     "dolor sit amet, consectetur")\n'
+            'z = 3\n'
+            "\tw = 'a'\n")
+    line_widths, string_widths = measure(text)
+    assert line_widths.tolist() == [18, 35, 15]
+    assert string_widths.tolist() == [35, 15]
+    assert measure(text, expand_tabs=False)[1].tolist() == [35, 8]
+
+
+@pytest.mark.parametrize('width', [60, 80, 100])
+def test_matches_fits(width):
+    estimate = Estimate.from_paths(SOURCES, jobs=1)
+    strings = files = 0
+    for file in SOURCES:
+        n = sum(not string.fits(width)
+                for string in StringWrapper.parse(file.read_text()))
+        strings += n
+        files += bool(n)
+
+    affected = estimate.affected([width])[width]
+    assert affected['strings'] == strings
+    assert affected['files'] == files
@@ -0,0 +1,158 @@
+# std
+import ast
+import subprocess as sub
+
+# third-party
+import pytest
+
+# local
+from restring import git
+from restring.core import in_ranges, parse_string_blocks
+from restring.cli import main
+from restring.git import (CatFile, changed_lines, check_revisions, parse_diff,
+                          rewrap_changed)
+
+
+DIFF = '''\
+diff --git a/foo.py b/foo.py
+index 3b18e51..a9c3e7f 100644
+--- a/foo.py
++++ b/foo.py
+@@ -3 +3 @@ def foo():
+-    x = 1
++    x = 2
+@@ -10,0 +11,3 @@ def bar():
++    pass
++    pass
++    pass
+@@ -20,2 +22,0 @@ def baz():
+-    y = 1
+-    y = 2
+diff --git a/gone.py b/gone.py
+--- a/gone.py
++++ /dev/null
+@@ -1 +0,0 @@
+-x = 1
+'''
+
+
+def test_parse_diff():
+    assert parse_diff(DIFF) == {'foo.py': [(3, 3), (11, 13)]}
+
+
+@pytest.mark.parametrize(
+    'first, last, expected',
+    [(1, 2, False),
+     (3, 3, True),
+     (2, 4, True),
+     (5, 10, False),
+     (10, 11, True),
+     (13, 20, True),
+     (14, 20, False)]
+)
+def test_in_ranges(first, last, expected):
+    assert in_ranges([(3, 3), (11, 13)], first, last) is expected
+
+
+def test_parse_string_blocks_ranges():
+    text = "a = 'hello'\nb = 1\nc = ('x'\n     'y')\n"
+    assert len(list(parse_string_blocks(text, [(2, 2)]))) == 0
+    assert len(list(parse_string_blocks(text, [(4, 4)]))) == 1
+    assert len(list(parse_string_blocks(text, None))) == 2
+
+
+def _git(path, *args):
+    sub.run(['git', *args], cwd=path, check=True, capture_output=True)
+
+
+def _init(path):
+    _git(path, 'init')
+    _git(path, 'config', 'user.email', 'test@example.com')
+    _git(path, 'config', 'user.name', 'test')
+
+
+def _commit(path, files, message):
+    for name, text in files.items():
+        (file := path / name).parent.mkdir(exist_ok=True)
+        file.write_text(text)
+    _git(path, 'add', '.')
+    _git(path, 'commit', '-m', message)
+
+
+def test_rewrap_changed(tmp_path):
+    _init(tmp_path)
+
+    long = 'x' * 30
+    original = (f"a = '{long} {long} {long}'   \n"
+                f"b = '{long} {long} {long}'   \n")
+    file = tmp_path / 'example.py'
+    file.write_text(original)
+    (tmp_path / 'untouched.py').write_text(original)
+    _git(tmp_path, 'add', '.')
+    _git(tmp_path, 'commit', '-m', 'initial')
+
+    # change only the second line
+    file.write_text(original.replace("b = '", "b = 'y"))
+    assert list(changed_lines(cwd=tmp_path)) == [file]
+
+    # independent of the user's diff prefix settings
+    for option in ('diff.noprefix', 'diff.mnemonicPrefix'):
+        _git(tmp_path, 'config', option, 'true')
+        assert list(changed_lines(cwd=tmp_path)) == [file]
+
+    rewrap_changed(width=40, cwd=tmp_path)
+    text = file.read_text()
+    ast.parse(text)
+    new = text.splitlines()
+    # first line untouched
+    assert new[0] == original.splitlines()[0]
+    assert all(len(line) <= 40 for line in new[1:])
+    assert (tmp_path / 'untouched.py').read_text() == original
+
+
+def test_check_revisions(tmp_path, capsys, monkeypatch):
+    _init(tmp_path)
+    long = "x = '" + ' '.join(['lorem ipsum'] * 8) + "'\n"
+    _commit(tmp_path, {'a.py': long, 'b.py': 'x = 1\n', 'c.txt': long}, '1')
+    _commit(tmp_path, {'b.py': 'x = 2\n'}, '2')
+    _commit(tmp_path, {'pkg/c.py': long}, '3')
+
+    report = check_revisions(['HEAD'], 60, cwd=tmp_path)
+    commits = list(report['commits'].values())
+    assert [len(commit['files']) for commit in commits] == [3, 2, 2]
+    assert [commit['summary']['violations'] for commit in commits] == [2, 1, 1]
+    # unchanged (and identical) files are scanned once
+    assert len(report['blobs']) == 3
+
+    report = check_revisions(['HEAD~1..HEAD'], 60, paths=['pkg'], cwd=tmp_path)
+    assert [list(commit['files']) for commit in report['commits'].values()] \
+        == [['pkg/c.py']]
+
+    with CatFile(tmp_path) as store:
+        assert store.read('HEAD:b.py') == ('blob', b'x = 2\n')
+        with pytest.raises(KeyError):
+            store.read('HEAD:missing.py')
+        # still usable after a missing object
+        assert store.read('HEAD~2:b.py')[1] == b'x = 1\n'
+
+    monkeypatch.chdir(tmp_path)
+    assert main(['history', '-w', '60', 'HEAD~1..HEAD']) == 1
+    assert '2 distinct files checked in 1 commits.' in capsys.readouterr().out
+
+
+def test_check_revisions_error(tmp_path, monkeypatch):
+    _init(tmp_path)
+    _commit(tmp_path, {'a.py': 'x = 1\n', 'b.py': 'y = 2\n'}, '1')
+
+    def process_document(document, *args):
+        if document.filename == 'b.py':
+            raise RuntimeError('boom')
+        return real(document, *args)
+
+    real = git.process_document
+    monkeypatch.setattr(git, 'process_document', process_document)
+    report = check_revisions(['HEAD'], 60, cwd=tmp_path)
+    files, = [commit['files'] for commit in report['commits'].values()]
+    blobs = report['blobs']
+    assert 'error' not in blobs[files['a.py']]
+    assert blobs[files['b.py']]['error'] == "RuntimeError('boom')"
@@ -0,0 +1,87 @@
+# local
+from restring.edits import Edit
+from restring.core import StringWrapper
+from restring.index import StringIndex
+
+
+LONG = ' '.join(['lorem ipsum'] * 8)
+TEXT = f'''\
+x = 1
+y = ("a"
+     "b"
+     "c")
+z = 'short'; w = "{LONG}"
+v = """
+multi
+"""
+'''
+
+
+def test_lookups():
+    index = StringIndex(TEXT)
+    assert len(index) == 4
+    for line_nr in (2, 3, 4):
+        string, = index.at_line(line_nr)
+        assert string.lines == ['a', 'b', 'c']
+
+    assert index.at_line(1) == []
+    assert [s.lines[0] for s in index.at_line(5)] == ['short', LONG]
+    assert index.at_line(7)[0].first['quote'] == '"""'
+    assert len(index.overlapping(1, 9)) == 4
+    assert len(index.overlapping(3, 5)) == 3
+    assert len(index.overlapping(6, 6)) == 1
+
+    pos = TEXT.index('"b"')
+    assert index.at_offset(pos).lines == ['a', 'b', 'c']
+    assert index.at_offset(0) is None
+
+
+def test_update():
+    index = StringIndex(TEXT)
+    index.apply([Edit(0, 5, 'x = "new"\n# comment')])
+    assert index.at_line(1)[0].lines == ['new']
+    assert index.at_line(3)[0].lines == ['a', 'b', 'c']
+    pos = index.text.index('"c"')
+    assert index.at_offset(pos) is index.at_line(5)[0]
+
+
+def test_from_file(tmp_path):
+    file = tmp_path / 'example.py'
+    file.write_text(TEXT)
+    index = StringIndex.from_file(file)
+    assert StringIndex.from_file(file) is index
+
+    # joined strings are found from any of their lines
+    assert StringWrapper.from_file(file, 4).lines == ['a', 'b', 'c']
+    # the string that needs wrapping is preferred
+    assert StringWrapper.from_file(file, 5, width=40).lines == [LONG]
+
+    file.write_text('a = "changed"\n' + TEXT)
+    assert StringIndex.from_file(file) is not index
+
+
+def test_triple_quoted_neighbour(tmp_path):
+    # the second line alone scans differently from the whole text
+    text = 'x = """abc\ndef""" + \'tail long\'\n'
+    index = StringIndex(text)
+    string, = [s for s in index.at_line(2) if s.lines == ['tail long']]
+    assert string.start == text.index("'tail")
+
+    file = tmp_path / 'example.py'
+    file.write_text(text)
+    assert StringWrapper.from_file(file, 2, width=18).lines == ['tail long']
+
+
+def test_wrap_non_ascii(tmp_path):
+    from restring.core import rewrap
+
+    head = '# héllo wörld ñ ünïcödé\n'
+    file = tmp_path / 'example.py'
+    file.write_text(f"{head}x = ('{LONG}')\n")
+    rewrap(file, 2, 40)
+    text = file.read_text()
+    assert text.startswith(head)
+    assert all(len(line) <= 40 for line in text.splitlines()[1:])
+    namespace = {}
+    exec(text, namespace)
+    assert namespace['x'] == LONG
@@ -0,0 +1,107 @@
+# std
+import io
+import json
+from pathlib import Path
+
+# third-party
+import pytest
+
+# local
+from restring import lint
+from restring.cli import main
+from restring.lint import (Finding, group_findings, infer_width, ingest,
+                           parse_findings)
+
+
+LONG = ' '.join(['lorem ipsum'] * 8)
+SOURCE = f'''\
+x = ('{LONG}'
+     '{LONG}')
+y = some_function_with_a_long_name(argument_one, argument_two, argument_three)
+z = '{LONG}'
+'''
+
+FLAKE8 = '''\
+{0}:1:80: E501 line too long (101 > 60 characters)
+{0}:2:80: E501 line too long (101 > 60 characters)
+{0}:3:80: E501 line too long (79 > 60 characters)
+{0}:3:1: F821 undefined name 'some_function_with_a_long_name'
+{0}:4:80: E501 line too long (100 > 60 characters)
+'''
+PYLINT = '{0}:4:0: C0301: Line too long (100/60) (line-too-long)\n'
+
+
+def test_parse_text():
+    findings = parse_findings(FLAKE8.format('a.py') + PYLINT.format('b.py'))
+    assert len(findings) == 6
+    assert findings[0] == Finding('a.py', 1, 80, 'E501',
+                                  'line too long (101 > 60 characters)')
+    assert findings[-1][:4] == ('b.py', 4, 0, 'C0301')
+    assert infer_width(findings) == 60
+    assert group_findings(findings) == {Path('a.py'): [1, 2, 3, 4],
+                                        Path('b.py'): [4]}
+
+
+@pytest.mark.parametrize('data', [
+    # ruff
+    [{'code': 'E501', 'filename': 'a.py', 'location': {'row': 4, 'column': 80},
+      'message': 'Line too long (100 > 60)'}],
+    # pylint
+    [{'path': 'a.py', 'line': 4, 'column': 0, 'message-id': 'C0301',
+      'symbol': 'line-too-long', 'message': 'Line too long (100/60)'}],
+    # pylint json2
+    {'messages': [{'path': 'a.py', 'line': 4, 'column': 0,
+                   'messageId': 'C0301', 'message': 'Line too long (100/60)'}]},
+    # flake8-json
+    {'a.py': [{'code': 'E501', 'line_number': 4, 'column_number': 80,
+               'text': 'line too long (100 > 60 characters)'}]},
+])
+def test_parse_json(data):
+    findings = parse_findings(json.dumps(data))
+    assert [finding[:2] for finding in findings] == [('a.py', 4)]
+    assert infer_width(findings) == 60
+
+
+def test_ingest(tmp_path):
+    file = tmp_path / 'example.py'
+    file.write_text(SOURCE)
+    results = ingest(FLAKE8.format(file))
+    result = results[file.as_posix()]
+    # findings on lines 1 and 2 are in the same string
+    assert result['findings'] == 4
+    assert result['strings'] == 2
+    assert result['wrapped'] == 2
+    assert result['skipped'] == [3]
+
+    lines = file.read_text().splitlines()
+    assert lines.count(SOURCE.splitlines()[2]) == 1
+    assert all(len(line) <= 60 for line in lines if not line.startswith('y'))
+
+
+def test_ingest_error(tmp_path, monkeypatch):
+    good, bad = tmp_path / 'good.py', tmp_path / 'bad.py'
+    good.write_text(SOURCE)
+    bad.write_text(SOURCE)
+
+    def resolve(document, lines):
+        if document.filename == bad:
+            raise RuntimeError('boom')
+        return real(document, lines)
+
+    real = lint.resolve
+    monkeypatch.setattr(lint, 'resolve', resolve)
+    results = ingest(FLAKE8.format(bad) + FLAKE8.format(good))
+    assert results[bad.as_posix()] == dict(error="RuntimeError('boom')")
+    assert results[good.as_posix()]['wrapped'] == 2
+    assert bad.read_text() == SOURCE
+
+
+def test_cli(tmp_path, monkeypatch, capsys):
+    file = tmp_path / 'example.py'
+    file.write_text(SOURCE)
+    monkeypatch.setattr('sys.stdin', io.StringIO(FLAKE8.format(file)))
+    assert main(['ingest', '--dry-run']) == 0
+    out = capsys.readouterr().out
+    assert f'{file.as_posix()}:3: skipped (not a string)' in out
+    assert '1 files, 4 findings in 2 strings, 2 wrapped, 1 skipped' in out
+    assert file.read_text() == SOURCE
@@ -0,0 +1,75 @@
+# std
+import multiprocessing as mp
+from concurrent.futures import ThreadPoolExecutor
+
+# local
+from restring.memo import Memo
+from restring.core import StringWrapper, wrap_memo
+from restring.fstrings import convert_edits, convert_memo
+
+
+def test_lru_bound():
+    memo = Memo(maxsize=2)
+    for i in range(3):
+        memo.lookup((i, ), str, i)
+
+    assert len(memo) == 2
+    assert memo.lookup((2, ), str, 2) == '2'
+    assert (memo.hits, memo.misses) == (1, 3)
+    # first key was evicted
+    memo.lookup((0, ), str, 0)
+    assert memo.misses == 4
+
+
+def _compute_in_child(filename, queue):
+    memo = Memo(filename=filename)
+    memo.lookup(('shared', ), list, 'abc')
+    queue.put(memo.stats())
+
+
+def test_disk_store_shared(tmp_path):
+    filename = tmp_path / 'memo.db'
+    memo = Memo(filename=filename)
+    assert memo.lookup(('shared', ), list, 'abc') == ['a', 'b', 'c']
+
+    queue = mp.get_context('spawn').Queue()
+    proc = mp.get_context('spawn').Process(target=_compute_in_child,
+                                           args=(filename, queue))
+    proc.start()
+    stats = queue.get(timeout=30)
+    proc.join()
+    assert stats['disk_hits'] == 1
+    assert stats['misses'] == 0
+
+
+def test_threads(tmp_path):
+    memo = Memo(maxsize=64, filename=tmp_path / 'memo.db')
+
+    def work(i):
+        return [memo.lookup((j, ), str, j) for j in range(i, i + 100)]
+
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(work, range(16)))
+
+    assert results == [list(map(str, range(i, i + 100))) for i in range(16)]
+    assert memo.hits + memo.misses == 1600
+    assert len(memo) == 64
+
+
+def test_wrap_memoized():
+    wrap_memo.clear()
+    text = ("a = 'Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed "
+            "do eiusmod tempor incididunt ut labore'\n")
+    for _ in range(2):
+        lines = [s.wrap(40) for s in StringWrapper.parse(text)]
+
+    assert wrap_memo.hits == 1
+    assert lines[0] == next(StringWrapper.parse(text))._wrap(40, True)
+
+
+def test_convert_memoized():
+    convert_memo.clear()
+    text = 'x = "hello %s" % name\ny = "hello %s" % name\n'
+    edits = convert_edits(text)
+    assert [edit.text for edit in edits] == ['f"hello {name}"'] * 2
+    assert (convert_memo.misses, convert_memo.hits) == (1, 1)
@@ -0,0 +1,43 @@
+# local
+from restring.core import StringWrapper, wrap_edits
+from restring.parallel import parallel_rewrap_file, parallel_wrap_edits, split_points
+
+
+LONG = ' '.join(['lorem ipsum'] * 8)
+
+CHUNK = f'''\
+x = ("{LONG}"
+"{LONG}")
+y = """
+z = 'not a statement'
+"""
+# a = 'comment'
+def foo():
+    return f"{LONG} {{y}}"
+w = 1 + \\
+z
+s = 'é {LONG}'
+'''
+
+
+def test_split_points():
+    buffer = (CHUNK * 3).encode()
+    points = split_points(buffer, 10)
+    assert points
+    for point in points:
+        line = buffer[point:buffer.index(b'\n', point)]
+        assert line.startswith((b'x =', b'y =', b'def', b'w =', b's ='))
+
+
+def test_parallel_matches_serial(tmp_path):
+    file = tmp_path / 'generated.py'
+    file.write_text(text := CHUNK * 20)
+    expected = list(wrap_edits(StringWrapper.parse(text), 50))
+    assert expected
+
+    for jobs in (1, 2):
+        assert parallel_wrap_edits(file, 50, jobs=jobs, chunksize=500) == \
+            expected
+
+    assert parallel_rewrap_file(file, 50, jobs=2, chunksize=500) > 0
+    assert parallel_wrap_edits(file, 50, jobs=2, chunksize=500) == []
@@ -0,0 +1,105 @@
+# std
+import random
+from functools import partial
+
+# third-party
+import pytest
+
+# local
+from restring.core import StringWrapper
+from restring.edits import Edit, apply_edits, compose
+from restring.pipeline import (Document, Pipeline, fix_file, rewrap_pass,
+                               strip_pass)
+
+
+LONG = ' '.join(['lorem ipsum'] * 8)
+SOURCE = f'''\
+def foo():   
+    x = 1    
+    return '{LONG}'
+
+
+y = ('{LONG}'   
+     'tail')
+'''
+
+
+def test_compose_random():
+    rng = random.Random(42)
+    original = ''.join(rng.choices('abcdef\n', k=200))
+
+    def random_edits(text, n):
+        points = sorted(rng.sample(range(len(text) + 1), 2 * n))
+        return [Edit(a, b, ''.join(rng.choices('XYZ', k=rng.randint(0, 5))))
+                for a, b in zip(points[::2], points[1::2])]
+
+    for _ in range(50):
+        first = random_edits(original, 5)
+        text = apply_edits(original, first)
+        second = random_edits(text, 5)
+        expected = apply_edits(text, second)
+        assert apply_edits(original, compose(text, first, second)) == expected
+
+
+def test_overlapping_edits():
+    with pytest.raises(ValueError):
+        apply_edits('hello', [Edit(0, 3, ''), Edit(2, 4, '')])
+
+
+def test_strings_track_edits():
+    document = Document(SOURCE)
+    n = len(document.strings)
+    document.apply(strip_pass(document))
+
+    # offsets of the shared scan are corrected for the stripped whitespace
+    assert len(document.strings) == n
+    expected = list(StringWrapper.parse(document.text))
+    assert [(s.start, s.end) for s in document.strings] == \
+        [(s.start, s.end) for s in expected]
+
+
+def test_pipeline_single_write(tmp_path):
+    file = tmp_path / 'example.py'
+    file.write_text(SOURCE)
+
+    document = Pipeline(strip_pass, partial(rewrap_pass, width=60)).run(file)
+    new = file.read_text()
+    assert new == document.text
+    assert apply_edits(SOURCE, document.edits) == new
+    assert not any(line.endswith(' ') for line in new.splitlines())
+    assert all(len(line) <= 60 for line in new.splitlines())
+
+
+def test_fix_file_comments(tmp_path):
+    file = tmp_path / 'example.py'
+    file.write_text(f'# {LONG} {LONG}\n{SOURCE}')
+
+    document = fix_file(file, 60, convert=False, comments=True)
+    new = file.read_text()
+    assert new == document.text
+    assert all(len(line) <= 60 for line in new.splitlines())
+    assert new.startswith('# lorem ipsum')
+
+
+def test_fix_file_noop(tmp_path):
+    file = tmp_path / 'example.py'
+    file.write_text(text := "x = 'short'\n")
+    mtime = file.stat().st_mtime_ns
+
+    assert not fix_file(file, convert=False).changed
+    assert file.read_text() == text
+    assert file.stat().st_mtime_ns == mtime
+
+
+def test_ranges_track_edits():
+    # the conversion joins lines 1-2, moving the string on line 3 up a line
+    text = f"x = '%s' % (\n    name)\ny = '{LONG}'\nz = '{LONG}'\n"
+    document = Pipeline.fix(40, ranges=[(1, 1), (3, 3)]).process(text)
+    assert document.text.startswith("x = f'{name}'\ny = ('lorem")
+    assert document.text.endswith(f"z = '{LONG}'\n")
+
+    document = Document(text)
+    document.apply([Edit(4, text.index('\ny'), "f'{name}'")])
+    assert document.map_ranges([(1, 1), (3, 3), (4, 4)]) == [(1, 1), (2, 2),
+                                                             (3, 3)]
+    assert document.map_ranges([(1, 3)]) == [(1, 2)]
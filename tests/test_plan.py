@@ -0,0 +1,96 @@
+# std
+import json
+
+# local
+from restring.cli import main
+from restring.edits import apply_edits
+from restring.text import fix_text
+from restring.plan import (apply_byte_edits, apply_plan, byte_edits,
+                           load_plan, make_plan, write_plan)
+
+
+LONG = ' '.join(['lorem ipsum'] * 8)
+SOURCES = {'a.py': f"é = 'ünïcödé'   \nx = '{LONG}'\n",
+           'b.py': 'x = 1\n',
+           'c.py': f"y = ('{LONG}'\n     'tail')\n"}
+
+
+def _make_tree(path):
+    files = []
+    for name, text in SOURCES.items():
+        files.append(file := path / name)
+        file.write_text(text)
+    return files
+
+
+def test_byte_edits():
+    text = 'ä = "ö"\nx = 1\n'
+    edits = [(4, 7, "'ü'"), (12, 13, '2')]
+    data = text.encode()
+    assert apply_byte_edits(data, byte_edits(text, edits)) == \
+        apply_edits(text, edits).encode()
+
+
+def test_plan_apply(tmp_path):
+    files = _make_tree(tmp_path)
+    plan = make_plan(files, 60, convert=False)
+    assert [entry['path'] for entry in plan['files']] == \
+        [files[0].as_posix(), files[2].as_posix()]
+
+    # planning does not change the files
+    assert [file.read_text() for file in files] == list(SOURCES.values())
+
+    write_plan(plan, filename := tmp_path / 'plan.json')
+    plan = load_plan(filename)
+    assert apply_plan(plan) == {entry['path']: 'applied'
+                                for entry in plan['files']}
+    for file, text in zip(files, SOURCES.values()):
+        expected = apply_edits(text, fix_text(text, 60, convert=False))
+        assert file.read_text() == expected
+
+    # applying again is a no-op
+    assert set(apply_plan(plan).values()) == {'done'}
+
+
+def test_apply_stale(tmp_path):
+    files = _make_tree(tmp_path)
+    plan = make_plan(files, 60, convert=False, jobs=2, backend='thread')
+    files[0].write_text(changed := 'x = 2\n')
+
+    results = apply_plan(plan)
+    assert results[files[0].as_posix()] == 'stale'
+    assert results[files[2].as_posix()] == 'applied'
+    assert files[0].read_text() == changed
+
+
+def test_cli(tmp_path, capsys):
+    _make_tree(tmp_path)
+    plan = tmp_path / 'plan.json'
+    assert main(['plan', '--no-convert', '-w', '60', '-o', str(plan),
+                 str(tmp_path)]) == 0
+    assert len(json.loads(plan.read_text())['files']) == 2
+    assert main(['apply', '--dry-run', str(plan)]) == 0
+    assert (tmp_path / 'c.py').read_text() == SOURCES['c.py']
+    assert main(['apply', str(plan)]) == 0
+    assert '2 applied' in capsys.readouterr().out
+
+
+def test_plan_convert(tmp_path, monkeypatch):
+    from restring import plan as plan_module
+
+    files = _make_tree(tmp_path)
+    files.append(file := tmp_path / 'd.py')
+    file.write_text('x = "hello %s" % name\n')
+    plan = make_plan(files, 60)
+    assert apply_plan(plan)[file.as_posix()] == 'applied'
+    assert file.read_text() == 'x = f"hello {name}"\n'
+
+    # unexpected failures become error entries
+    def fail(document, *args):
+        raise RuntimeError('oops')
+
+    monkeypatch.setattr(plan_module, 'process_document', fail)
+    plan = make_plan(files[:1], 60)
+    assert plan['files'] == [dict(path=files[0].as_posix(),
+                                  error="RuntimeError('oops')")]
+    assert apply_plan(plan) == {files[0].as_posix(): 'error'}
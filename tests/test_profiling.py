@@ -0,0 +1,59 @@
+# std
+import os
+import json
+
+# local
+from restring.batch import run
+from restring.core import rewrap_file
+from restring.profiling import Profiler, profiler
+
+
+def test_disabled_is_noop():
+    prof = Profiler()
+    with prof.file('foo.py'), prof.span('wrap', string=0):
+        pass
+    assert prof.spans == []
+
+
+def test_spans(tmp_path):
+    file = tmp_path / 'example.py'
+    file.write_text(f"x = '{' '.join(['word'] * 30)}'\n")
+
+    profiler.reset()
+    profiler.enable(cprofile=tmp_path / 'stats')
+    try:
+        rewrap_file(file, 40)
+    finally:
+        profiler.disable()
+
+    phases = {span[0] for span in profiler.spans}
+    assert {'scan', 'wrap', 'write'} <= phases
+    assert all(span[-1]['file'] == str(file) for span in profiler.spans)
+
+    trace = profiler.to_chrome_trace(tmp_path / 'trace.json')
+    assert json.loads((tmp_path / 'trace.json').read_text()) == trace
+    assert trace['traceEvents'][0]['ph'] == 'X'
+
+    assert profiler.histograms()['wrap']['count'] == 1
+    assert len(list((tmp_path / 'stats').glob('*.pstats'))) == 1
+
+
+def test_worker_spans(tmp_path):
+    files = []
+    for i in range(3):
+        files.append(file := tmp_path / f'module{i}.py')
+        file.write_text(f"x = '{' '.join(['word'] * 30)}'\n")
+
+    profiler.reset()
+    profiler.enable()
+    try:
+        run(files, 40, jobs=2, backend='process')
+        run(files, 40, timeout=10, jobs=2)
+    finally:
+        profiler.disable()
+
+    # spans recorded in the worker processes are merged into ours
+    scans = [span for span in profiler.spans if span[0] == 'scan']
+    assert len(scans) == 6
+    assert os.getpid() not in {span[3] for span in scans}
+    assert {span[-1]['file'] for span in scans} == set(map(str, files))
@@ -0,0 +1,76 @@
+# std
+import time
+import threading
+from pathlib import Path
+
+# local
+from restring.batch import run
+from restring.scheduler import ReadAhead, WriteBehind
+
+
+LONG = ' '.join(['lorem ipsum'] * 8)
+
+
+def test_read_ahead_order(tmp_path):
+    files = []
+    for i in range(20):
+        files.append(file := tmp_path / f'f{i}.py')
+        file.write_text(f'x = {i}\n')
+    files.insert(5, tmp_path / 'missing.py')
+
+    def slow_read(file):
+        # even files are slower, so reads complete out of order
+        time.sleep(0.005 * (files.index(file) % 2 == 0))
+        return Path(file).read_text()
+
+    results = list(ReadAhead(files, depth=4, read=slow_read))
+    assert [file for file, *_ in results] == files
+    assert isinstance(results[5][2], OSError)
+    assert results[6][1:] == ('x = 5\n', None)
+
+
+def test_write_behind_bounded():
+    written = []
+    release = threading.Event()
+
+    def write(file, text):
+        release.wait()
+        if file == 'bad':
+            raise OSError('bad file')
+        written.append(file)
+
+    writer = WriteBehind(write, max_bytes=10)
+    writer.submit('a', 'x' * 6)
+    # the second write blocks until there is room in the queue
+    thread = threading.Thread(target=writer.submit, args=('b', 'x' * 6))
+    thread.start()
+    thread.join(0.05)
+    assert thread.is_alive()
+
+    release.set()
+    thread.join()
+    writer.submit('bad', 'x')
+    writer.submit('c', 'x')
+    errors = writer.close()
+    assert written == ['a', 'b', 'c']
+    assert [(f, str(e)) for f, e in errors] == [('bad', 'bad file')]
+
+
+def test_run_prefetch(tmp_path):
+    files = []
+    for i in range(6):
+        files.append(file := tmp_path / f'module{i}.py')
+        file.write_text(f'x = "{LONG}"  \n' if i % 2 else 'x = 1\n')
+
+    serial = run(files, width=50, prefetch=0)
+    threaded = run(files, width=50, prefetch=3)
+    for report in (serial, threaded):
+        for result in report['files'].values():
+            del result['time']
+    assert serial['files'] == threaded['files']
+
+    report = run(files, width=50, fix=True, prefetch=3)
+    assert report['summary']['changed'] == 3
+    assert report['summary']['written'] == sum(
+        len(files[i].read_bytes()) for i in (1, 3, 5))
+    assert run(files, width=50, prefetch=3)['summary']['violations'] == 0
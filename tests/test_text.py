@@ -0,0 +1,43 @@
+# local
+from restring.text import (Edit, apply_edits, fix_text, rewrap_text,
+                           strip_text, to_positions)
+
+
+LONG = ' '.join(['lorem ipsum'] * 8)
+SOURCE = f"x = 1   \ny = '{LONG}'\n"
+
+
+def test_strip_text():
+    assert strip_text(SOURCE) == [Edit(5, 8, '')]
+    assert strip_text(SOURCE, [(2, 2)]) == []
+
+
+def test_rewrap_text(tmp_path, monkeypatch):
+    # no file system access
+    monkeypatch.chdir(tmp_path)
+    edits = rewrap_text(SOURCE, 40)
+    assert len(edits) == 1
+    new = apply_edits(SOURCE, edits)
+    assert all(len(line) <= 40 for line in new.splitlines())
+    assert rewrap_text(new, 40) == []
+    assert rewrap_text(SOURCE, 40, ranges=[(1, 1)]) == []
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_fix_text():
+    stripped = apply_edits(SOURCE, strip_text(SOURCE))
+    expected = apply_edits(stripped, rewrap_text(stripped, 40))
+    assert apply_edits(SOURCE, fix_text(SOURCE, 40, convert=False)) == expected
+
+
+def test_to_positions():
+    assert to_positions('ab\ncd\n', [Edit(4, 6, 'x')]) == [((1, 1), (2, 0), 'x')]
+
+
+def test_fix_text_convert():
+    source = ('x = "hello %s" % name\n'
+              'y = "%s and %d" % (a, b)\n')
+    edits = fix_text(source, 79)
+    # flynt refuses %d, so only the first expression is converted
+    assert apply_edits(source, edits) == ('x = f"hello {name}"\n'
+                                          'y = "%s and %d" % (a, b)\n')
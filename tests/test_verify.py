@@ -0,0 +1,78 @@
+# std
+import ast
+
+# third-party
+import pytest
+
+# local
+from restring.core import StringWrapper
+from restring.verify import VerificationError, verify
+
+
+@pytest.mark.parametrize(
+    'old, new',
+    [("'hello world'", "('hello '\n 'world')"),
+     ("('hello '  # comment\n 'world')", "'hello world'"),
+     ("f'x = {x!r}, y'", "(f'x = '\n f'{x!r}, y')"),
+     ("f'no fields'", "'no fields'"),
+     ("rb'a\\d'", "(rb'a'\n rb'\\d')")]
+)
+def test_same_value(old, new):
+    verify(old, new)
+
+
+@pytest.mark.parametrize(
+    'old, new',
+    [("'hello world'", "('hello'\n 'world')"),
+     ("f'{x}'", "'{x}'"),
+     ("f'{x}'", "f'{y}'"),
+     ("'hello'", "'hello"),
+     ("'hello'", "hello")]
+)
+def test_changed_value(old, new):
+    with pytest.raises(VerificationError):
+        verify(old, new)
+
+
+def test_verify_reflow():
+    old = '"""hello\n   world.\n\n  Next."""'
+    verify(old, '"""hello world.\n\nNext."""', reflow=True)
+    with pytest.raises(VerificationError):
+        verify(old, '"""hello world.\n\nNext."""')
+    with pytest.raises(VerificationError):
+        verify(old, '"""hello world. Next."""', reflow=True)
+
+
+def test_verify_wrap():
+    text = ("    x = f'{name!r} lorem ipsum dolor sit amet, consectetur "
+            "adipiscing elit, sed do eiusmod {tempor!s} incididunt ut labore'\n")
+    string, = StringWrapper.parse(text)
+    string.verify(string.wrap(40))
+
+    with pytest.raises(VerificationError):
+        string.verify(["f'{name!r} lorem ipsum'"])
+
+
+def test_verify_bracketed():
+    new = "'hello '\n    'world'"
+    verify("'hello world'", new, bracketed=True)
+    with pytest.raises(VerificationError):
+        verify("'hello world'", new)
+
+
+@pytest.mark.parametrize(
+    'text, parens',
+    [("x = '{}'\n", True),
+     ("y = x or f'{{x}} {}'\n", True),
+     ("foo(x,\n    '{}')\n", False),
+     ("x = ('{}'\n     'tail')\n", False),
+     ("x = {{'key': '{}'}}  # ( in comment\n", False),
+     ("x = ')'; y = '{}'\n", True)]
+)
+def test_wrap_valid_code(text, parens):
+    text = text.format(' '.join(['lorem ipsum'] * 8))
+    *_, string = StringWrapper.parse(text)
+    lines = string.wrap(40)
+    string.verify(lines)
+    assert lines[0].startswith('(') is parens
+    ast.parse(text[:string.start] + '\n'.join(lines) + text[string.end:])
@@ -0,0 +1,93 @@
+# std
+import os
+
+# local
+from restring.pipeline import Pipeline
+from restring.watch import Watcher
+
+
+LONG = ' '.join(['lorem ipsum'] * 8)
+
+
+def touch(file, text=None, mtime=None):
+    if text is not None:
+        file.write_text(text)
+    st = file.stat()
+    mtime = st.st_mtime_ns + 10 ** 9 if mtime is None else mtime
+    os.utime(file, ns=(mtime, mtime))
+
+
+def test_watch(tmp_path):
+    (tmp_path / 'sub').mkdir()
+    clean = tmp_path / 'clean.py'
+    clean.write_text('x = 1\n')
+    other = tmp_path / 'sub' / 'other.txt'
+    other.write_text('y  \n')
+
+    watcher = Watcher([tmp_path], Pipeline.fix(width=50, convert=False),
+                      debounce=1)
+    assert watcher.scan() == [clean]
+    assert watcher.step(now=0) == {}
+
+    # new file: processed only once it is stable for the debounce time
+    dirty = tmp_path / 'sub' / 'dirty.py'
+    dirty.write_text(f'x = "{LONG}"  \n')
+    assert watcher.step(now=10) == {}
+    touch(dirty)
+    assert watcher.step(now=10.5) == {}
+    written = watcher.step(now=12)
+    assert list(written) == [dirty] and written[dirty] > 0
+    assert max(map(len, dirty.read_text().splitlines())) <= 50
+
+    # own writes are ignored
+    assert watcher.step(now=20) == {}
+
+    # saves without a content change do not run the pipeline
+    runs = []
+    process = watcher.pipeline.process
+    watcher.pipeline.process = lambda *args: runs.append(args) or process(*args)
+    touch(clean)
+    watcher.step(now=30)
+    assert watcher.step(now=31) == {clean: 0}
+    touch(clean)
+    watcher.step(now=40)
+    assert watcher.step(now=41) == {clean: 0}
+    assert len(runs) == 1
+
+    touch(clean, 'x = 2  \n')
+    watcher.step(now=50)
+    assert watcher.step(now=51) == {clean: 6}
+    assert clean.read_text() == 'x = 2\n'
+
+    # deletion
+    dirty.unlink()
+    watcher.step(now=60)
+    assert dirty not in watcher.stats
+
+
+def test_watch_errors(tmp_path):
+    file = tmp_path / 'example.py'
+    file.write_text(f'x = "{LONG}"  \n')
+    watcher = Watcher([tmp_path], Pipeline.fix(width=50, convert=False),
+                      debounce=0)
+
+    # failures are logged and skipped
+    process = watcher.pipeline.process
+    watcher.pipeline.process = lambda *args: 1 / 0
+    assert watcher.step(now=0) == {file: 0}
+
+    # a save during processing is not overwritten
+    def save(text, filename):
+        document = process(text, filename)
+        touch(file, 'x = 1\n')
+        return document
+
+    touch(file, f'y = "{LONG}"  \n')
+    watcher.pipeline.process = save
+    assert watcher.step(now=1) == {file: 0}
+    assert file.read_text() == 'x = 1\n'
+
+    watcher.pipeline.process = process
+    touch(file, f'z = "{LONG}"  \n')
+    assert watcher.step(now=2)[file] > 0
+    assert max(map(len, file.read_text().splitlines())) <= 50